@@ -0,0 +1,37 @@
+from datetime import datetime
+from fastapi import Depends, APIRouter, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from core import analytics
+from core.get_db import current_shop, get_shop_read_db
+from models.Schemas import DrinkSalesSchema, AddonSalesSchema, SalesPeriodSchema
+
+analyticsrouter = APIRouter()
+
+@analyticsrouter.get("/drinks", response_model=list[DrinkSalesSchema], tags=["Аналитика"])
+async def get_drink_sales(
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    id_shop: int = Depends(current_shop),
+    session: AsyncSession = Depends(get_shop_read_db),
+):
+    return await analytics.drinks_summary(session, id_shop, date_from, date_to)
+
+@analyticsrouter.get("/addons", response_model=list[AddonSalesSchema], tags=["Аналитика"])
+async def get_addon_sales(
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    id_shop: int = Depends(current_shop),
+    session: AsyncSession = Depends(get_shop_read_db),
+):
+    return await analytics.addons_summary(session, id_shop, date_from, date_to)
+
+@analyticsrouter.get("/timeline", response_model=list[SalesPeriodSchema], tags=["Аналитика"])
+async def get_sales_timeline(
+    bucket: str = Query("hour", pattern="^(hour|day)$"),
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    id_drink: int | None = None,
+    id_shop: int = Depends(current_shop),
+    session: AsyncSession = Depends(get_shop_read_db),
+):
+    return await analytics.timeline(session, id_shop, bucket, date_from, date_to, id_drink)
@@ -0,0 +1,89 @@
+import asyncio
+import json
+from fastapi import APIRouter, Depends, Header, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from core.config import settings
+from core.events import broker
+from core.get_db import current_shop
+
+eventsrouter = APIRouter()
+
+# типы событий: order_created, cart_created, stock_changed; reset приходит всегда
+KINDS_PATTERN = r"^(order_created|cart_created|stock_changed)(,(order_created|cart_created|stock_changed))*$"
+
+
+def _kinds(kinds: str | None) -> set[str] | None:
+    return set(kinds.split(",")) if kinds else None
+
+
+@eventsrouter.get("/stream", tags=["События"])
+async def stream_events(
+    request: Request,
+    kinds: str | None = Query(None, pattern=KINDS_PATTERN),
+    last_event_id: str | None = Header(None, alias="Last-Event-ID"),
+    id_shop: int = Depends(current_shop),
+):
+    # SSE: браузерный EventSource сам переподключается и присылает Last-Event-ID
+    subscriber = broker.subscribe(last_event_id, _kinds(kinds), id_shop)
+    heartbeat = settings.app_settings.events_heartbeat
+
+    async def body():
+        try:
+            yield b"retry: 1000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await subscriber.get(heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                if event is None:
+                    break
+                event_id, kind, data, _, _ = event
+                # у reset нет id: Last-Event-ID клиента остается прежним
+                prefix = f"id: {event_id}\n" if event_id else ""
+                yield f"{prefix}event: {kind}\ndata: {data}\n\n".encode()
+        finally:
+            broker.unsubscribe(subscriber)
+
+    return StreamingResponse(body(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@eventsrouter.websocket("/ws")
+async def websocket_events(
+    websocket: WebSocket,
+    kinds: str | None = Query(None, pattern=KINDS_PATTERN),
+    last_event_id: str | None = None,
+    id_shop: int = Depends(current_shop),
+):
+    await websocket.accept()
+    subscriber = broker.subscribe(last_event_id, _kinds(kinds), id_shop)
+    heartbeat = settings.app_settings.events_heartbeat
+
+    async def closed():
+        # клиент ничего не шлет: receive нужен, чтобы заметить отключение, пока событий нет
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    watcher = asyncio.create_task(closed())
+    try:
+        while True:
+            getter = asyncio.ensure_future(subscriber.get(heartbeat))
+            await asyncio.wait((getter, watcher), return_when=asyncio.FIRST_COMPLETED)
+            if watcher.done():
+                getter.cancel()
+                break
+            try:
+                event = getter.result()
+            except asyncio.TimeoutError:
+                continue
+            if event is None:
+                # 1013 try again later: клиент переподключается с last_event_id последнего полученного события
+                await websocket.close(code=1013)
+                break
+            event_id, kind, data, _, _ = event
+            await websocket.send_text(f'{{"id":{json.dumps(event_id)},"event":"{kind}","data":{data}}}')
+    except WebSocketDisconnect:
+        pass
+    finally:
+        watcher.cancel()
+        broker.unsubscribe(subscriber)
@@ -1,13 +1,25 @@
-from decimal import Decimal
-from fastapi import Depends, Body, APIRouter, HTTPException
-from sqlalchemy import select
+from datetime import datetime
+from fastapi import Depends, Body, APIRouter, HTTPException, Query, Request, Response, Header
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, insert, tuple_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
 from models.Base import Base
-from core.db import engine
-from core.get_db import get_db
-from models.ModelBase import Drink, Ingredient, DrinkIngredient, Inventory, Order
-from models.Schemas import DrinkGetSchema, OrderGetSchema, OrderPostSchema, IngredientGetSchema, IngredientDrinkGetSchema, InventoryGetSchema
+from core.config import settings
+from core.db import DEFAULT_SHOP, shards
+from core.get_db import current_shop, get_shop_db, get_shop_read_db
+from core import stock, migrations
+from core.menu_cache import menu_cache
+from core.makeable import makeable_indexes
+from core.quotes import cost_table
+from core.write_behind import write_behind
+from core.shops import menu_sync
+from core.idempotency import idempotency, request_hash, KeyInFlight, KeyMismatch
+from core.pagination import decode_cursor
+from core import fast_read
+from core.conditional import change_markers, conditional_response, headers as validator_headers, last_modified
+from models.ModelBase import Order, CartOrder, CartLine, CartLineAddon
+from models.Schemas import DrinkGetSchema, OrderGetSchema, OrderCreatedSchema, OrdersNormalizedSchema, OrderPostSchema, IngredientGetSchema, IngredientDrinkGetSchema, RecipesNormalizedSchema, InventoryGetSchema, InventoryNormalizedSchema, OrderBatchItemSchema, OrderBatchResultSchema, MakeableSchema, MakeableDrinkSchema, LowStockSchema, CartPostSchema, CartGetSchema, CartLineGetSchema, QuoteSchema, QuoteLineSchema
 
 
 
@@ -15,136 +27,449 @@ myrouter=APIRouter()
 
 @myrouter.post("/setup", tags=["Модификация бд"])
 async def setup_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.drop_all)
-        await conn.run_sync(Base.metadata.create_all)
+    # удаляет все данные: только в режиме разработки
+    if not settings.app_settings.dev_mode:
+        raise HTTPException(status_code=403, detail="Пересоздание таблиц доступно только в режиме разработки")
+    for shard in shards.shards:
+        async with shard.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(migrations.version_metadata.drop_all)
+        await migrations.upgrade(shard.engine)
+    menu_cache.invalidate()
+    makeable_indexes.invalidate()
     return {"message": "Database tables recreated"}
 
+def menu_not_synced(error: IntegrityError) -> HTTPException:
+    # напиток или ингредиент из кэша меню еще не скопирован на шард точки: копия запускается, клиент повторяет запрос
+    if getattr(error.orig, "sqlstate", None) != "23503":
+        raise error
+    menu_sync.schedule()
+    return HTTPException(status_code=409, detail="Меню точки обновляется, повторите запрос", headers={"Retry-After": "1"})
+
+def menu_response(request: Request, menu, name: str, id_shop: int) -> Response:
+    # готовый json из кэша меню, 304 если у клиента та же версия
+    body, etag = menu.payload(name, id_shop)
+    headers = {"ETag": etag, **last_modified(menu.modified), "Cache-Control": "no-cache"}
+    return conditional_response(request, headers) or Response(content=body, media_type="application/json", headers=headers)
+
 @myrouter.get("/Drinks", response_model=list[DrinkGetSchema], tags=["Вывод данных об ингредиентах"])
-async def get_drinks(session: AsyncSession=Depends(get_db)):
-    stmt = select(Drink)
-    result = await session.execute(stmt)
-    drinks = result.scalars().all()
-    return drinks
+async def get_drinks(request: Request, id_shop: int = Depends(current_shop)):
+    menu = await menu_cache.get()
+    return menu_response(request, menu, "drinks", id_shop)
 
 @myrouter.get("/Ingredients", response_model=list[IngredientGetSchema], tags=["Вывод данных об ингредиентах"])
-async def get_ingredients(session: AsyncSession=Depends(get_db)):
-    stmt = select(Ingredient)
-    result = await session.execute(stmt)
-    ingredients = result.scalars().all()
-    return ingredients
-
-@myrouter.get("/Orders", response_model=list[OrderGetSchema], tags=["Заказ"])
-async def get_orders(session: AsyncSession=Depends(get_db)):
-  #select * from, stmt переменная содержащая скл запрос, joinload для загрузки связной таблицы напитки одновременно с заказами в одном запросе
-    stmt = select(Order).options(
-        joinedload(Order.drink),
-        joinedload(Order.ingredient)
-    )
-    result = await session.execute(stmt) #await--ожидание ответа и завершение, execute --планирует и запускает запрос, session--подключение к бд
-    orders = result.scalars().all()
-    return orders
+async def get_ingredients(request: Request, id_shop: int = Depends(current_shop)):
+    menu = await menu_cache.get()
+    return menu_response(request, menu, "ingredients", id_shop)
+
+def order_filters(
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    id_drink: int | None = None,
+    id_ingredient: int | None = None,
+    payment_status: str | None = None,
+    cursor: str | None = None,
+    id_shop: int = Depends(current_shop),
+) -> list:
+    # условия where для списка заказов; все фильтры опираются на индексы orders по (id_shop, ..., created_at)
+    conditions = [Order.id_shop == id_shop]
+    if date_from is not None:
+        conditions.append(Order.created_at >= date_from)
+    if date_to is not None:
+        conditions.append(Order.created_at < date_to)
+    if id_drink is not None:
+        conditions.append(Order.id_drink == id_drink)
+    if id_ingredient is not None:
+        conditions.append(Order.id_ingredient == id_ingredient)
+    if payment_status is not None:
+        conditions.append(Order.payment_status == payment_status)
+    if cursor is not None:
+        created_at, id_order = decode_cursor(cursor)
+        # отдельное условие по created_at отсекает более новые секции: по сравнению кортежей планировщик их не отсекает
+        conditions.append(Order.created_at <= created_at)
+        conditions.append(tuple_(Order.created_at, Order.id_order) < (created_at, id_order))
+    return conditions
+
+async def stream_orders(id_shop: int, conditions):
+    # ndjson-выгрузка через серверный курсор: в памяти одна пачка строк, а не вся история
+    async with shards.read_sessionmaker(id_shop)() as session:
+        async for chunk in fast_read.stream_orders(session, conditions):
+            yield chunk
+
+@myrouter.get("/Orders", response_model=list[OrderGetSchema] | OrdersNormalizedSchema, tags=["Заказ"])
+async def get_orders(
+    request: Request,
+    conditions: list = Depends(order_filters),
+    limit: int = Query(100, ge=1, le=1000),
+    stream: bool = False,
+    normalized: bool = False,
+    id_shop: int = Depends(current_shop),
+    session: AsyncSession=Depends(get_shop_read_db),
+):
+  #новые заказы первыми; только колонки заказа, напиток и добавка подставляются из кэша меню
+    # ETag по маркеру заказов точки: без новых заказов повторный опрос получает 304 без запроса строк
+    headers = validator_headers(request, await change_markers.orders_validators(id_shop))
+    not_modified = conditional_response(request, headers)
+    if not_modified is not None:
+        return not_modified
+    if stream:
+        # normalized не влияет на ndjson: каждая строка - самостоятельный объект
+        return StreamingResponse(stream_orders(id_shop, conditions), media_type="application/x-ndjson", headers=headers)
+
+    orders, cursor = await fast_read.fetch_orders(session, conditions, limit, normalized)
+    if cursor:
+        headers["X-Next-Cursor"] = cursor
+    return fast_read.json_response(orders, headers=headers)
 
 
-@myrouter.post("/Orders", response_model=OrderGetSchema, tags=["Заказ"])
+@myrouter.post("/Orders", response_model=OrderCreatedSchema, tags=["Заказ"])
 async def create_order(
+    response: Response,
     order_input: OrderPostSchema = Body(...),
-    session: AsyncSession = Depends(get_db)
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key", min_length=1, max_length=100),
+    id_shop: int = Depends(current_shop),
+    session: AsyncSession = Depends(get_shop_db)
 ):
-    # делаем выборку из напитков и проверяем наличие такого товара
-    stmt = select(Drink).where(Drink.id_drink == order_input.id_drink)
-    result = await session.execute(stmt)
-    drink = result.scalar_one_or_none()
+    # повтор запроса с тем же Idempotency-Key в той же точке возвращает первый ответ, без нового заказа и списания
+    if idempotency_key is not None:
+        digest = request_hash(order_input.model_dump(mode="json"))
+        try:
+            cached = idempotency.get_local(id_shop, idempotency_key, digest)
+            if cached is None:
+                cached = await idempotency.claim(session, id_shop, idempotency_key, digest)
+        except KeyInFlight:
+            await session.rollback()
+            raise HTTPException(status_code=409, detail="Запрос с этим ключом идемпотентности еще выполняется")
+        except KeyMismatch:
+            await session.rollback()
+            raise HTTPException(status_code=422, detail="Ключ идемпотентности уже использован с другим телом запроса")
+        if cached is not None:
+            await session.rollback()
+            response.headers["Idempotent-Replayed"] = "true"
+            return OrderCreatedSchema.model_validate(cached)
 
-    if not drink:
+    # напиток, добавка, рецепт и себестоимость берутся из кэша меню, без запросов к бд
+    menu = await menu_cache.get()
+    costs = cost_table.of(menu)
+    drink = menu.drinks.get(order_input.id_drink)
+    if drink is None or not drink.available(id_shop):
+        await session.rollback()
         raise HTTPException(status_code=404, detail="Напиток не найден")
+    ingredient = menu.ingredients.get(order_input.id_ingredient)
+    if ingredient is None:
+        await session.rollback()
+        raise HTTPException(status_code=404, detail="Ингредиент не найден")
 
-    # получение ингредиента, если он указан
-    ingredient = None
-    if order_input.id_ingredient:
-        stmt = select(Ingredient).where(Ingredient.id_ingredient == order_input.id_ingredient)
-        result = await session.execute(stmt)
-        ingredient = result.scalar_one_or_none()
+    need = stock.consumption(menu.recipes.get(drink.id_drink, ()), ingredient, order_input.sugar_amount)
+    cost = round(costs.line_cost(drink.id_drink, 1, order_input.sugar_amount, (ingredient.id_ingredient,)), 2)
+    # счетчики write-behind ведутся только для точки по умолчанию, остальные точки пишут синхронно
+    if settings.app_settings.orders_write_behind and id_shop == DEFAULT_SHOP:
+        result = await create_order_write_behind(order_input, need, drink, ingredient, cost)
+        if idempotency_key is not None:
+            await remember(session, id_shop, idempotency_key, digest, result)
+        return result
 
-        if not ingredient:
-            raise HTTPException(status_code=404, detail="Ингредиент не найден")
+    # сначала резервируем склад (блокировка строк и проверка остатков), только потом пишем заказ и списание
+    try:
+        reserved = await stock.reserve(session, id_shop, need)
+    except stock.InsufficientStock:
+        await session.rollback()
+        raise HTTPException(status_code=400, detail="Недостаточно ингредиента на складе")
 
-    # создание объекта для представления и последующей передачи данных
-    new_order = Order(
+    stmt = insert(Order).values(
+        id_shop=id_shop,
         id_drink=drink.id_drink,
+        id_ingredient=ingredient.id_ingredient,
         sugar_amount=order_input.sugar_amount,
         payment_status="paid",
-        id_ingredient=ingredient.id_ingredient
+    ).returning(Order.id_order, Order.created_at)
+    try:
+        result = await session.execute(stmt)
+    except IntegrityError as error:
+        await session.rollback()
+        raise menu_not_synced(error)
+    new_order = result.one()
+
+    await stock.apply(session, id_shop, reserved)
+
+    # ответ собираем из уже загруженных данных, без повторного select заказа (и без чтения с отстающей реплики)
+    result = OrderCreatedSchema(
+        id_drink=drink.id_drink,
+        id_order=new_order.id_order,
+        payment_status="paid",
+        created_at=new_order.created_at,
+        drink=menu_cache.drink_schema(drink),
+        ingredient=menu_cache.ingredient_schema(ingredient),
+        cost=cost,
     )
-    #открываем подключение и передаем объект в бд и сохраняем
-    session.add(new_order)
+    if idempotency_key is not None:
+        # ответ коммитится вместе с заказом: после отката ключ освобождается для повтора
+        await remember(session, id_shop, idempotency_key, digest, result)
+    else:
+        await session.commit()
+    return result
+
+async def remember(session: AsyncSession, id_shop: int, key: str, digest: str, result: OrderCreatedSchema):
+    payload = result.model_dump(mode="json")
+    await idempotency.store(session, id_shop, key, payload)
     await session.commit()
-    await session.refresh(new_order)
+    idempotency.put_local(id_shop, key, digest, payload)
 
-    # делаем выборку напитка для определения его ингредиентов, подключаемся, ожидание ответа, запуск, передаем в переменную
-    stmt = select(DrinkIngredient).where(DrinkIngredient.id_drink == drink.id_drink)
-    result = await session.execute(stmt)
-    drink_ingredients = result.scalars().all()
+async def create_order_write_behind(order_input: OrderPostSchema, need, drink, ingredient, cost: float) -> OrderCreatedSchema:
+    # проверка по счетчику остатков в памяти, заказ и списание запишет фоновая задача
+    try:
+        record = await write_behind.submit(drink.id_drink, ingredient.id_ingredient, order_input.sugar_amount, need)
+    except stock.InsufficientStock:
+        raise HTTPException(status_code=400, detail="Недостаточно ингредиента на складе")
+    return OrderCreatedSchema(
+        id_drink=drink.id_drink,
+        id_order=record["id_order"],
+        payment_status=record["payment_status"],
+        created_at=record["created_at"],
+        drink=menu_cache.drink_schema(drink),
+        ingredient=menu_cache.ingredient_schema(ingredient),
+        cost=cost,
+    )
 
-    # создаем цикл для перебора всех объектов из таблицы напиток/ингредиент входящих в напиток
-    for i in drink_ingredients:
-        #делаем выборку на складе, сравниваем и выбираем ингредиент на складе с напиток/ингредиент
-        stmt = select(Inventory).where(Inventory.id_ingredient == i.id_ingredient)
-        result = await session.execute(stmt)
-        inventory_item = result.scalar_one_or_none() #получаем нужные ингредиенты
+@myrouter.post("/Orders/batch", response_model=OrderBatchResultSchema, tags=["Заказ"])
+async def create_orders_batch(
+    orders_input: list[OrderPostSchema] = Body(...),
+    id_shop: int = Depends(current_shop),
+    session: AsyncSession = Depends(get_shop_db)
+):
+    if len(orders_input) > settings.app_settings.orders_batch_max:
+        raise HTTPException(status_code=413, detail="Слишком много заказов в пакете")
 
-        if inventory_item is not None: #условие для найденного товара
-            inventory_item.quantity -= Decimal(str(i.amount)) #из количества ингредиентов на складе вычитаем количество ингредиента из заказа
+    # проверка всего пакета по кэшу меню, без запросов к бд
+    menu = await menu_cache.get()
+    items = [OrderBatchItemSchema(index=index) for index in range(len(orders_input))]
+    valid, needs = [], []
+    for item, order_input in zip(items, orders_input):
+        ingredient = menu.ingredients.get(order_input.id_ingredient)
+        drink = menu.drinks.get(order_input.id_drink)
+        if drink is None or not drink.available(id_shop):
+            item.detail = "Напиток не найден"
+        elif ingredient is None:
+            item.detail = "Ингредиент не найден"
         else:
-            print(f"ошибка ингредиенты")
+            valid.append(item)
+            needs.append(stock.consumption(menu.recipes.get(order_input.id_drink, ()), ingredient, order_input.sugar_amount))
 
-    # Вычитание дополнительного ингредиента, если он выбран
-    if ingredient:
-        stmt = select(Inventory).where(Inventory.id_ingredient == ingredient.id_ingredient)
-        result = await session.execute(stmt)
-        extra_inventory = result.scalar_one_or_none()
-
-        if extra_inventory:
-             extra_inventory.quantity -= Decimal(str(ingredient.portion))
+    # одна блокировка всех затронутых строк склада, распределение остатков по заказам в порядке пакета
+    available = await stock.lock(session, id_shop, {i for need in needs for i in need})
+    accepted, total = stock.allocate(available, needs)
+    created = []
+    for item, ok in zip(valid, accepted):
+        if ok:
+            created.append(item)
         else:
-            print(f"Ошибка: не найден ингредиент на складе (id={ingredient.id_ingredient})")
+            item.detail = "Недостаточно ингредиента на складе"
 
+    if created:
+        # многострочный INSERT ... RETURNING (insertmanyvalues) и одно списание суммарного расхода
+        stmt = insert(Order).returning(Order.id_order, Order.created_at, sort_by_parameter_order=True)
+        try:
+            result = await session.execute(stmt, [
+                {
+                    "id_shop": id_shop,
+                    "id_drink": orders_input[item.index].id_drink,
+                    "id_ingredient": orders_input[item.index].id_ingredient,
+                    "sugar_amount": orders_input[item.index].sugar_amount,
+                    "payment_status": "paid",
+                }
+                for item in created
+            ])
+        except IntegrityError as error:
+            await session.rollback()
+            raise menu_not_synced(error)
+        for item, row in zip(created, result):
+            item.id_order, item.created_at = row.id_order, row.created_at
+        await stock.apply(session, id_shop, total)
+    await session.commit()
 
-    sugar_id = 6 #вычитаем сахар непосредственно из заказа
-    if order_input.sugar_amount > 0: #если в модель в переменную количество сахара >0
-        stmt = select(Inventory).where(Inventory.id_ingredient == sugar_id)
-        result = await session.execute(stmt)
-        sugar_inventory = result.scalar_one_or_none()
+    return OrderBatchResultSchema(created=len(created), failed=len(items) - len(created), items=items)
 
-        if sugar_inventory:
-            sugar_inventory.quantity -= order_input.sugar_amount * 5  # по 5 г за ложку
-        else:
-            print(f"ошибка сахар")
-    await session.commit()
+def check_cart(menu, cart_input: CartPostSchema, id_shop: int):
+    if len(cart_input.lines) > settings.app_settings.cart_lines_max:
+        raise HTTPException(status_code=413, detail="Слишком много позиций в корзине")
+    for line in cart_input.lines:
+        drink = menu.drinks.get(line.id_drink)
+        if drink is None or not drink.available(id_shop):
+            raise HTTPException(status_code=404, detail="Напиток не найден")
+        if any(id_ingredient not in menu.ingredients for id_ingredient in line.addons):
+            raise HTTPException(status_code=404, detail="Ингредиент не найден")
+        line.addons = list(dict.fromkeys(line.addons))  # повтор добавки в строке считается одной порцией
 
-    if extra_inventory.quantity < Decimal(str(ingredient.portion)):
+def quote_lines(menu, costs, cart_input: CartPostSchema) -> list[QuoteLineSchema]:
+    # по строке: цена из кэша меню, себестоимость из массивов cost_table - O(строк), без бд
+    return [
+        QuoteLineSchema(
+            id_drink=line.id_drink,
+            quantity=line.quantity,
+            price=float(menu.drinks[line.id_drink].price * line.quantity),
+            cost=round(costs.line_cost(line.id_drink, line.quantity, line.sugar_amount, line.addons), 2),
+        )
+        for line in cart_input.lines
+    ]
+
+@myrouter.post("/Quote", response_model=QuoteSchema, tags=["Заказ"])
+async def quote_cart(cart_input: CartPostSchema = Body(...), id_shop: int = Depends(current_shop)):
+    menu = await menu_cache.get()
+    check_cart(menu, cart_input, id_shop)
+    lines = quote_lines(menu, cost_table.of(menu), cart_input)
+    total = round(sum(line.price for line in lines), 2)
+    cost = round(sum(line.cost for line in lines), 2)
+    return QuoteSchema(lines=lines, total=total, cost=cost, margin=round(total - cost, 2))
+
+@myrouter.post("/Carts", response_model=CartGetSchema, tags=["Заказ"])
+async def create_cart(
+    cart_input: CartPostSchema = Body(...),
+    id_shop: int = Depends(current_shop),
+    session: AsyncSession = Depends(get_shop_db)
+):
+    menu = await menu_cache.get()
+    check_cart(menu, cart_input, id_shop)
+    # все, что берется из меню, - до первого await: меню перезагружается на месте и после ожидания может быть другим
+    drinks = {line.id_drink: menu.drinks[line.id_drink] for line in cart_input.lines}
+    addons = {i: menu.ingredients[i] for line in cart_input.lines for i in line.addons}
+    total = sum(drinks[line.id_drink].price * line.quantity for line in cart_input.lines)
+    cost = round(sum(line.cost for line in quote_lines(menu, cost_table.of(menu), cart_input)), 2)
+
+    # расход всей корзины одним словарем: одна блокировка склада и одно списание на корзину
+    need = stock.cart_consumption(menu.recipes, menu.ingredients, cart_input.lines)
+    try:
+        reserved = await stock.reserve(session, id_shop, need)
+    except stock.InsufficientStock:
+        await session.rollback()
         raise HTTPException(status_code=400, detail="Недостаточно ингредиента на складе")
 
-    stmt = select(Order).options(
-        joinedload(Order.drink),
-        joinedload(Order.ingredient)
-    ).where(Order.id_order == new_order.id_order)
-
-    result = await session.execute(stmt)
-    order_with_drink = result.scalar_one()
-
-    return order_with_drink
-
-@myrouter.get("/IngredintDrink", response_model=list[IngredientDrinkGetSchema], tags=["Вывод данных об ингредиентах"]) #добавить фильтрацию
-async def get_DrinkIngredient(session: AsyncSession=Depends(get_db)):
-    stmt = select(DrinkIngredient).options(joinedload(DrinkIngredient.drink), joinedload(DrinkIngredient.ingredient))  #select * from, stmt переменная содержащая скл запрос, joinload для загрузки связной таблицы напитки одновременно с заказами в одном запросе
-    result = await session.execute(stmt) #await--ожидание ответа и завершение, execute --планирует и запускает запрос, session--подключение к бд
-    drinkingredient = result.scalars().all()
-    return drinkingredient
-
-@myrouter.get("/Inventory", response_model=list[InventoryGetSchema], tags=["Вывод данных об ингредиентах"]) #добавить фильтрацию
-async def get_Inventory(session: AsyncSession=Depends(get_db)):
-    stmt = select(Inventory).options( joinedload(Inventory.ingredient))  #select * from, stmt переменная содержащая скл запрос, joinload для загрузки связной таблицы напитки одновременно с заказами в одном запросе
-    result = await session.execute(stmt) #await--ожидание ответа и завершение, execute --планирует и запускает запрос, session--подключение к бд
-    drinkingredient = result.scalars().all()
-    return drinkingredient
\ No newline at end of file
+    cart = (await session.execute(
+        insert(CartOrder).values(id_shop=id_shop, payment_status="paid", total=total, cost=cost)
+        .returning(CartOrder.id_cart, CartOrder.created_at)
+    )).one()
+    try:
+        line_ids = (await session.execute(
+            insert(CartLine).returning(CartLine.id_line, sort_by_parameter_order=True),
+            [
+                {"id_cart": cart.id_cart, "id_drink": line.id_drink, "quantity": line.quantity, "sugar_amount": line.sugar_amount}
+                for line in cart_input.lines
+            ],
+        )).scalars().all()
+        line_addons = [
+            {"id_line": id_line, "id_ingredient": id_ingredient}
+            for id_line, line in zip(line_ids, cart_input.lines)
+            for id_ingredient in line.addons
+        ]
+        if line_addons:
+            await session.execute(insert(CartLineAddon), line_addons)
+    except IntegrityError as error:
+        await session.rollback()
+        raise menu_not_synced(error)
+    await stock.apply(session, id_shop, reserved)
+    await session.commit()
+
+    return CartGetSchema(
+        id_cart=cart.id_cart,
+        payment_status="paid",
+        total=total,
+        cost=cost,
+        created_at=cart.created_at,
+        lines=[
+            CartLineGetSchema(
+                id_line=id_line,
+                id_drink=line.id_drink,
+                quantity=line.quantity,
+                sugar_amount=line.sugar_amount,
+                drink=menu_cache.drink_schema(drinks[line.id_drink]),
+                addons=[menu_cache.ingredient_schema(addons[i]) for i in line.addons],
+            )
+            for id_line, line in zip(line_ids, cart_input.lines)
+        ],
+    )
+
+@myrouter.get("/Carts/{id_cart}", response_model=CartGetSchema, tags=["Заказ"])
+async def get_cart(id_cart: int, id_shop: int = Depends(current_shop), session: AsyncSession = Depends(get_shop_db)):
+    cart = (await session.execute(
+        select(CartOrder.id_cart, CartOrder.payment_status, CartOrder.total, CartOrder.cost, CartOrder.created_at)
+        .where(CartOrder.id_cart == id_cart, CartOrder.id_shop == id_shop)
+    )).one_or_none()
+    if cart is None:
+        raise HTTPException(status_code=404, detail="Заказ не найден")
+    lines = (await session.execute(
+        select(CartLine.id_line, CartLine.id_drink, CartLine.quantity, CartLine.sugar_amount)
+        .where(CartLine.id_cart == id_cart)
+        .order_by(CartLine.id_line)
+    )).all()
+    addons: dict[int, list[int]] = {}
+    for id_line, id_ingredient in await session.execute(
+        select(CartLineAddon.id_line, CartLineAddon.id_ingredient)
+        .join(CartLine, CartLine.id_line == CartLineAddon.id_line)
+        .where(CartLine.id_cart == id_cart)
+    ):
+        addons.setdefault(id_line, []).append(id_ingredient)
+
+    menu = await menu_cache.covering({line.id_drink for line in lines}, {i for ids in addons.values() for i in ids})
+    return CartGetSchema(
+        id_cart=cart.id_cart,
+        payment_status=cart.payment_status,
+        total=cart.total,
+        cost=cart.cost,
+        created_at=cart.created_at,
+        lines=[
+            CartLineGetSchema(
+                id_line=line.id_line,
+                id_drink=line.id_drink,
+                quantity=line.quantity,
+                sugar_amount=line.sugar_amount,
+                drink=menu_cache.drink_schema(menu.drinks[line.id_drink]),
+                addons=[menu_cache.ingredient_schema(menu.ingredients[i]) for i in addons.get(line.id_line, [])],
+            )
+            for line in lines
+        ],
+    )
+
+@myrouter.get("/IngredintDrink", response_model=list[IngredientDrinkGetSchema] | RecipesNormalizedSchema, tags=["Вывод данных об ингредиентах"]) #добавить фильтрацию
+async def get_DrinkIngredient(request: Request, normalized: bool = False, id_shop: int = Depends(current_shop)):
+    menu = await menu_cache.get()
+    return menu_response(request, menu, "recipes_normalized" if normalized else "recipes", id_shop)
+
+@myrouter.get("/Inventory", response_model=list[InventoryGetSchema] | InventoryNormalizedSchema, tags=["Вывод данных об ингредиентах"]) #добавить фильтрацию
+async def get_Inventory(
+    request: Request,
+    normalized: bool = False,
+    id_shop: int = Depends(current_shop),
+    session: AsyncSession=Depends(get_shop_read_db),
+):
+    # ETag по остаткам точки из индекса makeable, который обновляется уведомлениями склада
+    headers = validator_headers(request, await change_markers.inventory_validators(id_shop))
+    not_modified = conditional_response(request, headers)
+    if not_modified is not None:
+        return not_modified
+    return fast_read.json_response(await fast_read.fetch_inventory(session, id_shop, normalized), headers=headers)
+
+@myrouter.get("/Inventory/makeable", response_model=MakeableSchema, tags=["Вывод данных об ингредиентах"])
+async def get_makeable(id_shop: int = Depends(current_shop)):
+    # из поддерживаемого в памяти индекса точки, без обхода рецептов: O(напитков)
+    index = await makeable_indexes.get(id_shop)
+    return MakeableSchema(
+        drinks=[
+            MakeableDrinkSchema(
+                id_drink=drink.id_drink,
+                name_drink=drink.name_drink,
+                makeable=index.makeable.get(drink.id_drink),
+                limiting_ingredient=index.limiting.get(drink.id_drink),
+            )
+            for drink in index.menu.drinks.values()
+            if drink.available(id_shop)
+        ],
+        low_stock=[
+            LowStockSchema(
+                id_ingredient=i,
+                name_ingredient=index.menu.ingredients[i].name_ingredient,
+                quantity=index.stock[i],
+                threshold=index.thresholds[i],
+            )
+            for i in sorted(index.low)
+            if i in index.menu.ingredients
+        ],
+    )
@@ -0,0 +1,9 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from core.metrics import render
+
+metricsrouter = APIRouter()
+
+@metricsrouter.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    return render()
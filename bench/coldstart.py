@@ -0,0 +1,119 @@
+# Холодный старт воркера: профиль импорта (python -X importtime) и время от запуска процесса до первого ответа.
+#   python -m bench.coldstart --runs 5 --fast --budget-ms 1500
+#   python -m bench.coldstart --save release-1.4      # базовая линия bench/baselines/coldstart-release-1.4.json
+#   python -m bench.coldstart --compare release-1.4   # код выхода 1, если старт стал медленнее больше чем на tolerance
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+from time import perf_counter, sleep
+import httpx
+from bench.common import BASELINES, save_baseline
+
+FIRST_PARTY = ("main", "core", "api", "models", "routers")
+PROBE = "/v1/Coffe/Drinks"
+
+
+def import_profile(env: dict) -> list[tuple[str, int, int]]:
+    # (модуль, собственное время, суммарное с вложенными импортами) в микросекундах, как их печатает -X importtime
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main; main.app"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, total, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(own), int(total)))
+    return rows
+
+
+def print_profile(rows: list[tuple[str, int, int]], top: int) -> float:
+    by_package: dict[str, int] = {}
+    for name, own, _ in rows:
+        package = name.split(".")[0]
+        by_package[package] = by_package.get(package, 0) + own
+    total = sum(by_package.values()) / 1000
+    print(f"импорт приложения: {total:.0f} мс")
+    print("\nпакеты (собственное время модулей):")
+    for package, own in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {own / 1000:8.1f} мс  {package}")
+    print("\nмодули проекта (с вложенными импортами):")
+    for name, _, cumulative in sorted((row for row in rows if row[0].split(".")[0] in FIRST_PARTY), key=lambda row: -row[2])[:top]:
+        print(f"  {cumulative / 1000:8.1f} мс  {name}")
+    return total
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def first_request(env: dict, timeout: float) -> float:
+    # от запуска процесса uvicorn до первого ответа 200: интерпретатор, импорт, lifespan и сам запрос
+    port = free_port()
+    start = perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:create_app", "--factory", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1.0) as client:
+            while perf_counter() - start < timeout:
+                if process.poll() is not None:
+                    raise SystemExit(f"воркер завершился при старте:\n{process.stderr.read().decode()}")
+                try:
+                    if client.get(PROBE).status_code == 200:
+                        return perf_counter() - start
+                except httpx.TransportError:
+                    pass
+                sleep(0.005)
+        raise SystemExit(f"нет ответа за {timeout} с")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--fast", action="store_true", help="FAST_START=true: остальной прогрев после первого запроса")
+    parser.add_argument("--top", type=int, default=15, help="строк в профиле импорта")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--budget-ms", type=float, help="код выхода 1, если медиана до первого ответа больше")
+    parser.add_argument("--save", metavar="NAME", help="сохранить как bench/baselines/coldstart-NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="сравнить с базовой линией, код выхода 1 при регрессии")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    env = dict(os.environ, FAST_START="true" if args.fast else "false")
+    import_ms = print_profile(import_profile(env), args.top)
+
+    times = sorted(first_request(env, args.timeout) * 1000 for _ in range(args.runs))
+    results = {"import_ms": import_ms, "first_request_ms": statistics.median(times), "first_request_max_ms": times[-1]}
+    print(f"\nдо первого ответа, запусков {args.runs}: мин {times[0]:.0f} мс, медиана {results['first_request_ms']:.0f} мс, "
+          f"макс {times[-1]:.0f} мс")
+
+    failed = False
+    if args.save:
+        save_baseline(f"coldstart-{args.save}", results)
+    if args.compare:
+        baseline = json.loads((BASELINES / f"coldstart-{args.compare}.json").read_text())
+        for key in ("import_ms", "first_request_ms"):
+            if results[key] > baseline[key] * (1 + args.tolerance):
+                print(f"РЕГРЕССИЯ {key}: {baseline[key]:.0f} -> {results[key]:.0f} мс")
+                failed = True
+    if args.budget_ms is not None and results["first_request_ms"] > args.budget_ms:
+        print(f"БЮДЖЕТ превышен: {results['first_request_ms']:.0f} мс > {args.budget_ms:.0f} мс")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# Общие функции бенчмарков: перцентили, сводка по эндпоинту, сохранение и сравнение с базовой линией
+import json
+from pathlib import Path
+
+BASELINES = Path(__file__).parent / "baselines"
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(len(sorted_values) * q), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def print_report(results: dict):
+    print(f"{'эндпоинт':24} {'запросов':>9} {'ошибок':>7} {'rps':>9} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9}")
+    for name, r in results.items():
+        print(f"{name:24} {r['requests']:9d} {r['errors']:7d} {r['rps']:9.1f} "
+              f"{r['p50_ms']:9.2f} {r['p95_ms']:9.2f} {r['p99_ms']:9.2f}")
+
+
+def save_baseline(name: str, results: dict):
+    BASELINES.mkdir(exist_ok=True)
+    (BASELINES / f"{name}.json").write_text(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+def compare(name: str, results: dict, tolerance: float) -> list[str]:
+    # регрессия: p95 выросла или пропускная способность упала больше чем на tolerance
+    baseline = json.loads((BASELINES / f"{name}.json").read_text())
+    regressions = []
+    for endpoint, r in results.items():
+        base = baseline.get(endpoint)
+        if base is None:
+            continue
+        if r["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{endpoint}: p95 {base['p95_ms']:.2f} -> {r['p95_ms']:.2f} мс")
+        if r["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{endpoint}: rps {base['rps']:.1f} -> {r['rps']:.1f}")
+    return regressions
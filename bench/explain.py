@@ -0,0 +1,124 @@
+# Разбор планов всех запросов, которые API выполняет на заполненной бд (python -m bench.seed):
+# сценарий идет через приложение в том же процессе, запросы собираются событиями курсора (core/instrumentation.py),
+# затем каждый уникальный запрос выполняется как EXPLAIN (ANALYZE, BUFFERS) в транзакции с откатом.
+#   python -m bench.explain --min-rows 1000 --fail
+import argparse
+import asyncio
+import json
+import sys
+import asyncpg
+import httpx
+from core.config import settings
+from core.instrumentation import captured_queries
+from bench.seed import DRINKS, INGREDIENTS
+
+PREFIX = "/v1/Coffe"
+SCENARIO = [
+    ("GET", "/Drinks", None),
+    ("GET", "/Ingredients", None),
+    ("GET", "/IngredintDrink", None),
+    ("GET", "/Orders", None),
+    ("GET", "/Orders?limit=50&id_drink=3", None),
+    ("GET", f"/Orders?id_ingredient={INGREDIENTS}&payment_status=paid", None),
+    ("GET", "/Orders?date_from=2020-01-01T00:00:00&date_to=2020-02-01T00:00:00", None),
+    ("POST", "/Orders", {"id_drink": 1, "id_ingredient": 2, "sugar_amount": 1}),
+    ("POST", "/Orders/batch", [{"id_drink": d, "id_ingredient": 2, "sugar_amount": 0} for d in range(1, 4)]),
+    ("POST", "/Carts", {"lines": [{"id_drink": 1, "quantity": 2, "addons": [2, 4]}, {"id_drink": DRINKS}]}),
+    ("GET", "/Carts/1", None),
+    ("GET", "/Inventory", None),
+    ("GET", "/Inventory/makeable", None),
+    ("GET", "/Analytics/drinks", None),
+    ("GET", "/Analytics/addons", None),
+    ("GET", "/Analytics/timeline?bucket=day&id_drink=1", None),
+]
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+async def collect() -> dict[str, tuple]:
+    # уникальные запросы сценария с параметрами первого вызова; запросы старта (загрузка меню, склада) тоже попадают
+    from main import app
+
+    queries: list = []
+    captured_queries.set(queries)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://explain") as client:
+            for method, path, body in SCENARIO:
+                response = await client.request(method, PREFIX + path, json=body)
+                if response.status_code >= 400:
+                    print(f"{method} {path}: {response.status_code} {response.text[:200]}", file=sys.stderr)
+    unique = {}
+    for statement, parameters in queries:
+        if statement.lstrip().upper().startswith(EXPLAINABLE):
+            unique.setdefault(statement, parameters)
+    return unique
+
+
+def seq_scans(plan: dict, sizes: dict[str, float], min_rows: int):
+    # узлы Seq Scan по таблицам больше min_rows строк (маленькие справочники читать целиком нормально)
+    if plan.get("Node Type") == "Seq Scan" and sizes.get(plan["Relation Name"], 0) >= min_rows:
+        yield plan
+    for child in plan.get("Plans", ()):
+        yield from seq_scans(child, sizes, min_rows)
+
+
+async def explain(unique: dict[str, tuple], min_rows: int) -> list[dict]:
+    conn = await asyncpg.connect(settings.db_settings.asyncpg_database_url)
+    try:
+        sizes = dict(await conn.fetch("SELECT relname, reltuples FROM pg_class WHERE relkind IN ('r', 'p')"))
+        report = []
+        for statement, parameters in unique.items():
+            # ANALYZE выполняет запрос по-настоящему: изменения откатываются
+            tx = conn.transaction()
+            await tx.start()
+            try:
+                raw = await conn.fetchval("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, *(parameters or ()))
+            except asyncpg.PostgresError as e:
+                report.append({"statement": statement, "error": str(e)})
+                continue
+            finally:
+                await tx.rollback()
+            result = json.loads(raw)[0]
+            plan = result["Plan"]
+            report.append({
+                "statement": statement,
+                "time_ms": result["Execution Time"],
+                "shared_read": plan.get("Shared Read Blocks", 0),
+                "shared_hit": plan.get("Shared Hit Blocks", 0),
+                "seq_scans": [(node["Relation Name"], node.get("Actual Rows", 0)) for node in seq_scans(plan, sizes, min_rows)],
+            })
+        return report
+    finally:
+        await conn.close()
+
+
+def print_report(report: list[dict]):
+    flagged = 0
+    for item in sorted(report, key=lambda item: -item.get("time_ms", 0)):
+        statement = " ".join(item["statement"].split())
+        if "error" in item:
+            print(f"ОШИБКА  {statement[:160]}\n        {item['error']}")
+            continue
+        mark = "SEQSCAN" if item["seq_scans"] else "ok     "
+        flagged += bool(item["seq_scans"])
+        print(f"{mark} {item['time_ms']:9.2f} мс  hit={item['shared_hit']:<7} read={item['shared_read']:<7} {statement[:160]}")
+        for relation, rows in item["seq_scans"]:
+            print(f"        Seq Scan по {relation}: {rows} строк")
+    print(f"\nзапросов: {len(report)}, с последовательным чтением больших таблиц: {flagged}")
+    return flagged
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--min-rows", type=int, default=1000, help="порог размера таблицы, с которого Seq Scan считается проблемой")
+    parser.add_argument("--fail", action="store_true", help="код выхода 1, если найдены Seq Scan")
+    args = parser.parse_args()
+
+    unique = asyncio.run(collect())
+    report = asyncio.run(explain(unique, args.min_rows))
+    if print_report(report) and args.fail:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# Сравнение индекса "сколько напитков можно приготовить" с расчетом на лету в SQL.
+# Запуск из корня проекта: python -m bench.makeable --repeat 2000
+import argparse
+import asyncio
+from time import perf_counter
+from sqlalchemy import select, func
+from core.db import AsyncSessionLocal, DEFAULT_SHOP
+from core.makeable import makeable_indexes
+from models.ModelBase import DrinkIngredient, Inventory
+from main import app
+
+LIVE = (
+    select(DrinkIngredient.id_drink, func.min(func.floor(Inventory.quantity / DrinkIngredient.amount)))
+    .join(Inventory, Inventory.id_ingredient == DrinkIngredient.id_ingredient)
+    .where(DrinkIngredient.amount > 0, Inventory.id_shop == DEFAULT_SHOP)
+    .group_by(DrinkIngredient.id_drink)
+)
+
+
+async def run(args):
+    async with app.router.lifespan_context(app):
+        index = await makeable_indexes.get(DEFAULT_SHOP)
+
+        start = perf_counter()
+        for _ in range(args.repeat):
+            index = await makeable_indexes.get(DEFAULT_SHOP)
+            {id_drink: index.makeable[id_drink] for id_drink in index.menu.drinks}
+        cached = (perf_counter() - start) / args.repeat
+
+        async with AsyncSessionLocal() as session:
+            start = perf_counter()
+            for _ in range(args.repeat):
+                live = dict((await session.execute(LIVE)).all())
+            sql = (perf_counter() - start) / args.repeat
+
+    mismatched = {d: (index.makeable[d], live[d]) for d in live if index.makeable.get(d) != max(int(live[d]), 0)}
+    print(f"напитков: {len(index.menu.drinks)}, повторов: {args.repeat}")
+    print(f"индекс в памяти: {cached * 1e6:.1f} мкс на запрос")
+    print(f"расчет в SQL:    {sql * 1e6:.1f} мкс на запрос")
+    print("результаты совпадают" if not mismatched else f"РАСХОЖДЕНИЯ (индекс, sql): {mismatched}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=1000)
+    asyncio.run(run(parser.parse_args()))
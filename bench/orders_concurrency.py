@@ -0,0 +1,104 @@
+# Нагрузочный тест оформления заказов: параллельные POST /v1/Coffe/Orders и проверка остатков на складе.
+# Запуск из корня проекта: python -m bench.orders_concurrency --orders 5000 --concurrency 500
+# --readers 50: параллельно с заказами тяжелые GET /Orders?limit=1000 - заказы должны идти впереди (core/admission.py)
+import argparse
+import asyncio
+from time import perf_counter
+import httpx
+from sqlalchemy import select
+from bench.common import summarize
+from core import stock
+from core.config import settings
+from core.db import AsyncSessionLocal, DEFAULT_SHOP
+from core.menu_cache import menu_cache
+from core.write_behind import write_behind
+from models.ModelBase import Inventory, StockLease
+from main import app
+
+
+async def snapshot() -> dict:
+    # склад вместе с резервами write-behind (stock_leases): резерв уже списан со склада, но еще не продан.
+    # Подтвержденные, но не записанные заказы сначала дописываются в бд - иначе их расход сидит только в памяти воркера
+    if settings.app_settings.orders_write_behind:
+        await write_behind.flush()
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Inventory.id_ingredient, Inventory.quantity).where(Inventory.id_shop == DEFAULT_SHOP)
+        )
+        available = dict(result.all())
+        for id_ingredient, quantity in await session.execute(
+            select(StockLease.id_ingredient, StockLease.quantity).where(StockLease.id_shop == DEFAULT_SHOP)
+        ):
+            if id_ingredient in available:
+                available[id_ingredient] += quantity
+        return available
+
+
+async def expected_need(args) -> dict:
+    menu = await menu_cache.get()
+    return stock.consumption(menu.recipes.get(args.drink, ()), menu.ingredients[args.ingredient], args.sugar)
+
+
+async def run(args):
+    async with app.router.lifespan_context(app):
+        before = await snapshot()
+        need = await expected_need(args)
+        transport = httpx.ASGITransport(app=app)
+        limits = asyncio.Semaphore(args.concurrency)
+        payload = {"id_drink": args.drink, "id_ingredient": args.ingredient, "sugar_amount": args.sugar}
+        statuses, latencies = {}, []
+        reader_statuses = {}
+        done = asyncio.Event()
+
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            async def one():
+                async with limits:
+                    start = perf_counter()
+                    response = await client.post("/v1/Coffe/Orders", json=payload)
+                    latencies.append(perf_counter() - start)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+            async def reader():
+                while not done.is_set():
+                    response = await client.get("/v1/Coffe/Orders", params={"limit": 1000})
+                    reader_statuses[response.status_code] = reader_statuses.get(response.status_code, 0) + 1
+                    if response.status_code != 200:
+                        await asyncio.sleep(float(response.headers.get("Retry-After", 1)) / 10)
+
+            stock.stats.update(reservations=0, rejected=0, lock_wait_seconds=0.0)
+            readers = [asyncio.create_task(reader()) for _ in range(args.readers)]
+            start = perf_counter()
+            await asyncio.gather(*(one() for _ in range(args.orders)))
+            elapsed = perf_counter() - start
+            done.set()
+            await asyncio.gather(*readers)
+
+        after = await snapshot()
+
+    # остаток вместе с резервами должен уменьшиться ровно на расход успешных заказов и не уйти в минус
+    ok = statuses.get(200, 0)
+    broken = {
+        i: (before[i], after[i], need[i] * ok)
+        for i in need
+        if i in before and (before[i] - need[i] * ok != after[i] or after[i] < 0)
+    }
+    report = summarize(latencies, args.orders - ok, elapsed)
+    print(f"заказов: {args.orders}, параллельно: {args.concurrency}, статусы: {statuses}")
+    if args.readers:
+        print(f"чтение GET /Orders, параллельно: {args.readers}, статусы: {reader_statuses}")
+    print(f"пропускная способность: {args.orders / elapsed:.1f} заказов/с за {elapsed:.2f} с")
+    print(f"задержка p50/p95/p99: {report['p50_ms']:.1f} / {report['p95_ms']:.1f} / {report['p99_ms']:.1f} мс")
+    print(f"ожидание блокировок склада: всего {stock.stats['lock_wait_seconds']:.2f} с, "
+          f"в среднем {stock.stats['lock_wait_seconds'] / max(stock.stats['reservations'], 1) * 1000:.2f} мс")
+    print("остатки корректны" if not broken else f"ОШИБКА остатков (было, стало, расход): {broken}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--drink", type=int, default=1)
+    parser.add_argument("--ingredient", type=int, default=1)
+    parser.add_argument("--sugar", type=int, default=0)
+    parser.add_argument("--readers", type=int, default=0, help="параллельных чтений истории заказов во время теста")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,116 @@
+# Нагрузочный прогон эндпоинтов с p50/p95/p99 и сравнением с сохраненной базовой линией.
+#   python -m bench.run --mode asgi --requests 2000 --save local
+#   python -m bench.run --mode http --url http://127.0.0.1:8001 --processes 4 --compare local
+import argparse
+import asyncio
+import multiprocessing
+import random
+import sys
+from time import perf_counter
+import httpx
+from bench.common import summarize, print_report, save_baseline, compare
+from bench.seed import DRINKS, INGREDIENTS
+
+PREFIX = "/v1/Coffe"
+ENDPOINTS = {
+    "GET /Drinks": ("GET", "/Drinks"),
+    "GET /Orders": ("GET", "/Orders"),
+    "POST /Orders": ("POST", "/Orders"),
+    "GET /Inventory": ("GET", "/Inventory"),
+    "GET /IngredintDrink": ("GET", "/IngredintDrink"),
+}
+
+
+def order_body(rng: random.Random) -> dict:
+    return {"id_drink": rng.randint(1, DRINKS), "id_ingredient": rng.randint(1, INGREDIENTS), "sugar_amount": rng.randint(0, 3)}
+
+
+async def drive(client: httpx.AsyncClient, endpoint: str, requests: int, concurrency: int, seed: int):
+    method, path = ENDPOINTS[endpoint]
+    rng = random.Random(seed)
+    latencies, errors = [], 0
+    queue = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in queue:
+            body = order_body(rng) if method == "POST" else None
+            start = perf_counter()
+            response = await client.request(method, PREFIX + path, json=body)
+            latencies.append(perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, perf_counter() - start
+
+
+async def run_asgi(args) -> dict:
+    # настоящее приложение main:app в том же процессе, без сети
+    from main import app
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for endpoint in args.endpoints:
+                latencies, errors, elapsed = await drive(client, endpoint, args.requests, args.concurrency, args.seed)
+                results[endpoint] = summarize(latencies, errors, elapsed)
+    return results
+
+
+def http_process(job):
+    url, endpoint, requests, concurrency, seed = job
+
+    async def go():
+        limits = httpx.Limits(max_connections=concurrency)
+        async with httpx.AsyncClient(base_url=url, timeout=None, limits=limits) as client:
+            return await drive(client, endpoint, requests, concurrency, seed)
+
+    return asyncio.run(go())
+
+
+def run_http(args) -> dict:
+    # внешний сервер (uvicorn с несколькими воркерами), нагрузку дают несколько процессов
+    results = {}
+    per_process = args.requests // args.processes
+    with multiprocessing.Pool(args.processes) as pool:
+        for endpoint in args.endpoints:
+            jobs = [(args.url, endpoint, per_process, args.concurrency, args.seed + n) for n in range(args.processes)]
+            start = perf_counter()
+            parts = pool.map(http_process, jobs)
+            elapsed = perf_counter() - start
+            latencies = [value for part in parts for value in part[0]]
+            results[endpoint] = summarize(latencies, sum(part[1] for part in parts), elapsed)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=("asgi", "http"), default="asgi")
+    parser.add_argument("--url", default="http://127.0.0.1:8001")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=32, help="одновременных запросов на процесс")
+    parser.add_argument("--requests", type=int, default=1000, help="запросов на эндпоинт")
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS), choices=list(ENDPOINTS))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", metavar="NAME", help="сохранить результат как базовую линию bench/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="сравнить с базовой линией, код выхода 1 при регрессии")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    results = asyncio.run(run_asgi(args)) if args.mode == "asgi" else run_http(args)
+    print_report(results)
+    if args.save:
+        save_baseline(args.save, results)
+    if args.compare:
+        regressions = compare(args.compare, results, args.tolerance)
+        for line in regressions:
+            print("РЕГРЕССИЯ", line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
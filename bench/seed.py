@@ -0,0 +1,89 @@
+# Заполнение локальной бд для бенчмарков: меню, рецепты, склад и миллионы заказов через COPY.
+# Запуск из корня проекта: python -m bench.seed --orders 2000000 --reset
+import argparse
+import asyncio
+import random
+from datetime import datetime, timedelta
+import asyncpg
+from core.config import settings
+from core.db import get_engine
+from core import partitions
+from core.stock import SUGAR_ID
+
+DRINKS = 40
+INGREDIENTS = 30
+CHUNK = 100_000
+
+
+def menu(rng: random.Random):
+    units = ("г", "мл", "шт")
+    ingredients = [
+        (i, f"Ингредиент {i}" if i != SUGAR_ID else "Сахар", rng.choice(units) if i != SUGAR_ID else "г",
+         i % 3 != 0, rng.choice((0, 10, 20, 30, 50)), rng.choice((0.05, 0.1, 0.5, 1.2, 8.0)))
+        for i in range(1, INGREDIENTS + 1)
+    ]
+    drinks = [(d, f"Напиток {d}", rng.randrange(90, 400)) for d in range(1, DRINKS + 1)]
+    recipes = []
+    for d in range(1, DRINKS + 1):
+        for i in rng.sample([i for i in range(1, INGREDIENTS + 1) if i != SUGAR_ID], rng.randint(2, 5)):
+            recipes.append((d, i, rng.choice((5, 10, 18, 30, 100, 150, 250))))
+    inventory = [(i, 90_000_000) for i in range(1, INGREDIENTS + 1)]
+    return drinks, ingredients, recipes, inventory
+
+
+def orders_chunk(rng: random.Random, start_id: int, count: int, since: datetime, span: float):
+    # популярность напитков неравномерная, заказы разбросаны по периоду span секунд
+    addons = [i for i in range(1, INGREDIENTS + 1)]
+    for id_order in range(start_id, start_id + count):
+        yield (
+            id_order,
+            min(int(rng.paretovariate(1.2)), DRINKS),
+            rng.choice(addons),
+            rng.randint(0, 3),
+            "paid",
+            since + timedelta(seconds=rng.random() * span),
+        )
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    engine = get_engine()
+    conn = await asyncpg.connect(settings.db_settings.asyncpg_database_url)
+    try:
+        if args.reset:
+            await conn.execute("TRUNCATE orders, sales_hourly, inventory, drink_ingredient, drink, ingredient RESTART IDENTITY CASCADE")
+        drinks, ingredients, recipes, inventory = menu(rng)
+        await conn.copy_records_to_table("ingredient", records=ingredients,
+                                         columns=["id_ingredient", "name_ingredient", "unit", "is_visible", "portion", "unit_cost"])
+        await conn.copy_records_to_table("drink", records=drinks, columns=["id_drink", "name_drink", "price"])
+        await conn.copy_records_to_table("drink_ingredient", records=recipes, columns=["id_drink", "id_ingredient", "amount"])
+        await conn.copy_records_to_table("inventory", records=inventory, columns=["id_ingredient", "quantity"])
+
+        since = datetime.now() - timedelta(days=args.days)
+        # секции на весь период заранее, чтобы COPY не складывал историю в orders_default
+        async with engine.begin() as sa_conn:
+            await sa_conn.run_sync(partitions.ensure, settings.app_settings.orders_partitions_ahead, since)
+        span = args.days * 86400
+        for start in range(1, args.orders + 1, CHUNK):
+            count = min(CHUNK, args.orders - start + 1)
+            await conn.copy_records_to_table(
+                "orders", records=orders_chunk(rng, start, count, since, span),
+                columns=["id_order", "id_drink", "id_ingredient", "sugar_amount", "payment_status", "created_at"],
+            )
+            print(f"заказов загружено: {start + count - 1}")
+        await conn.execute("SELECT setval(pg_get_serial_sequence('orders', 'id_order'), (SELECT max(id_order) FROM orders))")
+        for table in ("drink", "ingredient"):
+            await conn.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id_{table}'), (SELECT max(id_{table}) FROM {table}))")
+        await conn.execute("ANALYZE")
+    finally:
+        await conn.close()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="очистить таблицы перед загрузкой")
+    asyncio.run(run(parser.parse_args()))
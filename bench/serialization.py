@@ -0,0 +1,86 @@
+# Микробенчмарк чтения списков: ORM + Pydantic (прежний путь) против колонок + orjson (fast_read) по эндпоинтам.
+# Запуск из корня проекта: python -m bench.serialization --repeat 200 --limit 1000
+import argparse
+import asyncio
+from time import perf_counter
+import orjson
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+from core import fast_read
+from core.db import AsyncSessionLocal, DEFAULT_SHOP
+from core.menu_cache import menu_cache
+from models.ModelBase import Order, Inventory, DrinkIngredient
+from models.Schemas import OrderGetSchema, InventoryGetSchema, IngredientDrinkGetSchema
+from main import app
+
+
+def orm_json(schema, objects) -> bytes:
+    adapter = TypeAdapter(list[schema])
+    return adapter.dump_json(adapter.validate_python(objects, from_attributes=True))
+
+
+async def orm_orders(session, limit):
+    stmt = (
+        select(Order).options(joinedload(Order.drink), joinedload(Order.ingredient))
+        .order_by(Order.created_at.desc(), Order.id_order.desc()).limit(limit)
+    )
+    return orm_json(OrderGetSchema, (await session.execute(stmt)).scalars().all())
+
+
+async def fast_orders(session, limit):
+    orders, _ = await fast_read.fetch_orders(session, [], limit)
+    return orjson.dumps(orders)
+
+
+async def orm_inventory(session, limit):
+    stmt = select(Inventory).where(Inventory.id_shop == DEFAULT_SHOP).options(joinedload(Inventory.ingredient))
+    return orm_json(InventoryGetSchema, (await session.execute(stmt)).scalars().all())
+
+
+async def fast_inventory(session, limit):
+    return orjson.dumps(await fast_read.fetch_inventory(session, DEFAULT_SHOP))
+
+
+async def orm_recipes(session, limit):
+    stmt = select(DrinkIngredient).options(joinedload(DrinkIngredient.drink), joinedload(DrinkIngredient.ingredient))
+    return orm_json(IngredientDrinkGetSchema, (await session.execute(stmt)).scalars().all())
+
+
+async def cached_recipes(session, limit):
+    menu = await menu_cache.get()
+    return menu.payload("recipes", DEFAULT_SHOP)[0]
+
+
+CASES = {
+    "/Orders": (orm_orders, fast_orders),
+    "/Inventory": (orm_inventory, fast_inventory),
+    "/IngredintDrink": (orm_recipes, cached_recipes),
+}
+
+
+async def timed(func, session, args) -> tuple[float, bytes]:
+    body = await func(session, args.limit)
+    start = perf_counter()
+    for _ in range(args.repeat):
+        await func(session, args.limit)
+    return (perf_counter() - start) / args.repeat, body
+
+
+async def run(args):
+    async with app.router.lifespan_context(app):
+        async with AsyncSessionLocal() as session:
+            for endpoint, (slow, fast) in CASES.items():
+                slow_time, slow_body = await timed(slow, session, args)
+                fast_time, fast_body = await timed(fast, session, args)
+                # сравниваем распарсенные ответы: порядок строк без ORDER BY может отличаться
+                same = sorted(map(orjson.dumps, orjson.loads(slow_body))) == sorted(map(orjson.dumps, orjson.loads(fast_body)))
+                print(f"{endpoint:16} orm+pydantic {slow_time * 1000:8.2f} мс   быстрый путь {fast_time * 1000:8.2f} мс   "
+                      f"x{slow_time / fast_time:5.1f}   {'ответы совпадают' if same else 'ОТВЕТЫ РАЗЛИЧАЮТСЯ'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=1000)
+    asyncio.run(run(parser.parse_args()))
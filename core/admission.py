@@ -0,0 +1,230 @@
+# Контроль допуска перед приложением: при всплеске заказов запросы ждут не в get_db до таймаута пула, а в очереди
+# с приоритетами, и лишние отклоняются сразу с Retry-After.
+# - классы запросов: orders (POST /Orders, /Orders/batch, /Carts) впереди write, read и reporting (аналитика, история заказов);
+# - лимит одновременных запросов на шард = емкость пула (pool_size + max_overflow), у каждого класса своя доля этого лимита;
+# - освободившийся слот получает класс с наивысшим приоритетом; оценка ожидания в очереди больше бюджета класса - сразу 503;
+# - токен-бакет на клиента и класс (X-Client-Id или ip): превышение частоты - 429.
+# SSE, websocket, /metrics и документация не ограничиваются: долгие подключения заняли бы слоты навсегда.
+# Ответы из памяти воркера (меню, makeable, /Quote) соединения пула не берут: для них только токен-бакет, без слота.
+import asyncio
+import math
+import re
+from collections import OrderedDict, deque
+from functools import cached_property
+from time import monotonic, perf_counter
+from starlette.datastructures import Headers
+from core.config import settings
+from core.db import DEFAULT_SHOP, shards
+from core.fast_read import json_response
+from core.metrics import Counter, Gauge, Histogram
+
+CLASSES = ("orders", "write", "read", "reporting")  # по убыванию приоритета
+ORDER_PATHS = ("/Orders", "/Orders/batch", "/Carts")
+MEMORY_PATHS = {  # ответы из кэша меню и индекса makeable
+    ("GET", "/Drinks"), ("GET", "/Ingredients"), ("GET", "/IngredintDrink"), ("GET", "/Inventory/makeable"), ("POST", "/Quote"),
+}
+PATH = re.compile(r"^/v1(?:/Shops/(\d+))?/Coffe(/Analytics|/Events)?(/.*)?$")
+
+rejected_total = Counter("admission_rejected_total", "Запросы, отклоненные контролем допуска, по классу и причине")
+queue_wait = Histogram("admission_queue_seconds", "Ожидание слота в очереди допуска по классам")
+
+
+class Overloaded(Exception):
+    def __init__(self, status: int, reason: str, retry_after: float):
+        self.status, self.reason, self.retry_after = status, reason, retry_after
+
+
+def classify(method: str, path: str) -> tuple[str | None, int]:
+    # (класс или None - без ограничений, точка) по пути до маршрутизации
+    match = PATH.match(path)
+    if match is None or match.group(2) == "/Events":
+        return None, DEFAULT_SHOP
+    id_shop = int(match.group(1)) if match.group(1) else DEFAULT_SHOP
+    rest = match.group(3) or ""
+    if match.group(2) == "/Analytics" or (method == "GET" and rest == "/Orders"):
+        return "reporting", id_shop
+    if method == "POST" and rest in ORDER_PATHS:
+        return "orders", id_shop
+    return ("read" if method in ("GET", "HEAD") or rest == "/Quote" else "write"), id_shop
+
+
+def in_memory(method: str, path: str) -> bool:
+    match = PATH.match(path)
+    return match is not None and match.group(2) is None and (method, match.group(3) or "") in MEMORY_PATHS
+
+
+class RateLimiter:
+    # токен-бакеты по (клиент, класс); бакеты давно не обращавшихся клиентов вытесняются по LRU
+    def __init__(self, rates: dict[str, float], burst: float, max_clients: int):
+        self.rates = rates
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: OrderedDict[tuple[str, str], list[float]] = OrderedDict()
+
+    def check(self, client: str, request_class: str):
+        rate = self.rates.get(request_class, 0.0)
+        if rate <= 0:
+            return
+        capacity = max(rate * self.burst, 1.0)
+        key = (client, request_class)
+        now = monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [capacity, now]
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        if bucket[0] < 1:
+            raise Overloaded(429, "rate_limited", (1 - bucket[0]) / rate)
+        bucket[0] -= 1
+
+
+class Limiter:
+    # слоты одного шарда; ожидающие по классам, освободившийся слот - первому ожидающему самого приоритетного класса
+    def __init__(self, capacity: int, shares: dict[str, float], budgets: dict[str, float]):
+        self.capacity = capacity
+        self.limits = {c: max(1, min(capacity, int(capacity * shares.get(c, 1.0)))) for c in CLASSES}
+        self.budgets = budgets
+        self.in_use = 0
+        self.by_class = dict.fromkeys(CLASSES, 0)
+        self.waiters: dict[str, deque[asyncio.Future]] = {c: deque() for c in CLASSES}
+        self.service = dict.fromkeys(CLASSES, 0.01)  # скользящее среднее времени обработки, с
+
+    def _free(self, request_class: str) -> bool:
+        return self.in_use < self.capacity and self.by_class[request_class] < self.limits[request_class]
+
+    def _take(self, request_class: str):
+        self.in_use += 1
+        self.by_class[request_class] += 1
+
+    def _ahead(self, request_class: str) -> int:
+        # ожидающие, которые получат слот раньше: свой класс целиком (очередь по порядку) и более приоритетные классы,
+        # не упершиеся в свою долю - упершиеся ждут освобождения слота своего класса и свободный слот не займут
+        index = CLASSES.index(request_class)
+        return len(self.waiters[request_class]) + sum(
+            len(self.waiters[c]) for c in CLASSES[:index] if self.by_class[c] < self.limits[c]
+        )
+
+    async def acquire(self, request_class: str):
+        if self._free(request_class) and not self._ahead(request_class):
+            self._take(request_class)
+            return
+        # ожидание: очередь впереди, пропущенная через доступные классу слоты
+        budget = self.budgets.get(request_class, 1.0)
+        estimate = (self._ahead(request_class) + 1) * self.service[request_class] / self.limits[request_class]
+        if estimate > budget:
+            raise Overloaded(503, "queue_full", estimate)
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters[request_class].append(waiter)
+        try:
+            async with asyncio.timeout(budget):
+                await waiter
+        except TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                return  # слот выдан одновременно с таймаутом
+            self._forget(request_class, waiter)
+            raise Overloaded(503, "timeout", max(estimate, budget))
+        except asyncio.CancelledError:
+            # клиент ушел: выданный слот возвращается следующему
+            if waiter.done() and not waiter.cancelled():
+                self.release(request_class, None)
+            else:
+                self._forget(request_class, waiter)
+            raise
+
+    def _forget(self, request_class: str, waiter: asyncio.Future):
+        # отмененного ожидающего release мог уже вынуть из очереди
+        if waiter in self.waiters[request_class]:
+            self.waiters[request_class].remove(waiter)
+
+    def release(self, request_class: str, elapsed: float | None):
+        self.in_use -= 1
+        self.by_class[request_class] -= 1
+        if elapsed is not None:
+            self.service[request_class] += (elapsed - self.service[request_class]) * 0.1
+        for waiting_class in CLASSES:
+            queue = self.waiters[waiting_class]
+            while queue and self._free(waiting_class):
+                waiter = queue.popleft()
+                if not waiter.done():
+                    self._take(waiting_class)
+                    waiter.set_result(None)
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self.waiters.values())
+
+
+class Admission:
+    # настройки читаются при первом запросе, лимитеры шардов создаются при первом обращении к шарду
+    def __init__(self):
+        self.limiters: dict[int, Limiter] = {}
+
+    @cached_property
+    def app_settings(self):
+        return settings.app_settings
+
+    @cached_property
+    def rates(self) -> RateLimiter:
+        return RateLimiter(self.app_settings.admission_rates, self.app_settings.admission_burst, self.app_settings.admission_clients_max)
+
+    def limiter(self, id_shop: int) -> Limiter:
+        number = shards.shard(id_shop).number
+        if number not in self.limiters:
+            db = settings.db_settings
+            capacity = self.app_settings.admission_capacity or db.db_pool_size + max(db.db_max_overflow, 0)
+            self.limiters[number] = Limiter(capacity, self.app_settings.admission_shares, {
+                c: ms / 1000 for c, ms in self.app_settings.admission_budget_ms.items()
+            })
+        return self.limiters[number]
+
+    def client(self, scope) -> str:
+        header = self.app_settings.admission_client_header
+        if header:
+            value = Headers(scope=scope).get(header)
+            if value:
+                return value
+        return scope["client"][0] if scope.get("client") else "unknown"
+
+
+admission = Admission()
+
+Gauge("admission_in_flight", "Запросы, занимающие слоты допуска", lambda: sum(l.in_use for l in admission.limiters.values()))
+Gauge("admission_queued", "Запросы в очереди допуска", lambda: sum(l.queued for l in admission.limiters.values()))
+
+
+class AdmissionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not admission.app_settings.admission_enabled:
+            return await self.app(scope, receive, send)
+        request_class, id_shop = classify(scope["method"], scope["path"])
+        if request_class is None:
+            return await self.app(scope, receive, send)
+
+        limiter = None if in_memory(scope["method"], scope["path"]) else admission.limiter(id_shop)
+        start = perf_counter()
+        try:
+            admission.rates.check(admission.client(scope), request_class)
+            if limiter is not None:
+                await limiter.acquire(request_class)
+        except Overloaded as error:
+            rejected_total.inc(**{"class": request_class, "reason": error.reason})
+            detail = "Слишком много запросов" if error.status == 429 else "Сервер перегружен, повторите позже"
+            response = json_response({"detail": detail}, headers={"Retry-After": str(max(1, math.ceil(error.retry_after)))})
+            response.status_code = error.status
+            return await response(scope, receive, send)
+        if limiter is None:
+            return await self.app(scope, receive, send)
+        queued = perf_counter() - start
+        queue_wait.observe(queued, **{"class": request_class})
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(request_class, perf_counter() - start - queued)
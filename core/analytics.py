@@ -0,0 +1,142 @@
+# Аналитика продаж по почасовым агрегатам заказов (sales_hourly) и корзин (cart_sales_hourly, cart_addons_hourly):
+# размер запросов зависит от числа часов, а не заказов.
+# Пересчет агрегатов по всей истории: python -m core.analytics backfill
+import asyncio
+import sys
+from datetime import datetime
+from sqlalchemy import select, func, text, delete, insert, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.ModelBase import SalesHourly, CartSalesHourly, CartAddonsHourly, Order, CartOrder, CartLine, CartLineAddon, Drink, Ingredient
+
+
+def _range(stmt, bucket, date_from: datetime | None, date_to: datetime | None):
+    # границы округляются до часа: агрегаты хранятся с почасовой точностью
+    if date_from is not None:
+        stmt = stmt.where(bucket >= func.date_trunc("hour", date_from))
+    if date_to is not None:
+        stmt = stmt.where(bucket < func.date_trunc("hour", date_to))
+    return stmt
+
+
+def _drink_sales(id_shop: int, date_from, date_to, id_drink: int | None = None):
+    # одиночные заказы и напитки корзин одним подзапросом: (bucket, id_drink, orders, revenue)
+    parts = []
+    for table, orders in ((SalesHourly, SalesHourly.orders), (CartSalesHourly, CartSalesHourly.quantity)):
+        stmt = select(table.bucket, table.id_drink, orders.label("orders"), table.revenue).where(table.id_shop == id_shop)
+        if id_drink is not None:
+            stmt = stmt.where(table.id_drink == id_drink)
+        parts.append(_range(stmt, table.bucket, date_from, date_to))
+    return union_all(*parts).subquery()
+
+
+def _addon_sales(id_shop: int, date_from, date_to):
+    parts = [
+        _range(select(table.id_ingredient, orders.label("orders"), table.revenue).where(table.id_shop == id_shop),
+               table.bucket, date_from, date_to)
+        for table, orders in ((SalesHourly, SalesHourly.orders), (CartAddonsHourly, CartAddonsHourly.quantity))
+    ]
+    return union_all(*parts).subquery()
+
+
+async def drinks_summary(session: AsyncSession, id_shop: int, date_from=None, date_to=None):
+    sales = _drink_sales(id_shop, date_from, date_to)
+    stmt = (
+        select(Drink.id_drink, Drink.name_drink,
+               func.sum(sales.c.orders).label("orders"), func.sum(sales.c.revenue).label("revenue"))
+        .join(Drink, Drink.id_drink == sales.c.id_drink)
+        .group_by(Drink.id_drink, Drink.name_drink)
+        .order_by(func.sum(sales.c.revenue).desc())
+    )
+    return (await session.execute(stmt)).all()
+
+
+async def addons_summary(session: AsyncSession, id_shop: int, date_from=None, date_to=None):
+    sales = _addon_sales(id_shop, date_from, date_to)
+    stmt = (
+        select(Ingredient.id_ingredient, Ingredient.name_ingredient,
+               func.sum(sales.c.orders).label("orders"), func.sum(sales.c.revenue).label("revenue"))
+        .join(Ingredient, Ingredient.id_ingredient == sales.c.id_ingredient)
+        .group_by(Ingredient.id_ingredient, Ingredient.name_ingredient)
+        .order_by(func.sum(sales.c.orders).desc())
+    )
+    return (await session.execute(stmt)).all()
+
+
+async def timeline(session: AsyncSession, id_shop: int, bucket: str, date_from=None, date_to=None, id_drink: int | None = None):
+    sales = _drink_sales(id_shop, date_from, date_to, id_drink)
+    period = func.date_trunc(bucket, sales.c.bucket).label("bucket")
+    stmt = (
+        select(period, func.sum(sales.c.orders).label("orders"), func.sum(sales.c.revenue).label("revenue"))
+        .group_by(period)
+        .order_by(period)
+    )
+    return (await session.execute(stmt)).all()
+
+
+async def backfill(session: AsyncSession) -> int:
+    # пересчет агрегатов по всей истории; вставка заказов на время пересчета блокируется, чтобы не посчитать их дважды
+    await session.execute(text("LOCK TABLE orders IN SHARE MODE"))
+    # агрегаты месяцев, выгруженных в архив (core/partitions.py), сохраняются: пересчитываются часы от самого старого заказа
+    oldest = select(func.date_trunc("hour", func.min(Order.created_at))).scalar_subquery()
+    await session.execute(delete(SalesHourly).where(SalesHourly.bucket >= oldest))
+    hour = func.date_trunc("hour", Order.created_at)
+    rows = (
+        select(hour, Order.id_shop, Order.id_drink, Order.id_ingredient,
+               func.count(), func.sum(Order.sugar_amount), func.sum(Drink.price))
+        .join(Drink, Drink.id_drink == Order.id_drink)
+        .group_by(hour, Order.id_shop, Order.id_drink, Order.id_ingredient)
+    )
+    result = await session.execute(
+        insert(SalesHourly).from_select(
+            ["bucket", "id_shop", "id_drink", "id_ingredient", "orders", "sugar_amount", "revenue"], rows
+        )
+    )
+    count = result.rowcount
+
+    # корзины не архивируются: их агрегаты пересчитываются целиком
+    await session.execute(text("LOCK TABLE cart_lines, cart_line_addons IN SHARE MODE"))
+    await session.execute(delete(CartSalesHourly))
+    await session.execute(delete(CartAddonsHourly))
+    hour = func.date_trunc("hour", CartOrder.created_at)
+    lines = (
+        select(hour, CartOrder.id_shop, CartLine.id_drink, func.sum(CartLine.quantity),
+               func.sum(CartLine.sugar_amount * CartLine.quantity), func.sum(Drink.price * CartLine.quantity))
+        .join(CartOrder, CartOrder.id_cart == CartLine.id_cart)
+        .join(Drink, Drink.id_drink == CartLine.id_drink)
+        .group_by(hour, CartOrder.id_shop, CartLine.id_drink)
+    )
+    result = await session.execute(
+        insert(CartSalesHourly).from_select(["bucket", "id_shop", "id_drink", "quantity", "sugar_amount", "revenue"], lines)
+    )
+    count += result.rowcount
+    addons = (
+        select(hour, CartOrder.id_shop, CartLineAddon.id_ingredient, func.sum(CartLine.quantity),
+               func.sum(Drink.price * CartLine.quantity))
+        .join(CartLine, CartLine.id_line == CartLineAddon.id_line)
+        .join(CartOrder, CartOrder.id_cart == CartLine.id_cart)
+        .join(Drink, Drink.id_drink == CartLine.id_drink)
+        .group_by(hour, CartOrder.id_shop, CartLineAddon.id_ingredient)
+    )
+    result = await session.execute(
+        insert(CartAddonsHourly).from_select(["bucket", "id_shop", "id_ingredient", "quantity", "revenue"], addons)
+    )
+    count += result.rowcount
+    await session.commit()
+    return count
+
+
+async def main(command: str):
+    from core.db import engine, shards
+
+    if command != "backfill":
+        raise SystemExit("Использование: python -m core.analytics backfill")
+    for shard in shards.shards:
+        async with shard.sessionmaker() as session:
+            count = await backfill(session)
+        print(f"Шард {shard.number}: пересчитано почасовых агрегатов: {count}")
+    await shards.dispose()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else ""))
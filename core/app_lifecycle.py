@@ -1,23 +1,140 @@
-import asyncpg
-from contextlib import asynccontextmanager
+import asyncio
+import logging
+from contextlib import asynccontextmanager, contextmanager
+from time import perf_counter
 from fastapi import FastAPI
-from core.db import engine
+from core.db import DEFAULT_SHOP, get_engine, replicas, shards, warm_up
 from core.config import settings
-from models.Base import Base
+from core.listener import listener, listener_for, shard_listeners
+from core.menu_cache import menu_cache
+from core.makeable import makeable_indexes
+from core.metrics import Gauge
+from core.write_behind import write_behind
+from core import migrations
+from core.idempotency import idempotency
+from core.partitions import maintenance as partition_maintenance
+from core.events import broker
+from core.conditional import change_markers
+from core.shops import check_directory, menu_sync
+from models.triggers import MENU_CHANNEL, STOCK_CHANNEL, ORDERS_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+# длительность этапов старта воркера, секунды; "ready" - от начала lifespan до приема запросов
+startup_phases: dict[str, float] = {}
+
+Gauge("app_startup_seconds", "Старт воркера: от начала lifespan до приема запросов", lambda: startup_phases.get("ready", 0.0))
+
+
+@contextmanager
+def phase(name: str):
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        startup_phases[name] = perf_counter() - start
+
+
+async def deferred(name: str, func, *args):
+    # прогрев после yield: запросы уже принимаются, ошибка фонового этапа не роняет воркер
+    try:
+        with phase(name):
+            await func(*args)
+    except Exception:
+        logger.exception("Фоновый этап старта %s не выполнен", name)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI): #?
+    # FAST_START: до первого запроса только то, без чего ответ будет неверным (схема, меню, LISTEN, склад write-behind);
+    # остальной пул, индекс makeable и проверка секций заказов догреваются в фоне
+    db = settings.db_settings
+    fast = settings.app_settings.fast_start
+    pool_warmup = db.db_pool_size if db.db_pool_warmup is None else db.db_pool_warmup
+    background = []
+    started = perf_counter()
+
+    # проверка подключения и прогрев пула тем же движком, которым пойдут запросы
     try:
-        conn = await asyncpg.connect(settings.db_settings.asyncpg_database_url)
-        await conn.close()
+        with phase("warm_up"):
+            await warm_up(min(pool_warmup, 1) if fast else pool_warmup)
         print("Подключение успешно!")
     except Exception as e:
         print(f"Ошибка подключения: {e}")
         raise RuntimeError("Не удалось подключиться")
 
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all) #DeclarativeBase
+    # схема меняется только миграциями (core/migrations.py), воркер проверяет версию на всех шардах сразу
+    with phase("migrations"):
+        auto_migrate = db.db_auto_migrate or settings.app_settings.dev_mode
+        await asyncio.gather(*(migrations.ensure(shard.engine, auto_migrate=auto_migrate) for shard in shards.shards))
+    # точки с данными не должны переехать в другой шард после изменения DB_SHARD_URLS / DB_SHARD_MAP
+    with phase("shards"):
+        await check_directory()
+
+    # меню и реестр точек живут на основном шарде, грузим при старте, дальше сброс по уведомлениям из бд и по ttl
+    with phase("menu"):
+        await menu_cache.load()
+    if fast:
+        background.append(("makeable", makeable_indexes.get, DEFAULT_SHOP))
+    else:
+        with phase("makeable"):
+            await makeable_indexes.get(DEFAULT_SHOP)
+    listener.subscribe(MENU_CHANNEL, menu_cache.invalidate)
+    listener.on_reconnect.append(menu_cache.invalidate)
+    if len(shards.shards) > 1:
+        # копия меню на дополнительных шардах: на нее ссылаются внешние ключи заказов и по ней считается выручка
+        listener.subscribe(MENU_CHANNEL, menu_sync.schedule)
+        listener.on_reconnect.append(menu_sync.schedule)
+        if fast:
+            background.append(("menu_sync", menu_sync.run))
+        else:
+            with phase("menu_sync"):
+                await menu_sync.run()
+    listeners = (listener, *shard_listeners().values())
+    for shard_listener in listeners:
+        shard_listener.subscribe(STOCK_CHANNEL, makeable_indexes.on_stock_changed)
+        shard_listener.on_reconnect.append(makeable_indexes.invalidate)
+        # push-канал /Coffe/Events из того же LISTEN-подключения
+        shard_listener.subscribe(ORDERS_CHANNEL, broker.on_order_created)
+        shard_listener.subscribe(STOCK_CHANNEL, broker.on_stock_changed)
+        shard_listener.on_reconnect.append(broker.reset)
+        # маркеры изменений для ETag списков заказов и склада
+        shard_listener.subscribe(ORDERS_CHANNEL, change_markers.on_order_created)
+        shard_listener.subscribe(STOCK_CHANNEL, change_markers.on_stock_changed)
+        shard_listener.on_reconnect.append(change_markers.invalidate)
+    with phase("listen"):
+        # подключения LISTEN и первая проверка реплик независимы, открываются параллельно
+        await asyncio.gather(*(shard_listener.start() for shard_listener in listeners), replicas.start())
+    await idempotency.start()
+    if fast:
+        # секции создаются на несколько месяцев вперед, до первого запроса их проверять незачем
+        background.append(("partitions", partition_maintenance.start))
+        if pool_warmup > 1:
+            background.append(("pool", warm_up, pool_warmup))
+    else:
+        with phase("partitions"):
+            await partition_maintenance.start()
+    if settings.app_settings.orders_write_behind:
+        wb_listener = listener_for(DEFAULT_SHOP)
+        wb_listener.subscribe(STOCK_CHANNEL, write_behind.on_stock_changed)
+        wb_listener.on_reconnect.append(lambda: asyncio.create_task(write_behind.load_stock()))
+        with phase("write_behind"):
+            await write_behind.start()
+
+    startup_phases["ready"] = perf_counter() - started
+    print("Старт воркера: " + ", ".join(f"{name} {seconds * 1000:.0f} мс" for name, seconds in startup_phases.items()))
+    tasks = [asyncio.create_task(deferred(*step)) for step in background]
 
     yield
-    await engine.dispose()
+    for task in tasks:
+        task.cancel()
+    if settings.app_settings.orders_write_behind:
+        await write_behind.stop()
+    await menu_sync.stop()
+    await partition_maintenance.stop()
+    await idempotency.stop()
+    await replicas.stop()
+    for shard_listener in listeners:
+        await shard_listener.stop()
+    await shards.dispose()
+    await get_engine().dispose()
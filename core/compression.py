@@ -0,0 +1,175 @@
+# Сжатие ответов gzip/brotli: чистый ASGI-middleware, как MetricsMiddleware.
+# Ответ одним телом сжимается целиком, если он не меньше compression_min_size; потоковый (ndjson) - по частям с flush,
+# чтобы клиент получал строки сразу, а не после конца выгрузки. Сжатые тела ответов с ETag кэшируются по (хэш тела, кодировка):
+# готовые ответы меню и неизменившиеся страницы повторно не сжимаются. Ключ - само тело, а не ETag: ETag списков заказов
+# и склада - маркеры, которые догоняют бд по уведомлению, и под прежним ETag может прийти уже другое тело.
+# brotli - необязательная зависимость, без нее только gzip.
+import gzip
+import hashlib
+import zlib
+from collections import OrderedDict
+from starlette.datastructures import Headers, MutableHeaders
+from core.config import settings
+from core.metrics import Counter
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ("application/json", "application/x-ndjson", "text/plain", "text/csv")
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)  # при равном q выбирается первая
+
+compression_input = Counter("http_compression_input_bytes_total", "Байты ответов до сжатия")
+compression_output = Counter("http_compression_output_bytes_total", "Байты ответов после сжатия")
+compression_cache_hits = Counter("http_compression_cache_hits_total", "Ответы, взятые из кэша сжатых тел")
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    # Accept-Encoding с q-значениями: "br;q=1.0, gzip;q=0.8, *;q=0"
+    accepted: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip().lower()] = quality
+    best = max(ENCODINGS, key=lambda encoding: accepted.get(encoding, accepted.get("*", 0.0)))
+    return best if accepted.get(best, accepted.get("*", 0.0)) > 0 else None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    app_settings = settings.app_settings
+    if encoding == "br":
+        return brotli.compress(body, quality=app_settings.compression_brotli_quality)
+    return gzip.compress(body, app_settings.compression_gzip_level, mtime=0)
+
+
+class StreamCompressor:
+    def __init__(self, encoding: str):
+        app_settings = settings.app_settings
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=app_settings.compression_brotli_quality)
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(app_settings.compression_gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+class CompressedCache:
+    # LRU сжатых тел по (хэш тела, кодировка), ограничен суммарным размером
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items: OrderedDict[tuple[bytes, str], bytes] = OrderedDict()
+
+    @staticmethod
+    def key(body: bytes, encoding: str) -> tuple[bytes, str]:
+        return hashlib.blake2b(body, digest_size=16).digest(), encoding
+
+    def get(self, key: tuple[bytes, str]) -> bytes | None:
+        body = self._items.get(key)
+        if body is not None:
+            self._items.move_to_end(key)
+        return body
+
+    def put(self, key: tuple[bytes, str], body: bytes):
+        if len(body) > self.max_bytes or key in self._items:
+            return
+        self._items[key] = body
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.size -= len(evicted)
+
+
+class CompressionMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.cache = CompressedCache(settings.app_settings.compression_cache_bytes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            return await self.app(scope, receive, send)
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message  # заголовки отправляются вместе с первой частью тела, когда ясно, сжимать ли
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                return await send(message)
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(scope=start)
+                content_type = headers.get("content-type", "")
+                if (
+                    start["status"] in (204, 304)
+                    or "content-encoding" in headers
+                    or not content_type.startswith(COMPRESSIBLE)
+                ):
+                    passthrough = True
+                    await send(start)
+                    return await send(message)
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body and len(body) < settings.app_settings.compression_min_size:
+                    passthrough = True
+                    await send(start)
+                    return await send(message)
+
+                etag = headers.get("etag")
+                headers["Content-Encoding"] = encoding
+                if etag is not None and not etag.startswith("W/"):
+                    # у сжатого представления другие байты: сильный ETag становится слабым
+                    headers["ETag"] = "W/" + etag
+                if not more_body:
+                    # ответ целиком: сжатое тело из кэша или сжатие одним вызовом; кэшируются только ответы с ETag -
+                    # повторяющиеся, а не каждая страница выгрузки
+                    key = self.cache.key(body, encoding) if etag is not None else None
+                    compressed = self.cache.get(key) if key is not None else None
+                    if compressed is None:
+                        compressed = compress(body, encoding)
+                        if key is not None:
+                            self.cache.put(key, compressed)
+                    else:
+                        compression_cache_hits.inc(encoding=encoding)
+                    compression_input.inc(len(body), encoding=encoding)
+                    compression_output.inc(len(compressed), encoding=encoding)
+                    headers["Content-Length"] = str(len(compressed))
+                    await send(start)
+                    return await send({"type": "http.response.body", "body": compressed})
+                del headers["Content-Length"]
+                compressor = StreamCompressor(encoding)
+                await send(start)
+
+            data = compressor.chunk(body) if body else b""
+            if not more_body:
+                data += compressor.finish()
+            compression_input.inc(len(body), encoding=encoding)
+            compression_output.inc(len(data), encoding=encoding)
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
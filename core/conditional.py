@@ -0,0 +1,176 @@
+# Условные GET для больших списков: ETag и Last-Modified считаются по маркерам изменений таблиц, без чтения строк.
+# Маркер заказов точки - версия заказов из shop_events (увеличивается триггером в той же транзакции, что и заказ) и число секций
+# orders, дальше версия из уведомления order_created; сами воркеры ее не считают, поэтому повтор или потеря уведомления маркер
+# не сдвигают мимо бд. Маркер склада - содержимое склада точки из индекса makeable, который живет на stock_changed.
+# В строки заказов подставляются напитки и добавки из кэша меню, поэтому в версию заказов входит и хэш меню.
+# Маркеры одинаковы во всех воркерах, поэтому 304 отдает любой из них. Пока изменение могло не дойти до реплики,
+# валидаторы не отдаются: иначе клиент закэширует старое тело с новым ETag. Last-Modified точен до секунды и не отдается,
+# пока не кончилась секунда последнего изменения: изменение в ту же секунду If-Modified-Since не заметил бы.
+import asyncio
+import hashlib
+import json
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from time import monotonic
+from fastapi import Request, Response
+from sqlalchemy import func, select, text
+from core.config import settings
+from core.db import replicas, shards
+from core.makeable import makeable_indexes
+from core.menu_cache import menu_cache
+from models.ModelBase import ShopEvents
+
+PARTITIONS_SQL = text("SELECT count(*) FROM pg_inherits WHERE inhparent = 'orders'::regclass")
+
+
+@dataclass(slots=True)
+class Change:
+    modified: datetime  # не раньше последнего изменения: время загрузки или получения уведомления
+    changed_at: float  # то же по monotonic, для проверки отставания реплик
+    loaded_at: float = 0.0
+
+
+@dataclass(slots=True)
+class OrdersMarker(Change):
+    version: int = 0
+    partitions: int = 0
+
+
+@dataclass(frozen=True, slots=True)
+class Validators:
+    tag: str  # версия данных; ETag - она же вместе с путем и параметрами запроса
+    modified: datetime
+    settled: bool  # False - изменение могло еще не дойти до реплики, с которой читается ответ
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(value.astimezone(timezone.utc).replace(microsecond=0), usegmt=True)
+
+
+def last_modified(modified: datetime) -> dict:
+    # заголовок Last-Modified, если секунда изменения уже прошла
+    if datetime.now(timezone.utc) - modified.replace(microsecond=0) < timedelta(seconds=1):
+        return {}
+    return {"Last-Modified": http_date(modified)}
+
+
+def _parse_date(value: str | None) -> datetime | None:
+    try:
+        return parsedate_to_datetime(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _opaque(tag: str) -> str:
+    # слабое сравнение: W/ добавляет CompressionMiddleware к сжатым ответам
+    return tag.strip().removeprefix("W/")
+
+
+def headers(request: Request, validators: Validators) -> dict:
+    if not validators.settled:
+        return {"Cache-Control": "no-cache"}
+    key = f"{validators.tag}|{request.url.path}?{request.url.query}".encode()
+    return {
+        "ETag": 'W/"' + hashlib.blake2b(key, digest_size=8).hexdigest() + '"',
+        **last_modified(validators.modified),
+        "Cache-Control": "no-cache",
+    }
+
+
+def not_modified(request: Request, response_headers: dict) -> bool:
+    # If-None-Match важнее If-Modified-Since (RFC 9110, 13.2.2)
+    etag = response_headers.get("ETag")
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag is not None and (
+            if_none_match.strip() == "*" or _opaque(etag) in {_opaque(tag) for tag in if_none_match.split(",")}
+        )
+    last_modified = _parse_date(response_headers.get("Last-Modified"))
+    since = _parse_date(request.headers.get("if-modified-since"))
+    return last_modified is not None and since is not None and last_modified <= since
+
+
+def conditional_response(request: Request, response_headers: dict) -> Response | None:
+    if not_modified(request, response_headers):
+        return Response(status_code=304, headers=response_headers)
+    return None
+
+
+class ChangeMarkers:
+    # маркеры точек грузятся при первом запросе и перечитываются через ttl; LISTEN переподключился - все сбрасываются
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.orders: dict[int, OrdersMarker] = {}
+        self.notified: dict[int, int] = {}  # последняя версия заказов точки из уведомлений, в том числе пришедших во время загрузки
+        self.stock: dict[int, Change] = {}
+        self._lock = asyncio.Lock()
+
+    def invalidate(self, *_):
+        self.orders.clear()
+        self.stock.clear()
+
+    def _settled(self, id_shop: int, change: Change) -> bool:
+        # реплики есть только у основного шарда и используются, пока отстают не больше db_replica_max_lag
+        if shards.shard(id_shop).number != 0 or not replicas.replicas:
+            return True
+        return monotonic() - change.changed_at > settings.db_settings.db_replica_max_lag
+
+    async def _load_orders(self, id_shop: int) -> OrdersMarker:
+        async with shards.sessionmaker(id_shop)() as session:
+            version = (await session.execute(
+                select(func.coalesce(func.max(ShopEvents.orders), 0)).where(ShopEvents.id_shop == id_shop)
+            )).scalar_one()
+            partitions = (await session.execute(PARTITIONS_SQL)).scalar_one()
+        version = max(version, self.notified.get(id_shop, 0))
+        now = monotonic()
+        previous = self.orders.get(id_shop)
+        if previous is not None and (previous.version, previous.partitions) == (version, partitions):
+            previous.loaded_at = now
+            return previous
+        return OrdersMarker(datetime.now(timezone.utc), now, now, version, partitions)
+
+    async def orders_validators(self, id_shop: int) -> Validators:
+        marker = self.orders.get(id_shop)
+        if marker is None or monotonic() - marker.loaded_at > self.ttl:
+            async with self._lock:
+                marker = self.orders.get(id_shop)
+                if marker is None or monotonic() - marker.loaded_at > self.ttl:
+                    marker = self.orders[id_shop] = await self._load_orders(id_shop)
+        menu = await menu_cache.get()
+        return Validators(
+            f"orders:{id_shop}:{marker.version}:{marker.partitions}:{menu.content_tag}",
+            max(marker.modified, menu.modified),
+            self._settled(id_shop, marker),
+        )
+
+    async def inventory_validators(self, id_shop: int) -> Validators:
+        # версия склада - хэш остатков точки и справочника ингредиентов, которые подставляются в ответ
+        index = await makeable_indexes.get(id_shop)
+        _, ingredients_etag = menu_cache.payload("ingredients", id_shop)
+        digest = hashlib.blake2b(ingredients_etag.encode(), digest_size=8)
+        for id_ingredient, quantity in sorted(index.stock.items()):
+            digest.update(f"{id_ingredient}:{float(quantity)};".encode())
+        change = self.stock.get(id_shop)
+        if change is None:
+            change = self.stock[id_shop] = Change(datetime.now(timezone.utc), monotonic())
+        modified = max(change.modified, menu_cache.modified)  # справочник ингредиентов тоже часть ответа
+        return Validators(f"inventory:{id_shop}:{digest.hexdigest()}", modified, self._settled(id_shop, change))
+
+    def on_order_created(self, payload: str):
+        data = json.loads(payload)
+        id_shop, version = data["id_shop"], data["version"]
+        if data["kind"] != "order" or version <= self.notified.get(id_shop, 0):
+            return
+        self.notified[id_shop] = version
+        marker = self.orders.get(id_shop)
+        if marker is not None and version > marker.version:
+            marker.version = version
+            marker.modified, marker.changed_at = datetime.now(timezone.utc), monotonic()
+
+    def on_stock_changed(self, payload: str):
+        data = json.loads(payload)
+        self.stock[data["id_shop"]] = Change(datetime.now(timezone.utc), monotonic())
+
+
+change_markers = ChangeMarkers(ttl=settings.app_settings.change_markers_ttl)
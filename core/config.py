@@ -1,4 +1,5 @@
 
+from functools import cached_property
 from pydantic import SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -9,6 +10,24 @@ class DBSettings(BaseSettings):
     db_host: str
     db_port: int
     db_echo: bool = False
+    db_auto_migrate: bool = False  # применять миграции при старте воркера, иначе только проверка версии схемы
+    db_slow_query_ms: float = 200.0  # запросы дольше этого пишутся в журнал как медленные
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0  # секунды ожидания свободного соединения
+    db_pool_recycle: int = 1800  # секунды жизни соединения, -1 без ограничения
+    db_pool_pre_ping: bool = True
+    db_pool_warmup: int | None = None  # сколько соединений открыть при старте, по умолчанию db_pool_size
+    db_statement_cache_size: int = 100  # кэш подготовленных выражений asyncpg на соединение
+    db_pgbouncer: bool = False  # pgbouncer в режиме transaction: кэш подготовленных выражений отключается
+    db_replica_urls: list[SecretStr] = []  # postgresql+asyncpg://... реплик для GET-запросов, json-список в .env
+    db_replica_check_interval: float = 5.0  # секунды между проверками реплик
+    db_replica_max_lag: float = 10.0  # секунды отставания, после которых реплика считается нездоровой
+    # шарды по точкам: основная бд - шард 0, здесь postgresql+asyncpg://... остальных (json-список в .env)
+    db_shard_urls: list[SecretStr] = []
+    # id_shop -> номер шарда; точки без записи идут в шард (id_shop - 1) % число шардов. Шард точки записывается в реестр
+    # (shops.shard), и воркер не стартует, если настройки отправили бы уже существующую точку в другой шард
+    db_shard_map: dict[int, int] = {}
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -32,7 +51,62 @@ class DBSettings(BaseSettings):
             f"{self.db_host}:{self.db_port}/{self.db_name}"
         )
 
-class Settings(BaseSettings):
-    db_settings: DBSettings = DBSettings()
+class AppSettings(BaseSettings):
+    dev_mode: bool = False  # разрешает /setup (пересоздание таблиц) и автоматические миграции
+    menu_cache_ttl: float = 300.0  # секунды, после которых меню перечитывается даже без уведомления
+    low_stock_servings: int = 20  # ингредиент считается заканчивающимся, если его хватит меньше чем на столько порций
+    orders_batch_max: int = 10000  # максимум заказов в одном пакете POST /Orders/batch
+    orders_write_behind: bool = False  # подтверждать заказы сразу, запись в бд пачками в фоне (core/write_behind.py)
+    write_behind_flush_ms: int = 50
+    write_behind_batch: int = 500
+    write_behind_id_block: int = 1000  # сколько id заказов брать из последовательности за раз
+    write_behind_dir: str = "journal"  # каталог журнала неподтвержденных в бд заказов
+    write_behind_lease_orders: int = 50  # на сколько таких заказов вперед воркер списывает остаток со склада в свой резерв
+    orders_partitions_ahead: int = 3  # месяцев вперед, на которые заранее создаются секции orders
+    orders_partition_check: float = 3600.0  # секунды между проверками секций
+    orders_retention_months: int = 12  # секции старше выгружаются командой python -m core.partitions archive
+    orders_archive_dir: str = "archive"
+    cart_lines_max: int = 50  # строк в одной корзине
+    idempotency_cache_size: int = 10000  # ключей Idempotency-Key в памяти воркера
+    idempotency_ttl: float = 86400.0  # секунды хранения ответа по ключу
+    events_buffer: int = 1000  # последних событий в памяти воркера для продолжения по Last-Event-ID
+    events_queue_size: int = 256  # очередь подписчика; переполнена - подписчик отключается
+    events_heartbeat: float = 15.0  # секунды между keep-alive в SSE
+    query_count_warn: int = 20  # предупреждение, если один http-запрос сделал больше sql-запросов
+    fast_start: bool = False  # до первого запроса только проверка схемы и меню, остальной прогрев в фоне
+    compression_min_size: int = 1024  # байты: ответы меньше отдаются без сжатия
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4  # 0-11; brotli используется, если пакет установлен
+    compression_cache_bytes: int = 16 * 1024 * 1024  # кэш сжатых тел ответов с ETag в памяти воркера
+    change_markers_ttl: float = 300.0  # секунды, после которых маркеры изменений (ETag списков) перечитываются из бд
+    # контроль допуска (core/admission.py); классы запросов: orders, write, read, reporting
+    admission_enabled: bool = True
+    admission_capacity: int | None = None  # одновременных запросов на шард, по умолчанию db_pool_size + db_max_overflow
+    # доля емкости на класс; заказы не забирают весь пул, чтобы чтение не простаивало совсем, пока идет поток заказов
+    admission_shares: dict[str, float] = {"orders": 0.8, "write": 0.5, "read": 0.75, "reporting": 0.25}
+    admission_budget_ms: dict[str, float] = {"orders": 2000, "write": 2000, "read": 1000, "reporting": 500}  # допустимое ожидание в очереди
+    admission_rates: dict[str, float] = {}  # запросов в секунду на клиента по классам, например {"orders": 20, "reporting": 2}; нет класса - без ограничения
+    admission_burst: float = 2.0  # емкость бакета в секундах частоты
+    admission_client_header: str | None = "X-Client-Id"  # клиент по заголовку, без него - по ip
+    admission_clients_max: int = 100000  # бакетов в памяти воркера
+
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        env_file_encoding="utf-8",
+        extra="ignore",
+    )
+
+class Settings:
+    # лениво только настройки бд: DBSettings читаются при первом обращении, импорт приложения их не требует.
+    # AppSettings читаются уже при импорте - из них собираются синглтоны модулей (idempotency, menu_cache, write_behind,
+    # broker, makeable_indexes, partitions.maintenance, change_markers); у всех полей есть значения по умолчанию,
+    # но переменные окружения и .env для них должны быть заданы до импорта приложения
+    @cached_property
+    def db_settings(self) -> DBSettings:
+        return DBSettings()
+
+    @cached_property
+    def app_settings(self) -> AppSettings:
+        return AppSettings()
 
 settings = Settings()
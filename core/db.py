@@ -1,8 +1,219 @@
+import asyncio
+from contextlib import AsyncExitStack
+from functools import cached_property
+from time import perf_counter
+from uuid import uuid4
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeout
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from core.config import settings
+from core import instrumentation
+from core.metrics import Counter, Gauge, Histogram
 
-engine = create_async_engine( settings.db_settings.sqlalchemy_database_url, echo=settings.db_settings.db_echo)
+pool_wait = Histogram("db_pool_wait_seconds", "Время получения соединения из пула")
+pool_timeouts = Counter("db_pool_timeouts_total", "Запросы, не дождавшиеся соединения за pool_timeout")
 
 
-AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    # пул с замером ожидания соединения (очередь, открытие нового соединения и pre-ping)
+    def connect(self):
+        start = perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeout:
+            pool_timeouts.inc()
+            raise
+        finally:
+            elapsed = perf_counter() - start
+            pool_wait.observe(elapsed)
+            instrumentation.add("pool_wait", elapsed)
 
+
+def connect_args(db) -> dict:
+    if db.db_pgbouncer:
+        # transaction mode в pgbouncer: подготовленные выражения живут на чужих серверных соединениях, кэш отключаем
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    return {
+        "statement_cache_size": db.db_statement_cache_size,
+        "prepared_statement_cache_size": db.db_statement_cache_size,
+    }
+
+
+def engine_options(db) -> dict:
+    return dict(
+        echo=db.db_echo,
+        poolclass=TimedQueuePool,
+        pool_size=db.db_pool_size,
+        max_overflow=db.db_max_overflow,
+        pool_timeout=db.db_pool_timeout,
+        pool_recycle=db.db_pool_recycle,
+        pool_pre_ping=db.db_pool_pre_ping,
+        connect_args=connect_args(db),
+    )
+
+
+class LazySessionmaker(async_sessionmaker):
+    # привязка к движку при первой сессии: импорт модулей с AsyncSessionLocal не создает движок
+    def __call__(self, **local_kw):
+        get_engine()
+        return super().__call__(**local_kw)
+
+
+AsyncSessionLocal = LazySessionmaker(expire_on_commit=False)
+_engine = None
+
+
+def get_engine():
+    # движок основной бд создается при первом обращении, в процессе воркера (после fork), а не при импорте
+    global _engine
+    if _engine is None:
+        db = settings.db_settings
+        _engine = create_async_engine(db.sqlalchemy_database_url, **engine_options(db))
+        instrumentation.instrument_engine(_engine)
+        AsyncSessionLocal.configure(bind=_engine)
+    return _engine
+
+
+def __getattr__(name: str):
+    # from core.db import engine по-прежнему работает, но создает движок только в момент импорта имени
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class Replica:
+    def __init__(self, url: str, db):
+        self.engine = create_async_engine(url, **engine_options(db))
+        instrumentation.instrument_engine(self.engine)
+        self.sessionmaker = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.healthy = True
+
+
+class ReplicaSet:
+    # реплики для чтения: round-robin по здоровым, при их отсутствии чтение идет в primary
+    def __init__(self):
+        self._next = 0
+        self._task = None
+
+    @cached_property
+    def db(self):
+        return settings.db_settings
+
+    @cached_property
+    def replicas(self) -> list[Replica]:
+        return [Replica(url.get_secret_value(), self.db) for url in self.db.db_replica_urls]
+
+    def pick(self) -> Replica | None:
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[self._next % len(self.replicas)]
+            self._next += 1
+            if replica.healthy:
+                return replica
+        return None
+
+    async def check(self, replica: Replica):
+        # реплика здорова, если отвечает и отстает от primary не больше db_replica_max_lag
+        lag_sql = text("SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)")
+        try:
+            async with asyncio.timeout(self.db.db_replica_check_interval):
+                async with replica.engine.connect() as conn:
+                    lag = (await conn.execute(lag_sql)).scalar_one()
+            replica.healthy = lag <= self.db.db_replica_max_lag
+        except Exception:
+            replica.healthy = False
+
+    async def _watch(self):
+        while True:
+            await asyncio.gather(*(self.check(replica) for replica in self.replicas))
+            await asyncio.sleep(self.db.db_replica_check_interval)
+
+    async def start(self):
+        if self.replicas:
+            await asyncio.gather(*(self.check(replica) for replica in self.replicas))
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+
+replicas = ReplicaSet()
+
+
+def read_sessionmaker() -> async_sessionmaker:
+    replica = replicas.pick()
+    return replica.sessionmaker if replica else AsyncSessionLocal
+
+
+DEFAULT_SHOP = 1  # точка маршрутов без префикса /Shops/{id_shop} и всех данных, созданных до появления точек
+
+
+class Shard:
+    def __init__(self, number: int, engine, sessionmaker: async_sessionmaker):
+        self.number = number
+        self.engine = engine
+        self.sessionmaker = sessionmaker
+        # dsn для asyncpg напрямую (LISTEN, COPY) без диалекта sqlalchemy
+        self.dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+class ShardSet:
+    # точка (shop) целиком живет в одном шарде: склад, заказы и агрегаты точки не пересекаются с другими шардами.
+    # Шард 0 - основная бд (меню, список точек, реплики для чтения), остальные задаются DB_SHARD_URLS
+    @cached_property
+    def db(self):
+        return settings.db_settings
+
+    @cached_property
+    def shards(self) -> list[Shard]:
+        shards = [Shard(0, get_engine(), AsyncSessionLocal)]
+        for number, url in enumerate(self.db.db_shard_urls, start=1):
+            shard_engine = create_async_engine(url.get_secret_value(), **engine_options(self.db))
+            instrumentation.instrument_engine(shard_engine)
+            shards.append(Shard(number, shard_engine, async_sessionmaker(shard_engine, expire_on_commit=False)))
+        return shards
+
+    def mapped(self, id_shop: int) -> int:
+        # номер шарда по настройкам; для точек из реестра при старте сверяется с записанным (core/shops.py check_directory)
+        return self.db.db_shard_map.get(id_shop, (id_shop - 1) % len(self.shards))
+
+    def shard(self, id_shop: int) -> Shard:
+        return self.shards[self.mapped(id_shop)]
+
+    def sessionmaker(self, id_shop: int) -> async_sessionmaker:
+        return self.shard(id_shop).sessionmaker
+
+    def read_sessionmaker(self, id_shop: int) -> async_sessionmaker:
+        # реплики есть только у основной бд
+        shard = self.shard(id_shop)
+        return read_sessionmaker() if shard.number == 0 else shard.sessionmaker
+
+    async def dispose(self):
+        # до первого обращения движки шардов не созданы, закрывать нечего
+        if "shards" in self.__dict__:
+            for shard in self.shards[1:]:
+                await shard.engine.dispose()
+
+
+shards = ShardSet()
+
+
+Gauge("db_pool_size", "Постоянный размер пула", lambda: get_engine().pool.size())
+Gauge("db_pool_checked_out", "Соединения, выданные из пула", lambda: get_engine().pool.checkedout())
+Gauge("db_pool_overflow", "Соединения сверх pool_size", lambda: max(get_engine().pool.overflow(), 0))
+Gauge("db_pool_checked_in", "Свободные соединения в пуле", lambda: get_engine().pool.checkedin())
+Gauge("db_replicas_healthy", "Здоровые реплики для чтения", lambda: sum(r.healthy for r in replicas.replicas))
+
+
+async def warm_up(count: int):
+    # открываем соединения через сам движок и держим их одновременно, чтобы в пуле оказалось count соединений
+    async with AsyncExitStack() as stack:
+        conns = await asyncio.gather(*(stack.enter_async_context(get_engine().connect()) for _ in range(count)))
+        await asyncio.gather(*(conn.execute(text("SELECT 1")) for conn in conns))
@@ -0,0 +1,129 @@
+# Push-канал событий: уведомления LISTEN (новые заказы, остатки склада) раздаются подписчикам SSE и WebSocket своей точки.
+# id события - номер события точки из бд (shop_events.seq): триггер увеличивает его в транзакции изменения, номера точки идут
+# подряд в порядке коммитов и одинаковы во всех воркерах. По Last-Event-ID подписчик получает пропущенное из кольцевого буфера
+# любого воркера; если части событий в буфере нет (вытеснены, воркер запущен позже, LISTEN переподключался) - событие reset,
+# клиент перечитывает состояние. Одно событие - одна инструкция: заказы пачки приходят списком rows.
+# Цена сквозных номеров: строка shop_events - общая блокировка записей точки до коммита. Для заказов и корзин она почти
+# ничего не добавляет - они и так держат до коммита строки склада точки (core/stock.py), а write-behind берет ее раз на пачку;
+# последовательность или txid блокировку сняли бы, но номера шли бы с пропусками и не в порядке коммитов, и буфер не мог бы
+# отличить еще не закоммиченное событие от потерянного. Точки друг друга не ждут.
+import asyncio
+import json
+from collections import deque
+from core.config import settings
+from core.metrics import Counter, Gauge
+
+published_total = Counter("events_published_total", "Опубликованные события push-канала")
+dropped_total = Counter("events_dropped_subscribers_total", "Подписчики, отключенные из-за переполнения очереди")
+
+RESET = "reset"
+
+
+class Subscriber:
+    def __init__(self, kinds: set[str] | None, id_shop: int | None, maxsize: int):
+        self.kinds = kinds
+        self.id_shop = id_shop
+        self.after = 0  # события с номером не больше уже есть у клиента: он пришел от воркера, получившего их раньше
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = False
+
+    def wants(self, event) -> bool:
+        _, kind, _, id_shop, seq = event
+        if kind == RESET:
+            return True
+        return (
+            (self.kinds is None or kind in self.kinds)
+            and (self.id_shop is None or id_shop == self.id_shop)
+            and seq > self.after
+        )
+
+    def offer(self, event) -> bool:
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            # медленный потребитель не тормозит остальных: отключаем, он продолжит по Last-Event-ID
+            self.dropped = True
+            return False
+
+    async def get(self, timeout: float):
+        # None - подписчик отключен (очередь в этот момент полна, так что get не ждет); TimeoutError - пора слать keep-alive
+        if self.dropped:
+            return None
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class EventBroker:
+    # событие: (id, тип, json, точка, номер); у reset нет ни id, ни номера
+    def __init__(self, buffer: int, queue_size: int):
+        self.buffer_size = buffer
+        self.queue_size = queue_size
+        self.buffer: deque = deque()
+        self.last: dict[int, int] = {}  # последний полученный номер события точки
+        self.complete_from: dict[int, int] = {}  # с какого номера в буфере лежат все события точки
+        self.subscribers: set[Subscriber] = set()
+
+    def publish(self, kind: str, data: dict | None, id_shop: int | None = None, seq: int | None = None):
+        event = (None if seq is None else str(seq), kind, json.dumps(data), id_shop, seq)
+        if seq is not None:
+            if self.last.get(id_shop) != seq - 1:
+                self.complete_from[id_shop] = seq  # первое событие точки или пропуск номеров
+            self.last[id_shop] = seq
+            self.buffer.append(event)
+            if len(self.buffer) > self.buffer_size:
+                _, _, _, evicted_shop, evicted_seq = self.buffer.popleft()
+                self.complete_from[evicted_shop] = max(self.complete_from[evicted_shop], evicted_seq + 1)
+        published_total.inc(kind=kind)
+        for subscriber in list(self.subscribers):
+            if subscriber.wants(event) and not subscriber.offer(event):
+                self.subscribers.discard(subscriber)
+                dropped_total.inc()
+
+    def on_order_created(self, payload: str):
+        data = json.loads(payload)
+        kind = "order_created" if data["kind"] == "order" else "cart_created"
+        self.publish(kind, {"id_shop": data["id_shop"], "count": data["count"], "rows": data["rows"]}, data["id_shop"], data["seq"])
+
+    def on_stock_changed(self, payload: str):
+        data = json.loads(payload)
+        self.publish("stock_changed", {"id_shop": data["id_shop"], "stock": data["stock"]}, data["id_shop"], data["seq"])
+
+    def reset(self):
+        # LISTEN переподключился: уведомления за время разрыва потеряны, буфер дальше не продолжает прежние номера
+        self.last.clear()
+        self.complete_from.clear()
+        self.publish(RESET, None)
+
+    def subscribe(self, last_event_id: str | None, kinds: set[str] | None, id_shop: int | None = None) -> Subscriber:
+        # пропущенные события кладутся в очередь до регистрации без await между ними - разрыва с живым потоком нет
+        subscriber = Subscriber(kinds, id_shop, self.queue_size)
+        if last_event_id is not None:
+            backlog = self._since(last_event_id, id_shop)
+            if backlog is None or len(backlog) >= self.queue_size:
+                subscriber.offer((None, RESET, "null", None, None))
+            else:
+                subscriber.after = int(last_event_id)
+                for event in backlog:
+                    if subscriber.wants(event):
+                        subscriber.offer(event)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    def _since(self, last_event_id: str, id_shop: int | None) -> list | None:
+        # номера событий сквозные только внутри точки
+        if id_shop is None or not last_event_id.isdigit() or id_shop not in self.last:
+            return None
+        seq = int(last_event_id)
+        if seq >= self.last[id_shop]:
+            return []  # клиент не отстал; если он впереди этого воркера, уже полученное отсечет Subscriber.after
+        if seq + 1 < self.complete_from[id_shop]:
+            return None
+        return [event for event in self.buffer if event[3] == id_shop and event[4] > seq]
+
+
+broker = EventBroker(settings.app_settings.events_buffer, settings.app_settings.events_queue_size)
+
+Gauge("events_subscribers", "Подключенные подписчики push-канала", lambda: len(broker.subscribers))
@@ -0,0 +1,95 @@
+# Быстрое чтение списков: только нужные колонки без ORM-объектов, вложенные drink/ingredient из кэша меню,
+# ответ собирается в dict и сериализуется orjson без повторной валидации через response_model
+import orjson
+from fastapi import Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.menu_cache import menu_cache
+from core.pagination import encode_cursor
+from models.ModelBase import Order, Inventory
+
+ORDER_COLUMNS = (Order.id_order, Order.id_drink, Order.id_ingredient, Order.payment_status, Order.created_at)
+
+
+def json_response(content, headers: dict | None = None) -> Response:
+    # orjson напрямую в Response: без ORJSONResponse, который объявлен устаревшим в новых версиях fastapi
+    # OPT_NON_STR_KEYS: словари по id в нормализованных ответах (?normalized=true)
+    return Response(content=orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS), media_type="application/json", headers=headers)
+
+
+def orders_query(conditions):
+    return select(*ORDER_COLUMNS).where(*conditions).order_by(Order.created_at.desc(), Order.id_order.desc())
+
+
+async def order_dicts(rows) -> list[dict]:
+    menu = await menu_cache.covering({row.id_drink for row in rows}, {row.id_ingredient for row in rows})
+    drinks, ingredients = menu.drink_dicts, menu.ingredient_dicts
+    return [
+        {
+            "id_drink": row.id_drink,
+            "id_order": row.id_order,
+            "payment_status": row.payment_status,
+            "created_at": row.created_at,
+            "drink": drinks[row.id_drink],
+            "ingredient": ingredients[row.id_ingredient],
+        }
+        for row in rows
+    ]
+
+
+async def normalized_orders(rows) -> dict:
+    # строки только с id, каждый напиток и добавка один раз: меньше повторяющегося json в больших страницах
+    drink_ids, ingredient_ids = {row.id_drink for row in rows}, {row.id_ingredient for row in rows}
+    menu = await menu_cache.covering(drink_ids, ingredient_ids)
+    return {
+        "items": [
+            {
+                "id_order": row.id_order,
+                "id_drink": row.id_drink,
+                "id_ingredient": row.id_ingredient,
+                "payment_status": row.payment_status,
+                "created_at": row.created_at,
+            }
+            for row in rows
+        ],
+        "drinks": {i: menu.drink_dicts[i] for i in sorted(drink_ids)},
+        "ingredients": {i: menu.ingredient_dicts[i] for i in sorted(ingredient_ids)},
+    }
+
+
+async def fetch_orders(session: AsyncSession, conditions, limit: int, normalized: bool = False) -> tuple[list[dict] | dict, str | None]:
+    result = await session.execute(orders_query(conditions).limit(limit + 1))
+    rows = result.all()
+    cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        cursor = encode_cursor(rows[-1].created_at, rows[-1].id_order)
+    return await (normalized_orders(rows) if normalized else order_dicts(rows)), cursor
+
+
+async def stream_orders(session: AsyncSession, conditions):
+    # ndjson пачками по 1000 строк из серверного курсора
+    result = await session.stream(orders_query(conditions).execution_options(yield_per=1000))
+    async for rows in result.partitions():
+        yield b"".join(orjson.dumps(item) + b"\n" for item in await order_dicts(rows))
+
+
+async def fetch_inventory(session: AsyncSession, id_shop: int, normalized: bool = False) -> list[dict] | dict:
+    result = await session.execute(
+        select(Inventory.id_ingredient, Inventory.quantity).where(Inventory.id_shop == id_shop).order_by(Inventory.id_ingredient)
+    )
+    rows = result.all()
+    menu = await menu_cache.covering(set(), {row.id_ingredient for row in rows})
+    if normalized:
+        return {
+            "items": [{"id_ingredient": row.id_ingredient, "quantity": float(row.quantity)} for row in rows],
+            "ingredients": {row.id_ingredient: menu.ingredient_dicts[row.id_ingredient] for row in rows},
+        }
+    return [
+        {
+            "id_ingredient": row.id_ingredient,
+            "quantity": float(row.quantity),
+            "ingredient": menu.ingredient_dicts[row.id_ingredient],
+        }
+        for row in rows
+    ]
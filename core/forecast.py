@@ -0,0 +1,202 @@
+# Прогноз расхода ингредиентов и предложения дозаказа по истории заказов точки.
+#   python -m core.forecast --shop 1 --days 56 --horizon 7 --lead-time 2 --workers 4 [--json reorder.json]
+# История делится на диапазоны дат, каждый диапазон читает свой процесс: серверный курсор по orders пачками
+# (память не зависит от объема истории), пачка раскладывается в матрицы "день x напиток" и "день x добавка" через bincount.
+# Расход = напитки @ матрица рецептов + добавки * portion + сахар по 5 г за ложку - так же, как списывает create_order.
+# Корзины (cart_lines) учитываются тем же способом, их на порядки меньше, поэтому они сворачиваются прямо в sql.
+import argparse
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from itertools import chain
+import asyncpg
+import numpy as np
+from core.db import DEFAULT_SHOP, shards
+from core.stock import SUGAR_ID, SUGAR_PER_SPOON
+
+ORDERS_SQL = """
+    SELECT created_at::date - $4::date, id_drink, id_ingredient, sugar_amount
+    FROM orders WHERE id_shop = $1 AND created_at >= $2 AND created_at < $3
+"""
+CART_DRINKS_SQL = """
+    SELECT c.created_at::date - $4::date, l.id_drink, sum(l.quantity), sum(l.quantity * l.sugar_amount)
+    FROM cart_lines l JOIN cart_orders c ON c.id_cart = l.id_cart
+    WHERE c.id_shop = $1 AND c.created_at >= $2 AND c.created_at < $3
+    GROUP BY 1, 2
+"""
+CART_ADDONS_SQL = """
+    SELECT c.created_at::date - $4::date, a.id_ingredient, sum(l.quantity)
+    FROM cart_line_addons a JOIN cart_lines l ON l.id_line = a.id_line JOIN cart_orders c ON c.id_cart = l.id_cart
+    WHERE c.id_shop = $1 AND c.created_at >= $2 AND c.created_at < $3
+    GROUP BY 1, 2
+"""
+
+
+async def scan(dsn: str, id_shop: int, first: date, days: int, drinks_dim: int, ingredients_dim: int, chunk: int):
+    # продажи одного диапазона дат: (напитки по дням, добавки по дням, ложки сахара по дням)
+    drinks = np.zeros(days * drinks_dim, np.int64)
+    addons = np.zeros(days * ingredients_dim, np.int64)
+    spoons = np.zeros(days, np.int64)
+    start = datetime.combine(first, datetime.min.time())
+    args = (id_shop, start, start + timedelta(days=days), first)
+    conn = await asyncpg.connect(dsn)
+    try:
+        async with conn.transaction(readonly=True):
+            cursor = await conn.cursor(ORDERS_SQL, *args)
+            while rows := await cursor.fetch(chunk):
+                # fromiter по плоскому потоку в разы быстрее np.array(rows), который разбирает каждую Record как последовательность
+                block = np.fromiter(chain.from_iterable(rows), np.int64, len(rows) * 4)
+                day, id_drink, id_ingredient, sugar = block.reshape(-1, 4).T
+                drinks += np.bincount(day * drinks_dim + id_drink, minlength=drinks.size)
+                addons += np.bincount(day * ingredients_dim + id_ingredient, minlength=addons.size)
+                spoons += np.bincount(day, weights=sugar, minlength=days).astype(np.int64)
+        rows = await conn.fetch(CART_DRINKS_SQL, *args)
+        if rows:
+            day, id_drink, quantity, sugar = np.array(rows, np.int64).T
+            np.add.at(drinks, day * drinks_dim + id_drink, quantity)
+            np.add.at(spoons, day, sugar)
+        rows = await conn.fetch(CART_ADDONS_SQL, *args)
+        if rows:
+            day, id_ingredient, quantity = np.array(rows, np.int64).T
+            np.add.at(addons, day * ingredients_dim + id_ingredient, quantity)
+    finally:
+        await conn.close()
+    return drinks.reshape(days, drinks_dim), addons.reshape(days, ingredients_dim), spoons
+
+
+def _scan_range(job):
+    return asyncio.run(scan(*job))
+
+
+async def load_menu(dsn: str, id_shop: int) -> dict:
+    conn = await asyncpg.connect(dsn)
+    try:
+        return {
+            "drinks_dim": await conn.fetchval("SELECT coalesce(max(id_drink), 0) + 1 FROM drink"),
+            "ingredients": await conn.fetch("SELECT id_ingredient, name_ingredient, unit, portion FROM ingredient ORDER BY id_ingredient"),
+            "recipes": await conn.fetch("SELECT id_drink, id_ingredient, amount FROM drink_ingredient"),
+            "stock": dict(await conn.fetch("SELECT id_ingredient, quantity FROM inventory WHERE id_shop = $1", id_shop)),
+        }
+    finally:
+        await conn.close()
+
+
+def consumption(drinks, addons, spoons, recipe_matrix, portions) -> np.ndarray:
+    # расход по дням и ингредиентам, матрица "день x ингредиент"
+    used = drinks @ recipe_matrix + addons * portions
+    if SUGAR_ID < used.shape[1]:
+        used[:, SUGAR_ID] += spoons * SUGAR_PER_SPOON
+    return used
+
+
+def forecast(used: np.ndarray, last_day: date, horizon: int, lead_time: int, z: float) -> dict[str, np.ndarray]:
+    # уровень - среднее за последнюю неделю, поправка на день недели - по всей истории;
+    # страховой запас по разбросу дневного расхода вокруг прогноза за время поставки
+    days = used.shape[0]
+    weekdays = (np.arange(days) + (last_day - timedelta(days=days - 1)).weekday()) % 7
+    mean = used.mean(axis=0)
+    profile = np.ones((7, used.shape[1]))
+    for weekday in range(7):
+        rows = used[weekdays == weekday]
+        if len(rows):
+            profile[weekday] = np.divide(rows.mean(axis=0), mean, out=np.ones_like(mean), where=mean > 0)
+    level = used[-7:].mean(axis=0)
+    ahead = (np.arange(1, horizon + lead_time + 1) + last_day.weekday()) % 7
+    daily = level * profile[ahead]
+    residual = used - mean * profile[weekdays]
+    safety = z * residual.std(axis=0) * np.sqrt(lead_time)
+    return {
+        "daily": level,
+        "lead_time": daily[:lead_time].sum(axis=0),
+        "horizon": daily.sum(axis=0),
+        "safety": safety,
+    }
+
+
+def ranges(first: date, days: int, parts: int) -> list[tuple[date, int]]:
+    step = -(-days // parts)
+    return [(first + timedelta(days=offset), min(step, days - offset)) for offset in range(0, days, step)]
+
+
+def run(id_shop: int, days: int, horizon: int, lead_time: int, z: float, workers: int, chunk: int, until: date | None = None):
+    dsn = shards.shard(id_shop).dsn
+    menu = asyncio.run(load_menu(dsn, id_shop))
+    ingredients_dim = max((row["id_ingredient"] for row in menu["ingredients"]), default=0) + 1
+    drinks_dim = menu["drinks_dim"]
+    recipe_matrix = np.zeros((drinks_dim, ingredients_dim))
+    for row in menu["recipes"]:
+        recipe_matrix[row["id_drink"], row["id_ingredient"]] = float(row["amount"])
+    portions = np.zeros(ingredients_dim)
+    for row in menu["ingredients"]:
+        portions[row["id_ingredient"]] = row["portion"]
+
+    last = (until or date.today()) - timedelta(days=1)
+    first = last - timedelta(days=days - 1)
+    jobs = [(dsn, id_shop, start, length, drinks_dim, ingredients_dim, chunk) for start, length in ranges(first, days, workers)]
+    with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+        parts = list(pool.map(_scan_range, jobs))
+    drinks = np.concatenate([part[0] for part in parts])
+    addons = np.concatenate([part[1] for part in parts])
+    spoons = np.concatenate([part[2] for part in parts])
+
+    used = consumption(drinks, addons, spoons, recipe_matrix, portions)
+    result = forecast(used, last, horizon, lead_time, z)
+    report = []
+    for row in menu["ingredients"]:
+        i = row["id_ingredient"]
+        if i not in menu["stock"]:
+            continue  # ингредиент не учитывается на складе точки
+        stock = float(menu["stock"][i])
+        reorder_point = result["lead_time"][i] + result["safety"][i]
+        # дозаказ до запаса на время поставки и горизонт плюс страховой запас
+        order = max(result["horizon"][i] + result["safety"][i] - stock, 0.0) if stock <= reorder_point else 0.0
+        report.append({
+            "id_ingredient": i,
+            "name_ingredient": row["name_ingredient"],
+            "unit": row["unit"],
+            "stock": stock,
+            "daily": round(float(result["daily"][i]), 2),
+            "days_left": round(stock / result["daily"][i], 1) if result["daily"][i] > 0 else None,
+            "reorder_point": round(float(reorder_point), 2),
+            "order": float(np.ceil(order)),
+        })
+    report.sort(key=lambda item: (item["days_left"] is None, item["days_left"] or 0))
+    return {"shop": id_shop, "history": [str(first), str(last)], "orders": int(drinks.sum()), "items": report}
+
+
+def print_report(result: dict):
+    print(f"Точка {result['shop']}, история {result['history'][0]} - {result['history'][1]}, напитков продано: {result['orders']}")
+    print(f"{'ингредиент':24} {'остаток':>12} {'в день':>10} {'дней':>7} {'точка заказа':>13} {'дозаказ':>12}")
+    for item in result["items"]:
+        days_left = "-" if item["days_left"] is None else f"{item['days_left']:.1f}"
+        print(f"{item['name_ingredient'][:24]:24} {item['stock']:12.0f} {item['daily']:10.1f} {days_left:>7} "
+              f"{item['reorder_point']:13.0f} {item['order']:10.0f} {item['unit']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shop", type=int, default=DEFAULT_SHOP)
+    parser.add_argument("--days", type=int, default=56, help="дней истории")
+    parser.add_argument("--until", type=date.fromisoformat, help="история до этой даты (не включая), по умолчанию сегодня")
+    parser.add_argument("--horizon", type=int, default=7, help="на сколько дней после поставки заказывать")
+    parser.add_argument("--lead-time", type=int, default=2, help="дней от заказа до поставки")
+    parser.add_argument("--z", type=float, default=1.65, help="коэффициент страхового запаса (1.65 - 95%% уровень сервиса)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="процессов, история делится на столько диапазонов")
+    parser.add_argument("--chunk", type=int, default=50_000, help="строк в одной выборке курсора")
+    parser.add_argument("--json", metavar="PATH", help="сохранить предложения дозаказа в json")
+    args = parser.parse_args()
+    if args.days < 7:
+        sys.exit("Нужно не меньше 7 дней истории: прогноз учитывает день недели")
+
+    result = run(args.shop, args.days, args.horizon, args.lead_time, args.z, args.workers, args.chunk, args.until)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as out:
+            json.dump(result, out, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,36 @@
-from core.db import AsyncSessionLocal
+from fastapi import Depends, HTTPException
+from fastapi.requests import HTTPConnection
+from core.db import AsyncSessionLocal, read_sessionmaker, shards, DEFAULT_SHOP
+from core.menu_cache import menu_cache
 
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
+
+
+async def get_read_db():
+    # только для чтения: сессия на здоровой реплике или на primary, если реплик нет
+    async with read_sessionmaker()() as session:
+        yield session
+
+
+async def current_shop(request: HTTPConnection) -> int:
+    # маршруты /Shops/{id_shop}/... работают с указанной точкой, маршруты без префикса - с точкой по умолчанию
+    raw = request.path_params.get("id_shop")
+    if raw is None:
+        return DEFAULT_SHOP
+    menu = await menu_cache.get()
+    if not raw.isdigit() or int(raw) not in menu.shops:
+        raise HTTPException(status_code=404, detail="Точка не найдена")
+    return int(raw)
+
+
+async def get_shop_db(id_shop: int = Depends(current_shop)):
+    # сессия шарда, в котором живет точка
+    async with shards.sessionmaker(id_shop)() as session:
+        yield session
+
+
+async def get_shop_read_db(id_shop: int = Depends(current_shop)):
+    async with shards.read_sessionmaker(id_shop)() as session:
+        yield session
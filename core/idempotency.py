@@ -0,0 +1,125 @@
+# Идемпотентность POST /Orders: ответ сохраняется по (точка, Idempotency-Key) в той же транзакции, что и заказ.
+# Сначала проверяется LRU в памяти воркера, затем таблица idempotency_keys (общая для всех воркеров).
+# Вместе с ключом хранится хэш тела запроса: тот же ключ с другим телом - ошибка клиента, а не повтор.
+import asyncio
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from time import monotonic
+from sqlalchemy import func, select, update, delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.config import settings
+from core.db import shards
+from core.metrics import Counter, Gauge
+from models.ModelBase import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+requests_total = Counter("idempotency_requests_total", "Запросы с Idempotency-Key по результату проверки")
+
+
+class KeyInFlight(Exception):
+    pass
+
+
+class KeyMismatch(Exception):
+    pass
+
+
+def request_hash(payload: dict) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(self, capacity: int, ttl: float, cleanup_interval: float = 600.0):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self._lru: OrderedDict[tuple[int, str], tuple[float, str | None, dict]] = OrderedDict()
+        self._task = None
+
+    def get_local(self, id_shop: int, key: str, digest: str) -> dict | None:
+        entry = self._lru.get((id_shop, key))
+        if entry is None:
+            return None
+        expires, stored_digest, response = entry
+        if expires < monotonic():
+            del self._lru[(id_shop, key)]
+            return None
+        if stored_digest is not None and stored_digest != digest:
+            requests_total.inc(result="mismatch")
+            raise KeyMismatch(key)
+        self._lru.move_to_end((id_shop, key))
+        requests_total.inc(result="memory_hit")
+        return response
+
+    def put_local(self, id_shop: int, key: str, digest: str | None, response: dict):
+        self._lru[(id_shop, key)] = (monotonic() + self.ttl, digest, response)
+        self._lru.move_to_end((id_shop, key))
+        while len(self._lru) > self.capacity:
+            self._lru.popitem(last=False)
+
+    async def claim(self, session: AsyncSession, id_shop: int, key: str, digest: str) -> dict | None:
+        # вставка ключа первой командой транзакции: параллельный повтор ждет на уникальном индексе,
+        # пока первый запрос не закоммитит заказ вместе с ответом, и получает уже готовый ответ.
+        # Ключ старше ttl, который очистка еще не удалила, считается отсутствующим: строка занимается заново
+        stmt = insert(IdempotencyKey).values(id_shop=id_shop, key=key, request_hash=digest)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["id_shop", "key"],
+            set_={"request_hash": digest, "response": None, "created_at": func.localtimestamp()},
+            where=IdempotencyKey.created_at < func.localtimestamp() - timedelta(seconds=self.ttl),
+        ).returning(IdempotencyKey.key)
+        if (await session.execute(stmt)).scalar_one_or_none() is not None:
+            requests_total.inc(result="miss")
+            return None
+        stored_digest, response = (await session.execute(
+            select(IdempotencyKey.request_hash, IdempotencyKey.response)
+            .where(IdempotencyKey.id_shop == id_shop, IdempotencyKey.key == key)
+        )).one()
+        if stored_digest is not None and stored_digest != digest:
+            requests_total.inc(result="mismatch")
+            raise KeyMismatch(key)
+        if response is None:
+            raise KeyInFlight(key)
+        requests_total.inc(result="db_hit")
+        self.put_local(id_shop, key, stored_digest, response)
+        return response
+
+    async def store(self, session: AsyncSession, id_shop: int, key: str, response: dict):
+        # сохраняется до коммита заказа, в память - только после коммита (см. remember)
+        await session.execute(
+            update(IdempotencyKey).where(IdempotencyKey.id_shop == id_shop, IdempotencyKey.key == key).values(response=response)
+            .execution_options(synchronize_session=False)
+        )
+
+    async def start(self):
+        self._task = asyncio.create_task(self._cleanup())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def _cleanup(self):
+        # вытеснение просроченных ключей из таблицы по индексу created_at, на каждом шарде
+        while True:
+            await asyncio.sleep(self.cleanup_interval)
+            for shard in shards.shards:
+                try:
+                    async with shard.sessionmaker() as session:
+                        await session.execute(
+                            delete(IdempotencyKey).where(IdempotencyKey.created_at < datetime.now() - timedelta(seconds=self.ttl))
+                        )
+                        await session.commit()
+                except Exception:
+                    logger.exception("Не удалось удалить просроченные ключи идемпотентности на шарде %s", shard.number)
+
+
+idempotency = IdempotencyStore(
+    capacity=settings.app_settings.idempotency_cache_size,
+    ttl=settings.app_settings.idempotency_ttl,
+)
+
+Gauge("idempotency_cache_size", "Ключи идемпотентности в памяти воркера", lambda: len(idempotency._lru))
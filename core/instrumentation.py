@@ -0,0 +1,104 @@
+import logging
+from contextvars import ContextVar
+from time import perf_counter
+from sqlalchemy import event
+from core.config import settings
+from core.metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+# счетчики текущего запроса: время в бд, число запросов, ожидание соединения из пула
+request_stats: ContextVar[dict | None] = ContextVar("request_stats", default=None)
+# сбор выполненных запросов (текст и параметры драйвера) для разбора планов, см. bench/explain.py
+captured_queries: ContextVar[list | None] = ContextVar("captured_queries", default=None)
+
+http_latency = Histogram("http_request_seconds", "Время обработки запроса по маршрутам")
+http_db_time = Histogram("http_request_db_seconds", "Время в бд за один запрос по маршрутам")
+http_queries = Histogram(
+    "http_request_queries", "Число sql-запросов за один http-запрос", buckets=(1, 2, 3, 5, 10, 20, 50, 100, 500)
+)
+http_pool_wait = Histogram("http_request_pool_wait_seconds", "Ожидание соединения из пула за один запрос")
+db_query_time = Histogram("db_query_seconds", "Время выполнения sql-запросов")
+slow_queries = Counter("db_slow_queries_total", "Запросы дольше DB_SLOW_QUERY_MS")
+
+
+def add(key: str, value: float):
+    stats = request_stats.get()
+    if stats is not None:
+        stats[key] += value
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = perf_counter() - conn.info["query_start"].pop()
+    db_query_time.observe(elapsed)
+    add("db_time", elapsed)
+    add("queries", 1)
+    captured = captured_queries.get()
+    if captured is not None and not executemany:
+        captured.append((statement, parameters))
+    if elapsed * 1000 >= settings.db_settings.db_slow_query_ms:
+        slow_queries.inc()
+        logger.warning("Медленный запрос %.1f мс: %s", elapsed * 1000, " ".join(statement.split())[:1000])
+
+
+def instrument_engine(engine):
+    # события курсора движка: время каждого запроса, сумма по http-запросу, журнал медленных запросов
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_execute)
+
+
+def route_template(scope) -> str:
+    # шаблон маршрута с префиксами роутеров (/v1/Coffe/Orders), а не фактический путь: иначе метрики разрастутся по id
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    template = getattr(route, "path_format", route.path)
+    try:
+        rendered = template.format(**scope.get("path_params", {}))
+    except (KeyError, IndexError):
+        return template
+    path = scope["path"]
+    return path[: len(path) - len(rendered)] + template if path.endswith(rendered) else template
+
+
+class MetricsMiddleware:
+    # чистый ASGI-middleware: замеряет запрос целиком, включая отправку тела ответа
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = {"db_time": 0.0, "queries": 0, "pool_wait": 0.0}
+        token = request_stats.set(stats)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = perf_counter() - start
+            request_stats.reset(token)
+            labels = {
+                "method": scope["method"],
+                "route": route_template(scope),
+                "status": status[0],
+            }
+            http_latency.observe(elapsed, **labels)
+            route_labels = {"method": labels["method"], "route": labels["route"]}
+            http_db_time.observe(stats["db_time"], **route_labels)
+            http_queries.observe(stats["queries"], **route_labels)
+            http_pool_wait.observe(stats["pool_wait"], **route_labels)
+            if stats["queries"] > settings.app_settings.query_count_warn:
+                # много запросов на один http-запрос обычно означает N+1
+                logger.warning("%s %s: %d sql-запросов за один запрос", labels["method"], labels["route"], stats["queries"])
@@ -0,0 +1,73 @@
+import asyncio
+import logging
+from functools import cache
+import asyncpg
+from core.config import settings
+from core.db import shards
+
+logger = logging.getLogger(__name__)
+
+
+class Listener:
+    # одно LISTEN-подключение на воркер, уведомления раздаются подписчикам по каналам
+    def __init__(self, dsn: str | None, check_interval: float = 5.0):
+        self.dsn = dsn
+        self.check_interval = check_interval
+        self.callbacks: dict[str, list] = {}
+        self.on_reconnect: list = []
+        self._conn = None
+        self._task = None
+
+    def subscribe(self, channel: str, callback):
+        self.callbacks.setdefault(channel, []).append(callback)
+
+    async def start(self):
+        await self._connect()
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        if self._conn and not self._conn.is_closed():
+            await self._conn.close()
+
+    async def _connect(self):
+        # dsn None - основная бд, адрес берется из настроек в момент подключения
+        self._conn = await asyncpg.connect(self.dsn or settings.db_settings.asyncpg_database_url)
+        for channel in self.callbacks:
+            await self._conn.add_listener(channel, self._dispatch)
+
+    def _dispatch(self, conn, pid, channel, payload):
+        for callback in self.callbacks.get(channel, ()):
+            try:
+                callback(payload)
+            except Exception:
+                logger.exception("Ошибка обработчика уведомления %s", channel)
+
+    async def _watch(self):
+        # пока подключение потеряно, уведомления пропадают: после переподключения подписчики перечитывают состояние
+        while True:
+            await asyncio.sleep(self.check_interval)
+            if not self._conn.is_closed():
+                continue
+            try:
+                await self._connect()
+            except Exception as e:
+                logger.warning("Не удалось переподключить LISTEN: %s", e)
+                continue
+            for callback in self.on_reconnect:
+                callback()
+
+
+listener = Listener(None)
+
+
+@cache
+def shard_listeners() -> dict[int, Listener]:
+    # склад и заказы точек на дополнительных шардах приходят через их собственные LISTEN-подключения
+    return {shard.number: Listener(shard.dsn) for shard in shards.shards[1:]}
+
+
+def listener_for(id_shop: int) -> Listener:
+    number = shards.shard(id_shop).number
+    return listener if number == 0 else shard_listeners()[number]
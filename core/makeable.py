@@ -0,0 +1,139 @@
+import asyncio
+import json
+from decimal import Decimal
+from time import monotonic
+from sqlalchemy import select
+from core.config import settings
+from core.db import shards, DEFAULT_SHOP
+from core.menu_cache import menu_cache
+from models.ModelBase import Inventory
+
+
+class MakeableIndex:
+    # сколько порций каждого напитка точки можно приготовить из ее остатков; обновляется по изменениям склада
+    def __init__(self, id_shop: int, low_stock_servings: int, ttl: float):
+        self.id_shop = id_shop
+        self.low_stock_servings = low_stock_servings
+        self.ttl = ttl
+        self.menu = None
+        self.menu_version = -1
+        self.stock: dict[int, Decimal] = {}
+        self.users: dict[int, tuple[int, ...]] = {}  # ингредиент -> напитки, в рецепт которых он входит
+        self.makeable: dict[int, int | None] = {}  # None: в рецепте нет ингредиентов, учитываемых на складе
+        self.limiting: dict[int, int | None] = {}
+        self.thresholds: dict[int, Decimal] = {}
+        self.low: set[int] = set()
+        self._loaded_at = 0.0
+        self._dirty = True
+        self._lock = asyncio.Lock()
+
+    def invalidate(self, *_):
+        self._dirty = True
+
+    async def get(self) -> "MakeableIndex":
+        menu = await menu_cache.get()
+        if self._dirty or menu.version != self.menu_version or monotonic() - self._loaded_at > self.ttl:
+            async with self._lock:
+                if self._dirty or menu.version != self.menu_version or monotonic() - self._loaded_at > self.ttl:
+                    await self.rebuild()
+        return self
+
+    async def rebuild(self):
+        # полный пересчет: при старте, при смене меню и после потери уведомлений
+        self._dirty = False
+        menu = await menu_cache.get()
+        async with shards.sessionmaker(self.id_shop)() as session:
+            result = await session.execute(
+                select(Inventory.id_ingredient, Inventory.quantity).where(Inventory.id_shop == self.id_shop)
+            )
+            self.stock = dict(result.all())
+
+        users: dict[int, list[int]] = {}
+        largest: dict[int, Decimal] = {}
+        for id_drink, recipe in menu.recipes.items():
+            for id_ingredient, amount in recipe:
+                users.setdefault(id_ingredient, []).append(id_drink)
+                largest[id_ingredient] = max(largest.get(id_ingredient, 0), amount)
+        for ingredient in menu.ingredients.values():
+            largest[ingredient.id_ingredient] = max(largest.get(ingredient.id_ingredient, 0), ingredient.portion)
+
+        self.menu = menu
+        self.menu_version = menu.version
+        self.users = {id_ingredient: tuple(drinks) for id_ingredient, drinks in users.items()}
+        # порог низкого остатка: запас на low_stock_servings самых больших порций этого ингредиента
+        self.thresholds = {i: amount * self.low_stock_servings for i, amount in largest.items() if amount > 0}
+        self.makeable, self.limiting = {}, {}
+        for id_drink, drink in menu.drinks.items():
+            if drink.available(self.id_shop):
+                self._recompute(id_drink)
+        self.low = {i for i, quantity in self.stock.items() if quantity < self.thresholds.get(i, 0)}
+        self._loaded_at = monotonic()
+
+    def _recompute(self, id_drink: int):
+        best, limiting = None, None
+        for id_ingredient, amount in self.menu.recipes.get(id_drink, ()):
+            quantity = self.stock.get(id_ingredient)
+            if quantity is None or amount <= 0:
+                continue
+            servings = max(int(quantity // amount), 0)
+            if best is None or servings < best:
+                best, limiting = servings, id_ingredient
+        self.makeable[id_drink] = best
+        self.limiting[id_drink] = limiting
+
+    def on_stock_changed(self, stock: dict[str, float | None]):
+        # уведомление на инструкцию: пересчитываются только напитки с изменившимися ингредиентами, каждый один раз
+        if self.menu is None:
+            return
+        drinks = set()
+        for key, value in stock.items():
+            id_ingredient = int(key)
+            if value is None:
+                self.stock.pop(id_ingredient, None)
+            else:
+                self.stock[id_ingredient] = Decimal(str(value))
+            drinks.update(self.users.get(id_ingredient, ()))
+            quantity = self.stock.get(id_ingredient)
+            if quantity is not None and quantity < self.thresholds.get(id_ingredient, 0):
+                self.low.add(id_ingredient)
+            else:
+                self.low.discard(id_ingredient)
+        for id_drink in drinks:
+            if id_drink in self.makeable:
+                self._recompute(id_drink)
+
+
+class ShopIndexes:
+    # индексы по точкам создаются при первом обращении; уведомления склада раздаются индексу своей точки
+    def __init__(self, low_stock_servings: int, ttl: float):
+        self.low_stock_servings = low_stock_servings
+        self.ttl = ttl
+        self.indexes: dict[int, MakeableIndex] = {}
+
+    def index(self, id_shop: int) -> MakeableIndex:
+        if id_shop not in self.indexes:
+            self.indexes[id_shop] = MakeableIndex(id_shop, self.low_stock_servings, self.ttl)
+        return self.indexes[id_shop]
+
+    async def get(self, id_shop: int) -> MakeableIndex:
+        return await self.index(id_shop).get()
+
+    def on_stock_changed(self, payload: str):
+        data = json.loads(payload)
+        index = self.indexes.get(data["id_shop"])
+        if index is None:
+            return
+        if data["stock"] is None:
+            index.invalidate()  # изменений больше, чем влезает в уведомление
+        else:
+            index.on_stock_changed(data["stock"])
+
+    def invalidate(self, *_):
+        for index in self.indexes.values():
+            index.invalidate()
+
+
+makeable_indexes = ShopIndexes(
+    low_stock_servings=settings.app_settings.low_stock_servings,
+    ttl=settings.app_settings.menu_cache_ttl,
+)
@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import json
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from decimal import Decimal
+from time import monotonic
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from core.config import settings
+from core.db import AsyncSessionLocal
+from models.ModelBase import Drink, Ingredient, DrinkIngredient, Shop
+from models.Schemas import DrinkGetSchema, IngredientGetSchema, IngredientDrinkGetSchema, RecipeRowSchema, RecipesNormalizedSchema
+
+
+@dataclass(frozen=True, slots=True)
+class MenuDrink:
+    id_drink: int
+    name_drink: str
+    price: Decimal
+    id_shop: int | None  # None - напиток есть во всех точках
+
+    def available(self, id_shop: int) -> bool:
+        return self.id_shop is None or self.id_shop == id_shop
+
+
+@dataclass(frozen=True, slots=True)
+class MenuIngredient:
+    id_ingredient: int
+    name_ingredient: str
+    unit: str
+    is_visible: bool
+    portion: int
+    unit_cost: Decimal
+
+
+def _etag(payload: bytes) -> str:
+    # etag по содержимому: одинаковый во всех воркерах для одной версии меню
+    return '"' + hashlib.blake2b(payload, digest_size=8).hexdigest() + '"'
+
+
+class MenuCache:
+    # граф меню (напитки, ингредиенты, рецепты) и список точек в памяти воркера с готовыми json-ответами
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.version = 0
+        self.modified = datetime.now(timezone.utc)  # время загрузки текущей версии, Last-Modified готовых ответов
+        self.drinks: dict[int, MenuDrink] = {}
+        self.ingredients: dict[int, MenuIngredient] = {}
+        self.recipes: dict[int, tuple[tuple[int, Decimal], ...]] = {}
+        self.shops: dict[int, str] = {}
+        # готовые ответы по (имя, точка): у точек могут быть свои напитки, собираются при первом запросе
+        self.payloads: dict[tuple[str, int], tuple[bytes, str]] = {}
+        self._recipe_rows: list[tuple[int, int]] = []
+        # вложенные объекты ответов в виде готовых dict: одни и те же объекты переиспользуются во всех строках
+        self.drink_dicts: dict[int, dict] = {}
+        self.ingredient_dicts: dict[int, dict] = {}
+        self.content_tag = ""  # хэш напитков и ингредиентов в ответах: одинаков во всех воркерах, в отличие от version
+        self._loaded_at = 0.0
+        self._dirty = True
+        self._lock = asyncio.Lock()
+
+    def invalidate(self, *_):
+        self._dirty = True
+
+    @property
+    def stale(self) -> bool:
+        return self._dirty or monotonic() - self._loaded_at > self.ttl
+
+    async def get(self) -> "MenuCache":
+        if self.stale:
+            async with self._lock:
+                if self.stale:
+                    await self.load()
+        return self
+
+    async def load(self):
+        # флаг сбрасываем до чтения: инвалидация во время загрузки вызовет повторную загрузку
+        self._dirty = False
+        async with AsyncSessionLocal() as session:
+            drinks = (await session.execute(select(Drink))).scalars().all()
+            ingredients = (await session.execute(select(Ingredient))).scalars().all()
+            recipe_rows = (await session.execute(select(DrinkIngredient))).scalars().all()
+            shops = (await session.execute(select(Shop.id_shop, Shop.name_shop))).all()
+
+        self.shops = dict(shops)
+        self.drinks = {d.id_drink: MenuDrink(d.id_drink, d.name_drink, d.price, d.id_shop) for d in drinks}
+        self.ingredients = {
+            i.id_ingredient: MenuIngredient(i.id_ingredient, i.name_ingredient, i.unit, i.is_visible, i.portion, i.unit_cost)
+            for i in ingredients
+        }
+        recipes: dict[int, list] = {}
+        for row in recipe_rows:
+            recipes.setdefault(row.id_drink, []).append((row.id_ingredient, row.amount))
+        self.recipes = {id_drink: tuple(items) for id_drink, items in recipes.items()}
+
+        self.drink_dicts = {i: self.drink_schema(d).model_dump() for i, d in self.drinks.items()}
+        self.ingredient_dicts = {i: self.ingredient_schema(d).model_dump() for i, d in self.ingredients.items()}
+        self.content_tag = hashlib.blake2b(
+            json.dumps([sorted(self.drink_dicts.items()), sorted(self.ingredient_dicts.items())], default=str).encode(),
+            digest_size=8,
+        ).hexdigest()
+        self._recipe_rows = [(row.id_drink, row.id_ingredient) for row in recipe_rows]
+        self.payloads = {}
+        self.version += 1
+        self.modified = datetime.now(timezone.utc)
+        self._loaded_at = monotonic()
+
+    def payload(self, name: str, id_shop: int) -> tuple[bytes, str]:
+        key = (name, id_shop)
+        if key not in self.payloads:
+            self.payloads[key] = self._build(name, id_shop)
+        return self.payloads[key]
+
+    def _build(self, name: str, id_shop: int) -> tuple[bytes, str]:
+        if name == "drinks":
+            return self._serialize(list[DrinkGetSchema], [
+                self.drink_schema(d) for d in self.drinks.values() if d.available(id_shop)
+            ])
+        if name == "ingredients":
+            return self._serialize(list[IngredientGetSchema], [self.ingredient_schema(i) for i in self.ingredients.values()])
+        rows = [(id_drink, id_ingredient) for id_drink, id_ingredient in self._recipe_rows if self.drinks[id_drink].available(id_shop)]
+        if name == "recipes_normalized":
+            # каждый напиток и ингредиент один раз, строки рецептов только с id
+            return self._serialize(RecipesNormalizedSchema, RecipesNormalizedSchema(
+                items=[RecipeRowSchema(id_drink=id_drink, id_ingredient=id_ingredient) for id_drink, id_ingredient in rows],
+                drinks={id_drink: self.drink_schema(self.drinks[id_drink]) for id_drink, _ in rows},
+                ingredients={i: self.ingredient_schema(self.ingredients[i]) for _, i in rows},
+            ))
+        return self._serialize(list[IngredientDrinkGetSchema], [
+            IngredientDrinkGetSchema(
+                id_ingredient=id_ingredient,
+                id_drink=id_drink,
+                drink=self.drink_schema(self.drinks[id_drink]),
+                ingredient=self.ingredient_schema(self.ingredients[id_ingredient]),
+            )
+            for id_drink, id_ingredient in rows
+        ])
+
+    async def covering(self, drink_ids, ingredient_ids) -> "MenuCache":
+        # строки из бд могут ссылаться на меню новее кэша, если уведомление еще не дошло: тогда перечитываем
+        menu = await self.get()
+        if drink_ids <= menu.drink_dicts.keys() and ingredient_ids <= menu.ingredient_dicts.keys():
+            return menu
+        self.invalidate()
+        return await self.get()
+
+    @staticmethod
+    def _serialize(schema, items) -> tuple[bytes, str]:
+        payload = TypeAdapter(schema).dump_json(items)
+        return payload, _etag(payload)
+
+    @staticmethod
+    def drink_schema(drink) -> DrinkGetSchema:
+        return DrinkGetSchema(name_drink=drink.name_drink, price=drink.price)
+
+    @staticmethod
+    def ingredient_schema(ingredient) -> IngredientGetSchema:
+        return IngredientGetSchema(
+            id_ingredient=ingredient.id_ingredient,
+            name_ingredient=ingredient.name_ingredient,
+            unit=ingredient.unit,
+            portion=ingredient.portion,
+        )
+
+
+menu_cache = MenuCache(ttl=settings.app_settings.menu_cache_ttl)
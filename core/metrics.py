@@ -0,0 +1,81 @@
+from bisect import bisect_left
+
+# минимальный реестр метрик в текстовом формате Prometheus, без внешних зависимостей
+REGISTRY = []
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_: str):
+        self.name, self.help = name, help_
+        self.values: dict[tuple, float] = {}
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.items())
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in self.values.items():
+            yield self.name, dict(key), value
+
+
+class Gauge:
+    # значение читается функцией в момент выдачи /metrics
+    kind = "gauge"
+
+    def __init__(self, name: str, help_: str, read):
+        self.name, self.help, self.read = name, help_, read
+        REGISTRY.append(self)
+
+    def samples(self):
+        yield self.name, {}, self.read()
+
+
+class Histogram:
+    kind = "histogram"
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name: str, help_: str, buckets=BUCKETS):
+        self.name, self.help, self.buckets = name, help_, tuple(buckets)
+        self.values: dict[tuple, list] = {}  # labels -> [счетчики по корзинам..., сумма, количество]
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.items())
+        row = self.values.get(key)
+        if row is None:
+            row = self.values[key] = [0] * (len(self.buckets) + 2)
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            row[index] += 1
+        row[-2] += value
+        row[-1] += 1
+
+    def samples(self):
+        for key, row in self.values.items():
+            labels = dict(key)
+            total = 0
+            for bound, count in zip(self.buckets, row):
+                total += count
+                yield f"{self.name}_bucket", {**labels, "le": bound}, total
+            yield f"{self.name}_bucket", {**labels, "le": "+Inf"}, row[-1]
+            yield f"{self.name}_sum", labels, row[-2]
+            yield f"{self.name}_count", labels, row[-1]
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,672 @@
+# DDL миграций, замороженный на момент их версии. Модели и триггеры дальше меняются (id_shop, себестоимость, ...),
+# а миграция должна давать ту же схему, что и в день своего появления: иначе обновление старой бд создает внешние ключи
+# и индексы на таблицы и колонки, которые появятся только в следующих миграциях.
+# Новые изменения схемы - новой миграцией со своим DDL, старые списки не правятся.
+
+# 1: таблицы до версионирования; IF NOT EXISTS - бд, созданные раньше через create_all, не меняются
+BASELINE = [
+    """
+    CREATE TABLE IF NOT EXISTS drink (
+        id_drink SERIAL NOT NULL,
+        name_drink VARCHAR(100) NOT NULL,
+        price NUMERIC(7, 2) NOT NULL,
+        PRIMARY KEY (id_drink)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ingredient (
+        id_ingredient SERIAL NOT NULL,
+        name_ingredient VARCHAR(100) NOT NULL,
+        unit VARCHAR(10) NOT NULL,
+        is_visible BOOLEAN NOT NULL,
+        portion INTEGER NOT NULL,
+        PRIMARY KEY (id_ingredient)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS drink_ingredient (
+        id_drink INTEGER NOT NULL,
+        id_ingredient INTEGER NOT NULL,
+        amount NUMERIC(7, 2) NOT NULL,
+        PRIMARY KEY (id_drink, id_ingredient),
+        FOREIGN KEY (id_drink) REFERENCES drink (id_drink) ON DELETE CASCADE,
+        FOREIGN KEY (id_ingredient) REFERENCES ingredient (id_ingredient)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS inventory (
+        id_ingredient INTEGER NOT NULL,
+        quantity NUMERIC(10, 2) NOT NULL,
+        PRIMARY KEY (id_ingredient),
+        FOREIGN KEY (id_ingredient) REFERENCES ingredient (id_ingredient) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS orders (
+        id_order SERIAL NOT NULL,
+        id_drink INTEGER NOT NULL,
+        id_ingredient INTEGER NOT NULL,
+        sugar_amount INTEGER NOT NULL,
+        payment_status VARCHAR(10) NOT NULL,
+        created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL,
+        PRIMARY KEY (id_order),
+        FOREIGN KEY (id_drink) REFERENCES drink (id_drink),
+        FOREIGN KEY (id_ingredient) REFERENCES ingredient (id_ingredient)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sales_hourly (
+        bucket TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        id_drink INTEGER NOT NULL,
+        id_ingredient INTEGER NOT NULL,
+        orders INTEGER NOT NULL,
+        sugar_amount INTEGER NOT NULL,
+        revenue NUMERIC(14, 2) NOT NULL,
+        PRIMARY KEY (bucket, id_drink, id_ingredient),
+        FOREIGN KEY (id_drink) REFERENCES drink (id_drink),
+        FOREIGN KEY (id_ingredient) REFERENCES ingredient (id_ingredient)
+    )
+    """,
+]
+
+# 2
+TRIGGERS = [
+    """
+    CREATE OR REPLACE FUNCTION notify_menu_changed() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('menu_changed', TG_TABLE_NAME);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER drink_menu_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON drink
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_menu_changed()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER ingredient_menu_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON ingredient
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_menu_changed()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER drink_ingredient_menu_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON drink_ingredient
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_menu_changed()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION notify_stock_changed() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            PERFORM pg_notify('stock_changed', json_build_object('id_ingredient', OLD.id_ingredient, 'quantity', NULL)::text);
+        ELSE
+            PERFORM pg_notify('stock_changed', json_build_object('id_ingredient', NEW.id_ingredient, 'quantity', NEW.quantity)::text);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER inventory_stock_changed
+    AFTER INSERT OR UPDATE OR DELETE ON inventory
+    FOR EACH ROW EXECUTE FUNCTION notify_stock_changed()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION rollup_orders() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO sales_hourly AS s (bucket, id_drink, id_ingredient, orders, sugar_amount, revenue)
+        SELECT date_trunc('hour', n.created_at), n.id_drink, n.id_ingredient, count(*), sum(n.sugar_amount), sum(d.price)
+        FROM new_orders n JOIN drink d ON d.id_drink = n.id_drink
+        GROUP BY 1, 2, 3
+        ORDER BY 1, 2, 3
+        ON CONFLICT (bucket, id_drink, id_ingredient) DO UPDATE SET
+            orders = s.orders + EXCLUDED.orders,
+            sugar_amount = s.sugar_amount + EXCLUDED.sugar_amount,
+            revenue = s.revenue + EXCLUDED.revenue;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER orders_rollup
+    AFTER INSERT ON orders
+    REFERENCING NEW TABLE AS new_orders
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_orders()
+    """,
+]
+
+# 1 и 3: индексы списка заказов, в том числе для бд, созданных до их появления
+ORDERS_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_orders_created_at_id_order ON orders (created_at, id_order)",
+    "CREATE INDEX IF NOT EXISTS ix_orders_id_drink_created_at ON orders (id_drink, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_orders_id_ingredient_created_at ON orders (id_ingredient, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_orders_payment_status_created_at ON orders (payment_status, created_at)",
+]
+
+# 4
+IDEMPOTENCY_KEYS = [
+    """
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        key VARCHAR(100) NOT NULL,
+        response JSONB,
+        created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL,
+        PRIMARY KEY (key)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_idempotency_keys_created_at ON idempotency_keys (created_at)",
+]
+
+# 5
+CARTS = [
+    """
+    CREATE TABLE IF NOT EXISTS cart_orders (
+        id_cart SERIAL NOT NULL,
+        payment_status VARCHAR(10) NOT NULL,
+        total NUMERIC(10, 2) NOT NULL,
+        created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL,
+        PRIMARY KEY (id_cart)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_cart_orders_created_at_id_cart ON cart_orders (created_at, id_cart)",
+    """
+    CREATE TABLE IF NOT EXISTS cart_lines (
+        id_line SERIAL NOT NULL,
+        id_cart INTEGER NOT NULL,
+        id_drink INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        sugar_amount INTEGER NOT NULL,
+        PRIMARY KEY (id_line),
+        FOREIGN KEY (id_cart) REFERENCES cart_orders (id_cart) ON DELETE CASCADE,
+        FOREIGN KEY (id_drink) REFERENCES drink (id_drink)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_cart_lines_id_cart ON cart_lines (id_cart)",
+    """
+    CREATE TABLE IF NOT EXISTS cart_line_addons (
+        id_line INTEGER NOT NULL,
+        id_ingredient INTEGER NOT NULL,
+        PRIMARY KEY (id_line, id_ingredient),
+        FOREIGN KEY (id_line) REFERENCES cart_lines (id_line) ON DELETE CASCADE,
+        FOREIGN KEY (id_ingredient) REFERENCES ingredient (id_ingredient)
+    )
+    """,
+]
+
+# 6
+EVENTS = [
+    """
+    CREATE OR REPLACE FUNCTION notify_order_created() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('order_created', json_build_object(
+            'kind', 'order', 'id_order', n.id_order, 'id_drink', n.id_drink, 'id_ingredient', n.id_ingredient,
+            'sugar_amount', n.sugar_amount, 'payment_status', n.payment_status, 'created_at', n.created_at
+        )::text)
+        FROM new_orders n ORDER BY n.id_order;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER orders_created
+    AFTER INSERT ON orders
+    REFERENCING NEW TABLE AS new_orders
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_order_created()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION notify_cart_created() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('order_created', json_build_object(
+            'kind', 'cart', 'id_cart', n.id_cart, 'payment_status', n.payment_status,
+            'total', n.total, 'created_at', n.created_at
+        )::text)
+        FROM new_carts n ORDER BY n.id_cart;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER cart_orders_created
+    AFTER INSERT ON cart_orders
+    REFERENCING NEW TABLE AS new_carts
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cart_created()
+    """,
+]
+
+# 7: индекс списка заказов пересоздается покрывающим
+ACCESS_INDEXES = [
+    "DROP INDEX IF EXISTS ix_orders_created_at_id_order",
+    "CREATE INDEX IF NOT EXISTS ix_orders_created_at_id_order ON orders (created_at, id_order) "
+    "INCLUDE (id_drink, id_ingredient, payment_status)",
+    "CREATE INDEX IF NOT EXISTS ix_orders_id_drink_created_at ON orders (id_drink, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_orders_id_ingredient_created_at ON orders (id_ingredient, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_orders_payment_status_created_at ON orders (payment_status, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_ingredient_visible_name ON ingredient (name_ingredient) "
+    "INCLUDE (id_ingredient, unit, portion) WHERE is_visible",
+    "CREATE INDEX IF NOT EXISTS ix_drink_ingredient_id_ingredient ON drink_ingredient (id_ingredient) INCLUDE (id_drink, amount)",
+    "CREATE INDEX IF NOT EXISTS ix_cart_lines_id_cart ON cart_lines (id_cart)",
+    "CREATE INDEX IF NOT EXISTS ix_cart_lines_id_drink ON cart_lines (id_drink)",
+    "CREATE INDEX IF NOT EXISTS ix_cart_line_addons_id_ingredient ON cart_line_addons (id_ingredient)",
+    "CREATE INDEX IF NOT EXISTS ix_sales_hourly_id_drink_bucket ON sales_hourly (id_drink, bucket)",
+]
+
+# 8: секционированная orders; индексы прежней таблицы удаляются до создания новой, триггеры ставятся после переноса строк
+ORDERS_LEGACY_INDEXES = (
+    "ix_orders_created_at_id_order", "ix_orders_id_drink_created_at",
+    "ix_orders_id_ingredient_created_at", "ix_orders_payment_status_created_at",
+)
+PARTITIONED_ORDERS = [
+    """
+    CREATE TABLE orders (
+        id_order SERIAL NOT NULL,
+        id_drink INTEGER NOT NULL,
+        id_ingredient INTEGER NOT NULL,
+        sugar_amount INTEGER NOT NULL,
+        payment_status VARCHAR(10) NOT NULL,
+        created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL,
+        PRIMARY KEY (id_order, created_at),
+        FOREIGN KEY (id_drink) REFERENCES drink (id_drink),
+        FOREIGN KEY (id_ingredient) REFERENCES ingredient (id_ingredient)
+    ) PARTITION BY RANGE (created_at)
+    """,
+    "CREATE INDEX ix_orders_created_at_id_order ON orders (created_at, id_order) INCLUDE (id_drink, id_ingredient, payment_status)",
+    "CREATE INDEX ix_orders_id_drink_created_at ON orders (id_drink, created_at)",
+    "CREATE INDEX ix_orders_id_ingredient_created_at ON orders (id_ingredient, created_at)",
+    "CREATE INDEX ix_orders_payment_status_created_at ON orders (payment_status, created_at)",
+]
+PARTITIONED_ORDERS_TRIGGERS = [
+    """
+    CREATE OR REPLACE TRIGGER orders_rollup
+    AFTER INSERT ON orders
+    REFERENCING NEW TABLE AS new_orders
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_orders()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER orders_created
+    AFTER INSERT ON orders
+    REFERENCING NEW TABLE AS new_orders
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_order_created()
+    """,
+]
+
+# 9: точки; колонки id_shop добавляет сама миграция, здесь таблица, индексы и триггеры с id_shop
+SHOPS = [
+    """
+    CREATE TABLE IF NOT EXISTS shops (
+        id_shop SERIAL NOT NULL,
+        name_shop VARCHAR(100) NOT NULL,
+        PRIMARY KEY (id_shop)
+    )
+    """,
+]
+SHOPS_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_orders_id_shop_created_at_id_order ON orders (id_shop, created_at, id_order) "
+    "INCLUDE (id_drink, id_ingredient, payment_status)",
+    "CREATE INDEX IF NOT EXISTS ix_orders_id_shop_id_drink_created_at ON orders (id_shop, id_drink, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_orders_id_shop_id_ingredient_created_at ON orders (id_shop, id_ingredient, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_orders_id_shop_payment_status_created_at ON orders (id_shop, payment_status, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_cart_orders_id_shop_created_at ON cart_orders (id_shop, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_sales_hourly_id_shop_id_drink_bucket ON sales_hourly (id_shop, id_drink, bucket)",
+]
+SHOPS_TRIGGERS = [
+    """
+    CREATE OR REPLACE TRIGGER shops_menu_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON shops
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_menu_changed()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION notify_stock_changed() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            PERFORM pg_notify('stock_changed', json_build_object('id_shop', OLD.id_shop, 'id_ingredient', OLD.id_ingredient, 'quantity', NULL)::text);
+        ELSE
+            PERFORM pg_notify('stock_changed', json_build_object('id_shop', NEW.id_shop, 'id_ingredient', NEW.id_ingredient, 'quantity', NEW.quantity)::text);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER inventory_stock_changed
+    AFTER INSERT OR UPDATE OR DELETE ON inventory
+    FOR EACH ROW EXECUTE FUNCTION notify_stock_changed()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION rollup_orders() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO sales_hourly AS s (bucket, id_shop, id_drink, id_ingredient, orders, sugar_amount, revenue)
+        SELECT date_trunc('hour', n.created_at), n.id_shop, n.id_drink, n.id_ingredient, count(*), sum(n.sugar_amount), sum(d.price)
+        FROM new_orders n JOIN drink d ON d.id_drink = n.id_drink
+        GROUP BY 1, 2, 3, 4
+        ORDER BY 1, 2, 3, 4
+        ON CONFLICT (bucket, id_shop, id_drink, id_ingredient) DO UPDATE SET
+            orders = s.orders + EXCLUDED.orders,
+            sugar_amount = s.sugar_amount + EXCLUDED.sugar_amount,
+            revenue = s.revenue + EXCLUDED.revenue;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER orders_rollup
+    AFTER INSERT ON orders
+    REFERENCING NEW TABLE AS new_orders
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_orders()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION notify_order_created() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('order_created', json_build_object(
+            'kind', 'order', 'id_order', n.id_order, 'id_shop', n.id_shop, 'id_drink', n.id_drink, 'id_ingredient', n.id_ingredient,
+            'sugar_amount', n.sugar_amount, 'payment_status', n.payment_status, 'created_at', n.created_at
+        )::text)
+        FROM new_orders n ORDER BY n.id_order;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER orders_created
+    AFTER INSERT ON orders
+    REFERENCING NEW TABLE AS new_orders
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_order_created()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION notify_cart_created() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('order_created', json_build_object(
+            'kind', 'cart', 'id_cart', n.id_cart, 'id_shop', n.id_shop, 'payment_status', n.payment_status,
+            'total', n.total, 'created_at', n.created_at
+        )::text)
+        FROM new_carts n ORDER BY n.id_cart;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER cart_orders_created
+    AFTER INSERT ON cart_orders
+    REFERENCING NEW TABLE AS new_carts
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cart_created()
+    """,
+]
+
+# 11: резерв склада воркеров write-behind
+STOCK_LEASES = [
+    """
+    CREATE TABLE IF NOT EXISTS stock_leases (
+        owner VARCHAR(32) NOT NULL,
+        id_shop INTEGER NOT NULL REFERENCES shops (id_shop),
+        id_ingredient INTEGER NOT NULL REFERENCES ingredient (id_ingredient) ON DELETE CASCADE,
+        quantity NUMERIC(10, 2) NOT NULL,
+        PRIMARY KEY (owner, id_shop, id_ingredient)
+    )
+    """,
+]
+
+# 12: уведомления склада на инструкцию, а не на строку: pg_notify берет глобальную блокировку очереди уведомлений до коммита,
+# и построчные уведомления сериализовали коммиты заказов. Одно уведомление на точку: {"id_shop", "stock": {ингредиент: остаток}},
+# удаленные строки - null; не влезло в предел payload - "stock": null, воркеры перечитывают склад точки
+STOCK_NOTIFY_STATEMENT = [
+    "DROP TRIGGER IF EXISTS inventory_stock_changed ON inventory",
+    """
+    CREATE OR REPLACE FUNCTION notify_stock(shop integer, stock json) RETURNS void AS $$
+    DECLARE
+        payload text := json_build_object('id_shop', shop, 'stock', stock)::text;
+    BEGIN
+        IF octet_length(payload) > 7900 THEN
+            payload := json_build_object('id_shop', shop, 'stock', NULL)::text;
+        END IF;
+        PERFORM pg_notify('stock_changed', payload);
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION notify_stock_changed() RETURNS trigger AS $$
+    DECLARE
+        changed record;
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            FOR changed IN
+                SELECT o.id_shop, json_object_agg(o.id_ingredient, NULL) AS stock FROM old_stock o GROUP BY o.id_shop ORDER BY o.id_shop
+            LOOP
+                PERFORM notify_stock(changed.id_shop, changed.stock);
+            END LOOP;
+        ELSE
+            FOR changed IN
+                SELECT n.id_shop, json_object_agg(n.id_ingredient, n.quantity) AS stock FROM new_stock n GROUP BY n.id_shop ORDER BY n.id_shop
+            LOOP
+                PERFORM notify_stock(changed.id_shop, changed.stock);
+            END LOOP;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    # таблицы переходов разрешены только у триггера на одно событие
+    """
+    CREATE OR REPLACE TRIGGER inventory_stock_inserted
+    AFTER INSERT ON inventory
+    REFERENCING NEW TABLE AS new_stock
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_stock_changed()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER inventory_stock_updated
+    AFTER UPDATE ON inventory
+    REFERENCING NEW TABLE AS new_stock
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_stock_changed()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER inventory_stock_deleted
+    AFTER DELETE ON inventory
+    REFERENCING OLD TABLE AS old_stock
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_stock_changed()
+    """,
+]
+
+# 13: номера событий точки для push-канала. Строка shop_events увеличивается в транзакции изменения и держится
+# заблокированной до коммита, поэтому номера точки идут подряд в порядке коммитов - id события одинаков во всех воркерах.
+# Заказы и корзины тоже уведомляются одним payload на точку и инструкцию; не влезло в предел - без строк, только count
+SHOP_EVENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS shop_events (
+        id_shop INTEGER NOT NULL REFERENCES shops (id_shop) ON DELETE CASCADE,
+        seq BIGINT NOT NULL,
+        PRIMARY KEY (id_shop)
+    )
+    """,
+    """
+    CREATE OR REPLACE FUNCTION next_shop_event(shop integer) RETURNS bigint AS $$
+        INSERT INTO shop_events AS e (id_shop, seq) VALUES (shop, 1)
+        ON CONFLICT (id_shop) DO UPDATE SET seq = e.seq + 1
+        RETURNING seq
+    $$ LANGUAGE sql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION notify_stock(shop integer, stock json) RETURNS void AS $$
+    DECLARE
+        seq bigint := next_shop_event(shop);
+        payload text := json_build_object('id_shop', shop, 'seq', seq, 'stock', stock)::text;
+    BEGIN
+        IF octet_length(payload) > 7900 THEN
+            payload := json_build_object('id_shop', shop, 'seq', seq, 'stock', NULL)::text;
+        END IF;
+        PERFORM pg_notify('stock_changed', payload);
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION notify_created(kind text, shop integer, count bigint, rows json) RETURNS void AS $$
+    DECLARE
+        seq bigint := next_shop_event(shop);
+        payload text := json_build_object('kind', kind, 'id_shop', shop, 'seq', seq, 'count', count, 'rows', rows)::text;
+    BEGIN
+        IF octet_length(payload) > 7900 THEN
+            payload := json_build_object('kind', kind, 'id_shop', shop, 'seq', seq, 'count', count, 'rows', NULL)::text;
+        END IF;
+        PERFORM pg_notify('order_created', payload);
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION notify_order_created() RETURNS trigger AS $$
+    DECLARE
+        created record;
+    BEGIN
+        FOR created IN
+            SELECT n.id_shop, count(*) AS count, json_agg(json_build_object(
+                'id_order', n.id_order, 'id_drink', n.id_drink, 'id_ingredient', n.id_ingredient,
+                'sugar_amount', n.sugar_amount, 'payment_status', n.payment_status, 'created_at', n.created_at
+            ) ORDER BY n.id_order) AS rows
+            FROM new_orders n GROUP BY n.id_shop ORDER BY n.id_shop
+        LOOP
+            PERFORM notify_created('order', created.id_shop, created.count, created.rows);
+        END LOOP;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION notify_cart_created() RETURNS trigger AS $$
+    DECLARE
+        created record;
+    BEGIN
+        FOR created IN
+            SELECT n.id_shop, count(*) AS count, json_agg(json_build_object(
+                'id_cart', n.id_cart, 'payment_status', n.payment_status, 'total', n.total, 'created_at', n.created_at
+            ) ORDER BY n.id_cart) AS rows
+            FROM new_carts n GROUP BY n.id_shop ORDER BY n.id_shop
+        LOOP
+            PERFORM notify_created('cart', created.id_shop, created.count, created.rows);
+        END LOOP;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+]
+
+# 14: версия заказов точки для условных GET: триггер заказов увеличивает ее на число вставленных строк в той же транзакции,
+# воркеры берут ее из бд и из уведомления, а не считают сами
+ORDERS_VERSION = [
+    "ALTER TABLE shop_events ADD COLUMN IF NOT EXISTS orders BIGINT NOT NULL DEFAULT 0",
+    """
+    CREATE OR REPLACE FUNCTION notify_created(kind text, shop integer, count bigint, rows json) RETURNS void AS $$
+    DECLARE
+        event_seq bigint;
+        orders_version bigint;
+        payload text;
+    BEGIN
+        INSERT INTO shop_events AS e (id_shop, seq, orders) VALUES (shop, 1, CASE WHEN kind = 'order' THEN count ELSE 0 END)
+        ON CONFLICT (id_shop) DO UPDATE SET seq = e.seq + 1, orders = e.orders + EXCLUDED.orders
+        RETURNING e.seq, e.orders INTO event_seq, orders_version;
+        payload := json_build_object(
+            'kind', kind, 'id_shop', shop, 'seq', event_seq, 'version', orders_version, 'count', count, 'rows', rows
+        )::text;
+        IF octet_length(payload) > 7900 THEN
+            payload := json_build_object(
+                'kind', kind, 'id_shop', shop, 'seq', event_seq, 'version', orders_version, 'count', count, 'rows', NULL
+            )::text;
+        END IF;
+        PERFORM pg_notify('order_created', payload);
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+]
+
+# 16: продажи корзин в почасовых агрегатах. В строке корзины напиток с количеством и любым числом добавок, поэтому у корзин
+# свои таблицы: напитки (cart_sales_hourly) и добавки (cart_addons_hourly), иначе строка с двумя добавками попала бы
+# в продажи напитка дважды. Триггеры на инструкцию, как у orders; агрегаты существующих корзин считаются после установки
+# триггеров - CREATE TRIGGER держит блокировку таблицы до коммита миграции, новых строк в это время не появится
+CART_ROLLUP = [
+    """
+    CREATE TABLE IF NOT EXISTS cart_sales_hourly (
+        bucket TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        id_shop INTEGER DEFAULT 1 NOT NULL,
+        id_drink INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        sugar_amount INTEGER NOT NULL,
+        revenue NUMERIC(14, 2) NOT NULL,
+        PRIMARY KEY (bucket, id_shop, id_drink),
+        FOREIGN KEY (id_shop) REFERENCES shops (id_shop),
+        FOREIGN KEY (id_drink) REFERENCES drink (id_drink)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS cart_addons_hourly (
+        bucket TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        id_shop INTEGER DEFAULT 1 NOT NULL,
+        id_ingredient INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        revenue NUMERIC(14, 2) NOT NULL,
+        PRIMARY KEY (bucket, id_shop, id_ingredient),
+        FOREIGN KEY (id_shop) REFERENCES shops (id_shop),
+        FOREIGN KEY (id_ingredient) REFERENCES ingredient (id_ingredient)
+    )
+    """,
+    """
+    CREATE OR REPLACE FUNCTION rollup_cart_lines() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO cart_sales_hourly AS s (bucket, id_shop, id_drink, quantity, sugar_amount, revenue)
+        SELECT date_trunc('hour', c.created_at), c.id_shop, n.id_drink, sum(n.quantity), sum(n.sugar_amount * n.quantity),
+               sum(d.price * n.quantity)
+        FROM new_lines n JOIN cart_orders c ON c.id_cart = n.id_cart JOIN drink d ON d.id_drink = n.id_drink
+        GROUP BY 1, 2, 3
+        ORDER BY 1, 2, 3
+        ON CONFLICT (bucket, id_shop, id_drink) DO UPDATE SET
+            quantity = s.quantity + EXCLUDED.quantity,
+            sugar_amount = s.sugar_amount + EXCLUDED.sugar_amount,
+            revenue = s.revenue + EXCLUDED.revenue;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER cart_lines_rollup
+    AFTER INSERT ON cart_lines
+    REFERENCING NEW TABLE AS new_lines
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_cart_lines()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION rollup_cart_addons() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO cart_addons_hourly AS s (bucket, id_shop, id_ingredient, quantity, revenue)
+        SELECT date_trunc('hour', c.created_at), c.id_shop, n.id_ingredient, sum(l.quantity), sum(d.price * l.quantity)
+        FROM new_addons n JOIN cart_lines l ON l.id_line = n.id_line JOIN cart_orders c ON c.id_cart = l.id_cart
+        JOIN drink d ON d.id_drink = l.id_drink
+        GROUP BY 1, 2, 3
+        ORDER BY 1, 2, 3
+        ON CONFLICT (bucket, id_shop, id_ingredient) DO UPDATE SET
+            quantity = s.quantity + EXCLUDED.quantity,
+            revenue = s.revenue + EXCLUDED.revenue;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER cart_line_addons_rollup
+    AFTER INSERT ON cart_line_addons
+    REFERENCING NEW TABLE AS new_addons
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_cart_addons()
+    """,
+    """
+    INSERT INTO cart_sales_hourly (bucket, id_shop, id_drink, quantity, sugar_amount, revenue)
+    SELECT date_trunc('hour', c.created_at), c.id_shop, l.id_drink, sum(l.quantity), sum(l.sugar_amount * l.quantity),
+           sum(d.price * l.quantity)
+    FROM cart_lines l JOIN cart_orders c ON c.id_cart = l.id_cart JOIN drink d ON d.id_drink = l.id_drink
+    GROUP BY 1, 2, 3
+    ON CONFLICT DO NOTHING
+    """,
+    """
+    INSERT INTO cart_addons_hourly (bucket, id_shop, id_ingredient, quantity, revenue)
+    SELECT date_trunc('hour', c.created_at), c.id_shop, a.id_ingredient, sum(l.quantity), sum(d.price * l.quantity)
+    FROM cart_line_addons a JOIN cart_lines l ON l.id_line = a.id_line JOIN cart_orders c ON c.id_cart = l.id_cart
+    JOIN drink d ON d.id_drink = l.id_drink
+    GROUP BY 1, 2, 3
+    ON CONFLICT DO NOTHING
+    """,
+]
+
+# 17: шард точки в реестре точек. Заполняется при старте воркера текущим распределением и командой core.shops add;
+# дальше воркер сверяет с ним настройки и не стартует, если точка с данными переехала бы в другой шард
+SHOP_SHARD = [
+    "ALTER TABLE shops ADD COLUMN IF NOT EXISTS shard INTEGER",
+]
@@ -0,0 +1,195 @@
+# Версионированные миграции схемы. Применяются один раз под advisory lock:
+#   python -m core.migrations upgrade   # шаг деплоя перед запуском воркеров
+#   python -m core.migrations status
+# Воркеры при старте только сверяют версию (один SELECT); миграции сами запускаются лишь при DB_AUTO_MIGRATE или DEV_MODE.
+# Каждая миграция идемпотентна и выполняет DDL, замороженный на момент ее версии (core/migration_ddl.py), а не текущие модели.
+import asyncio
+import sys
+from sqlalchemy import MetaData, Table, Column, Integer, String, TIMESTAMP, func, select, text, insert
+from core.config import settings
+from core import migration_ddl as ddl, partitions
+
+ADVISORY_LOCK_KEY = 72_10_2025  # общий ключ pg_advisory_xact_lock для миграций
+
+# служебная таблица живет вне Base.metadata, чтобы drop_all/create_all ее не трогали
+version_metadata = MetaData()
+schema_version = Table(
+    "schema_version", version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", TIMESTAMP, server_default=func.now()),
+)
+
+
+def _run(*statements):
+    def migrate(conn):
+        for statement in statements:
+            conn.exec_driver_sql(statement)
+    return migrate
+
+
+def _partition_orders(conn):
+    # orders становится секционированной по месяцам: старая таблица переименовывается, строки переносятся в новую,
+    # триггеры ставятся после переноса, чтобы агрегаты и уведомления не повторились
+    months_ahead = settings.app_settings.orders_partitions_ahead
+    if conn.exec_driver_sql("SELECT relkind FROM pg_class WHERE oid = 'orders'::regclass").scalar() == "p":
+        partitions.ensure(conn, months_ahead)
+        return
+    sequence = conn.exec_driver_sql("SELECT pg_get_serial_sequence('orders', 'id_order')").scalar()
+    conn.exec_driver_sql("ALTER TABLE orders RENAME TO orders_legacy")
+    conn.exec_driver_sql("ALTER TABLE orders_legacy RENAME CONSTRAINT orders_pkey TO orders_legacy_pkey")
+    conn.exec_driver_sql(f"ALTER SEQUENCE {sequence} RENAME TO orders_legacy_id_order_seq")
+    for name in ddl.ORDERS_LEGACY_INDEXES:
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+
+    _run(*ddl.PARTITIONED_ORDERS)(conn)
+    since = conn.exec_driver_sql("SELECT min(created_at) FROM orders_legacy").scalar()
+    partitions.ensure(conn, months_ahead, since)
+    conn.exec_driver_sql(
+        "INSERT INTO orders (id_order, id_drink, id_ingredient, sugar_amount, payment_status, created_at) "
+        "SELECT id_order, id_drink, id_ingredient, sugar_amount, payment_status, coalesce(created_at, now()) FROM orders_legacy"
+    )
+    # последовательность продолжается с прежнего значения: id, уже выданные write-behind, не повторятся
+    conn.exec_driver_sql(
+        "SELECT setval(pg_get_serial_sequence('orders', 'id_order'), last_value, is_called) FROM orders_legacy_id_order_seq"
+    )
+    conn.exec_driver_sql("DROP TABLE orders_legacy")
+    _run(*ddl.PARTITIONED_ORDERS_TRIGGERS)(conn)
+
+
+def _has_column(conn, table: str, column: str) -> bool:
+    return conn.exec_driver_sql(
+        f"SELECT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = '{table}' AND column_name = '{column}')"
+    ).scalar()
+
+
+def _shops(conn):
+    # измерение точек: существующие склад, заказы, корзины и агрегаты относятся к точке 1,
+    # первичные ключи склада и агрегатов расширяются id_shop, индексы заказов начинаются с id_shop
+    _run(*ddl.SHOPS)(conn)
+    conn.exec_driver_sql("INSERT INTO shops (id_shop, name_shop) VALUES (1, 'Основная точка') ON CONFLICT DO NOTHING")
+    if not _has_column(conn, "drink", "id_shop"):
+        conn.exec_driver_sql("ALTER TABLE drink ADD COLUMN id_shop INTEGER REFERENCES shops (id_shop) ON DELETE CASCADE")
+    for table, primary_key in (("inventory", "id_shop, id_ingredient"), ("sales_hourly", "bucket, id_shop, id_drink, id_ingredient")):
+        if not _has_column(conn, table, "id_shop"):
+            conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN id_shop INTEGER NOT NULL DEFAULT 1 REFERENCES shops (id_shop)")
+            conn.exec_driver_sql(f"ALTER TABLE {table} DROP CONSTRAINT {table}_pkey, ADD PRIMARY KEY ({primary_key})")
+    for table in ("orders", "cart_orders"):
+        if not _has_column(conn, table, "id_shop"):
+            conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN id_shop INTEGER NOT NULL DEFAULT 1 REFERENCES shops (id_shop)")
+    for name in ("ix_orders_created_at_id_order", "ix_orders_id_drink_created_at", "ix_orders_id_ingredient_created_at",
+                 "ix_orders_payment_status_created_at", "ix_cart_orders_created_at_id_cart", "ix_sales_hourly_id_drink_bucket"):
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+    _run(*ddl.SHOPS_INDEXES, *ddl.SHOPS_TRIGGERS)(conn)
+
+
+def _costs(conn):
+    # цена единицы ингредиента для расчета себестоимости и себестоимость корзины на момент заказа
+    if not _has_column(conn, "ingredient", "unit_cost"):
+        conn.exec_driver_sql("ALTER TABLE ingredient ADD COLUMN unit_cost NUMERIC(10, 4) NOT NULL DEFAULT 0")
+    if not _has_column(conn, "cart_orders", "cost"):
+        conn.exec_driver_sql("ALTER TABLE cart_orders ADD COLUMN cost NUMERIC(10, 2)")
+
+
+def _idempotency_scope(conn):
+    # ключ идемпотентности действует внутри точки и помнит хэш тела запроса; прежние ключи относятся к точке 1
+    if not _has_column(conn, "idempotency_keys", "id_shop"):
+        conn.exec_driver_sql("ALTER TABLE idempotency_keys ADD COLUMN id_shop INTEGER NOT NULL DEFAULT 1 REFERENCES shops (id_shop)")
+        conn.exec_driver_sql("ALTER TABLE idempotency_keys DROP CONSTRAINT idempotency_keys_pkey, ADD PRIMARY KEY (id_shop, key)")
+    if not _has_column(conn, "idempotency_keys", "request_hash"):
+        conn.exec_driver_sql("ALTER TABLE idempotency_keys ADD COLUMN request_hash VARCHAR(64)")
+
+
+MIGRATIONS = [
+    (1, "baseline", _run(*ddl.BASELINE, *ddl.ORDERS_INDEXES)),
+    (2, "triggers", _run(*ddl.TRIGGERS)),
+    (3, "orders_indexes", _run(*ddl.ORDERS_INDEXES)),
+    (4, "idempotency_keys", _run(*ddl.IDEMPOTENCY_KEYS)),
+    (5, "carts", _run(*ddl.CARTS)),
+    (6, "order_events", _run(*ddl.EVENTS)),
+    (7, "access_indexes", _run(*ddl.ACCESS_INDEXES)),
+    (8, "partition_orders", _partition_orders),
+    (9, "shops", _shops),
+    (10, "costs", _costs),
+    (11, "stock_leases", _run(*ddl.STOCK_LEASES)),
+    (12, "stock_notify_statement", _run(*ddl.STOCK_NOTIFY_STATEMENT)),
+    (13, "shop_events", _run(*ddl.SHOP_EVENTS)),
+    (14, "orders_version", _run(*ddl.ORDERS_VERSION)),
+    (15, "idempotency_scope", _idempotency_scope),
+    (16, "cart_rollup", _run(*ddl.CART_ROLLUP)),
+    (17, "shop_shard", _run(*ddl.SHOP_SHARD)),
+]
+LATEST = MIGRATIONS[-1][0]
+
+
+class SchemaOutdated(RuntimeError):
+    pass
+
+
+def _current(conn) -> int:
+    version_metadata.create_all(conn)
+    return conn.execute(select(func.coalesce(func.max(schema_version.c.version), 0))).scalar_one()
+
+
+def _upgrade(conn) -> list[str]:
+    # под транзакционной advisory-блокировкой: второй воркер дождется первого и увидит уже новую версию
+    conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+    current = _current(conn)
+    applied = []
+    for version, name, migrate in MIGRATIONS:
+        if version > current:
+            migrate(conn)
+            conn.execute(insert(schema_version).values(version=version, name=name))
+            applied.append(f"{version}_{name}")
+    return applied
+
+
+async def version(engine) -> int:
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            text("SELECT to_regclass('schema_version') IS NOT NULL")
+        )
+        if not result.scalar_one():
+            return 0
+        return (await conn.execute(select(func.coalesce(func.max(schema_version.c.version), 0)))).scalar_one()
+
+
+async def upgrade(engine) -> list[str]:
+    async with engine.begin() as conn:
+        return await conn.run_sync(_upgrade)
+
+
+async def ensure(engine, auto_migrate: bool):
+    # при старте воркера: быстрый путь - одна проверка версии без блокировок
+    current = await version(engine)
+    if current == LATEST:
+        return
+    if current > LATEST:
+        raise SchemaOutdated(f"Схема бд новее кода: версия {current}, код знает до {LATEST}")
+    if not auto_migrate:
+        raise SchemaOutdated(
+            f"Схема бд устарела: версия {current}, нужна {LATEST}. Запустите python -m core.migrations upgrade"
+        )
+    await upgrade(engine)
+
+
+async def main(command: str):
+    from core.db import engine, shards
+
+    try:
+        if command not in ("upgrade", "status"):
+            raise SystemExit("Использование: python -m core.migrations upgrade|status")
+        # схема у всех шардов одна, миграции применяются к каждому
+        for shard in shards.shards:
+            if command == "upgrade":
+                applied = await upgrade(shard.engine)
+                print(f"Шард {shard.number}: " + ("применены миграции: " + ", ".join(applied) if applied else f"схема актуальна (версия {LATEST})"))
+            else:
+                print(f"Шард {shard.number}: версия схемы {await version(shard.engine)}, последняя миграция: {LATEST}")
+    finally:
+        await shards.dispose()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else ""))
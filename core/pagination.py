@@ -0,0 +1,18 @@
+import base64
+from datetime import datetime
+from fastapi import HTTPException
+
+
+# курсор keyset-пагинации: непрозрачная строка из (created_at, id) последней отданной строки
+def encode_cursor(created_at: datetime, id_: int) -> str:
+    raw = f"{created_at.isoformat()}|{id_}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, id_ = raw.split("|")
+        return datetime.fromisoformat(created_at), int(id_)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
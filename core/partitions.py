@@ -0,0 +1,225 @@
+# Помесячные секции orders (PARTITION BY RANGE (created_at)) и архив старых секций в csv.gz.
+#   python -m core.partitions ensure                # секции на текущий и следующие месяцы
+#   python -m core.partitions status
+#   python -m core.partitions archive [--before 2025-01]   # по умолчанию старше ORDERS_RETENTION_MONTHS
+#   python -m core.partitions restore 2024-03 [--shard 1]
+# Секции ведутся на каждом шарде, архив шарда лежит в <ORDERS_ARCHIVE_DIR>/<номер шарда>/.
+# Строки вне созданных секций попадают в orders_default; при создании секции на их месяц они переносятся в нее.
+# Почасовые агрегаты sales_hourly при архивации не трогаются: аналитика по архивным месяцам остается полной.
+import asyncio
+import gzip
+import logging
+import os
+import re
+import sys
+from datetime import date, datetime
+from pathlib import Path
+import asyncpg
+from core.config import settings
+from core.db import Shard, get_engine, shards
+
+logger = logging.getLogger(__name__)
+
+PARENT = "orders"
+DEFAULT = "orders_default"
+NAME_RE = re.compile(r"^orders_p(\d{4})(\d{2})$")
+LOCK_KEY = 72_10_2026  # pg_advisory_xact_lock на создание секций из нескольких воркеров
+
+
+def month_start(value: date | datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"orders_p{month:%Y%m}"
+
+
+def partition_month(name: str) -> date | None:
+    match = NAME_RE.match(name)
+    return date(int(match[1]), int(match[2]), 1) if match else None
+
+
+def attached(conn) -> list[str]:
+    rows = conn.exec_driver_sql(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        f"WHERE i.inhparent = '{PARENT}'::regclass ORDER BY c.relname"
+    )
+    return [row[0] for row in rows]
+
+
+def create_partition(conn, month: date):
+    # строки этого месяца, уже лежащие в orders_default, переносятся: иначе postgres не даст создать секцию
+    name, start, end = partition_name(month), month, add_months(month, 1)
+    bounds = f"FOR VALUES FROM ('{start}') TO ('{end}')"
+    in_range = f"created_at >= '{start}' AND created_at < '{end}'"
+    has_default = DEFAULT in attached(conn)
+    if has_default and conn.exec_driver_sql(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT} WHERE {in_range})").scalar():
+        conn.exec_driver_sql(f"ALTER TABLE {PARENT} DETACH PARTITION {DEFAULT}")
+        conn.exec_driver_sql(f"CREATE TABLE {name} PARTITION OF {PARENT} {bounds}")
+        conn.exec_driver_sql(
+            f"WITH moved AS (DELETE FROM {DEFAULT} WHERE {in_range} RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+        )
+        conn.exec_driver_sql(f"ALTER TABLE {PARENT} ATTACH PARTITION {DEFAULT} DEFAULT")
+    else:
+        conn.exec_driver_sql(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT} {bounds}")
+
+
+def ensure(conn, months_ahead: int, since: date | datetime | None = None) -> list[str]:
+    # секции с месяца since (по умолчанию текущего) на months_ahead месяцев вперед и секция по умолчанию
+    conn.exec_driver_sql(f"SELECT pg_advisory_xact_lock({LOCK_KEY})")
+    conn.exec_driver_sql(f"CREATE TABLE IF NOT EXISTS {DEFAULT} PARTITION OF {PARENT} DEFAULT")
+    existing = set(attached(conn))
+    month = month_start(since or datetime.now())
+    last = add_months(month_start(datetime.now()), months_ahead)
+    created = []
+    while month <= last:
+        if partition_name(month) not in existing:
+            create_partition(conn, month)
+            created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+
+class PartitionMaintenance:
+    # секции на будущие месяцы создаются заранее: при старте воркера и затем раз в interval секунд
+    def __init__(self, months_ahead: int, interval: float):
+        self.months_ahead = months_ahead
+        self.interval = interval
+        self._task = None
+
+    async def run_once(self) -> list[str]:
+        created = []
+        for shard in shards.shards:
+            async with shard.engine.begin() as conn:
+                names = await conn.run_sync(ensure, self.months_ahead)
+            if names:
+                logger.info("Шард %s: созданы секции заказов: %s", shard.number, ", ".join(names))
+            created += names
+        return created
+
+    async def start(self):
+        await self.run_once()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Не удалось создать секции заказов")
+
+
+def _fsync_dir(directory: Path):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+async def archive(shard: Shard, before: date, directory: Path) -> list[Path]:
+    # секция отсоединяется, выгружается в csv.gz (временный файл, fsync, rename, fsync каталога) и только затем удаляется;
+    # отсоединенные, но не удаленные после сбоя секции подбираются при следующем запуске
+    directory = directory / str(shard.number)
+    directory.mkdir(parents=True, exist_ok=True)
+    conn = await asyncpg.connect(shard.dsn)
+    try:
+        names = await conn.fetch("SELECT relname, relispartition FROM pg_class WHERE relkind = 'r' AND relname ~ '^orders_p[0-9]{6}$'")
+        done = []
+        for name, is_partition in sorted(names):
+            month = partition_month(name)
+            if add_months(month, 1) > before:
+                continue
+            if is_partition:
+                await conn.execute(f"ALTER TABLE {PARENT} DETACH PARTITION {name}")
+            path = directory / f"{name}.csv.gz"
+            tmp = path.with_name(path.name + ".tmp")
+            with open(tmp, "wb") as raw:
+                # gzip закрывается до fsync: иначе на диск попадает файл без хвоста (crc и длины)
+                with gzip.GzipFile(fileobj=raw, mode="wb") as out:
+                    async def sink(chunk: bytes):
+                        out.write(chunk)
+                    await conn.copy_from_table(name, output=sink, format="csv", header=True)
+                raw.flush()
+                os.fsync(raw.fileno())
+            os.replace(tmp, path)
+            _fsync_dir(directory)  # переименование тоже должно пережить сбой, прежде чем секция удалится
+            await conn.execute(f"DROP TABLE {name}")
+            logger.info("Секция %s выгружена в %s", name, path)
+            done.append(path)
+        return done
+    finally:
+        await conn.close()
+
+
+async def restore(shard: Shard, month: date, directory: Path):
+    # загрузка в отдельную таблицу и ATTACH: триггеры orders не срабатывают, агрегаты не удваиваются
+    name = partition_name(month)
+    path = directory / str(shard.number) / f"{name}.csv.gz"
+    conn = await asyncpg.connect(shard.dsn)
+    try:
+        async with conn.transaction():
+            await conn.execute(f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+            with gzip.open(path, "rb") as source:
+                await conn.copy_to_table(name, source=source, format="csv", header=True)
+            await conn.execute(
+                f"ALTER TABLE {PARENT} ATTACH PARTITION {name} FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+            )
+    finally:
+        await conn.close()
+
+
+def _month_arg(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m").date()
+
+
+async def main(args: list[str]):
+    app = settings.app_settings
+    directory = Path(app.orders_archive_dir)
+    command = args[0] if args else ""
+    try:
+        if command == "ensure":
+            created = await PartitionMaintenance(app.orders_partitions_ahead, 0).run_once()
+            print("Созданы секции:", ", ".join(created) if created else "нет")
+        elif command == "status":
+            for shard in shards.shards:
+                async with shard.engine.connect() as conn:
+                    for name in await conn.run_sync(attached):
+                        print(f"{shard.number}: {name}")
+        elif command == "archive":
+            if args[1:2] == ["--before"] and len(args) > 2:
+                before = _month_arg(args[2])
+            else:
+                before = add_months(month_start(datetime.now()), -app.orders_retention_months)
+            for shard in shards.shards:
+                for path in await archive(shard, before, directory):
+                    print("Выгружено:", path)
+        elif command == "restore" and len(args) > 1:
+            # месяц восстанавливается в тот шард, из архива которого он выгружен
+            number = int(args[3]) if args[2:3] == ["--shard"] and len(args) > 3 else 0
+            await restore(shards.shards[number], _month_arg(args[1]), directory)
+            print("Секция восстановлена:", partition_name(_month_arg(args[1])))
+        else:
+            raise SystemExit(
+                "Использование: python -m core.partitions ensure|status|archive [--before YYYY-MM]|restore YYYY-MM [--shard N]"
+            )
+    finally:
+        await shards.dispose()
+        await get_engine().dispose()
+
+
+maintenance = PartitionMaintenance(settings.app_settings.orders_partitions_ahead, settings.app_settings.orders_partition_check)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
@@ -0,0 +1,78 @@
+# Себестоимость и котировки: стоимость рецепта каждого напитка считается заранее по ingredient.unit_cost
+# и лежит в плоских массивах по id_drink / id_ingredient, так что цена и себестоимость корзины - O(строк) без бд.
+# При смене меню пересчитываются только напитки с измененным рецептом или с ингредиентом, у которого сменилась цена.
+from array import array
+from decimal import Decimal
+from core.menu_cache import menu_cache
+from core.metrics import Counter
+from core.stock import SUGAR_ID, SUGAR_PER_SPOON
+
+recomputed_total = Counter("quote_drinks_recomputed_total", "Пересчеты себестоимости напитков после смены меню")
+
+
+def _fit(values: array, size: int):
+    # массив по id растет до max(id) + 1, новые ячейки нулевые
+    if len(values) < size:
+        values.extend([0.0] * (size - len(values)))
+
+
+class CostTable:
+    def __init__(self):
+        self.menu_version = -1
+        self.unit_cost = array("d")  # id_ingredient -> цена единицы
+        self.addon_cost = array("d")  # id_ingredient -> стоимость порции добавки
+        self.drink_cost = array("d")  # id_drink -> себестоимость рецепта
+        self.spoon_cost = 0.0
+        self.users: dict[int, tuple[int, ...]] = {}  # ингредиент -> напитки, в рецепт которых он входит
+        self._ingredients: dict[int, tuple[Decimal, int]] = {}  # (unit_cost, portion) прошлой версии меню
+        self._recipes: dict[int, tuple] = {}
+
+    async def get(self) -> "CostTable":
+        return self.of(await menu_cache.get())
+
+    def of(self, menu) -> "CostTable":
+        # таблица по тому же объекту меню, по которому проверяются id: без await между проверкой и line_cost
+        # перезагрузка меню не может подсунуть id, которого в массивах еще нет
+        if menu.version != self.menu_version:
+            self.refresh(menu)
+        return self
+
+    def refresh(self, menu):
+        ingredients = {i: (item.unit_cost, item.portion) for i, item in menu.ingredients.items()}
+        changed = {i for i in ingredients.keys() | self._ingredients.keys() if ingredients.get(i) != self._ingredients.get(i)}
+        _fit(self.unit_cost, max(ingredients, default=0) + 1)
+        _fit(self.addon_cost, len(self.unit_cost))
+        for i in changed:
+            unit_cost, portion = ingredients.get(i, (0, 0))
+            self.unit_cost[i] = float(unit_cost)
+            self.addon_cost[i] = float(unit_cost) * portion
+        self.spoon_cost = SUGAR_PER_SPOON * self.unit_cost[SUGAR_ID] if SUGAR_ID < len(self.unit_cost) else 0.0
+
+        drinks = {d for d in menu.drinks.keys() | self._recipes.keys() if menu.recipes.get(d) != self._recipes.get(d)}
+        if drinks:
+            users: dict[int, list[int]] = {}
+            for id_drink, recipe in menu.recipes.items():
+                for id_ingredient, _ in recipe:
+                    users.setdefault(id_ingredient, []).append(id_drink)
+            self.users = {i: tuple(ids) for i, ids in users.items()}
+        for i in changed:
+            drinks.update(self.users.get(i, ()))
+        _fit(self.drink_cost, max(menu.drinks, default=0) + 1)
+        for id_drink in drinks:
+            if id_drink < len(self.drink_cost):
+                self.drink_cost[id_drink] = sum(float(amount) * self.unit_cost[i] for i, amount in menu.recipes.get(id_drink, ()))
+        recomputed_total.inc(len(drinks))
+
+        self._ingredients = ingredients
+        self._recipes = dict(menu.recipes)
+        self.menu_version = menu.version
+
+    def line_cost(self, id_drink: int, quantity: int, sugar_amount: int, addons) -> float:
+        # ids проверены по меню, из которого массивы обновлены в of()
+        cost = self.drink_cost[id_drink] + sugar_amount * self.spoon_cost
+        for id_ingredient in addons:
+            cost += self.addon_cost[id_ingredient]
+        return cost * quantity
+
+
+cost_table = CostTable()
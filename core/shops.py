@@ -0,0 +1,149 @@
+# Точки продаж и шарды:
+#   python -m core.shops list
+#   python -m core.shops add 2 "Точка на Ленина"   # реестр на основном шарде + пустой склад точки в ее шарде
+#   python -m core.shops sync-menu                 # копия меню и реестра точек на дополнительные шарды
+# Шард точки записан в реестре (shops.shard): добавление шарда в DB_SHARD_URLS меняет (id_shop - 1) % число шардов,
+# и без записи существующие точки молча ушли бы в пустой шард. Воркер сверяет реестр с настройками при старте и не
+# запускается, пока такие точки не закреплены за своим шардом в DB_SHARD_MAP (или их данные не перенесены).
+# Меню правится только на основном шарде; на остальных лежит копия, на которую ссылаются внешние ключи склада и заказов
+# (и по которой триггер шарда считает выручку в sales_hourly). Воркеры сами копируют меню при старте и по уведомлению
+# menu_changed (menu_sync), команда sync-menu - для ручного запуска.
+# Удаленные из меню позиции sync-menu не удаляет: на них могут ссылаться заказы шарда.
+import asyncio
+import logging
+import sys
+from sqlalchemy import case, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from core.db import get_engine, shards
+from models.ModelBase import Shop, Ingredient, Drink, DrinkIngredient, Inventory
+
+logger = logging.getLogger(__name__)
+
+MENU = [Shop, Ingredient, Drink, DrinkIngredient]  # в порядке внешних ключей
+SYNC_LOCK_KEY = 72_10_2027  # pg_advisory_xact_lock на шарде: копии из нескольких воркеров идут по очереди
+
+
+def upsert(model, rows: list[dict]):
+    table = model.__table__
+    stmt = insert(table)
+    keys = [column.name for column in table.primary_key]
+    values = {column.name: stmt.excluded[column.name] for column in table.columns if column.name not in keys}
+    return stmt.on_conflict_do_update(index_elements=keys, set_=values).values(rows)
+
+
+async def sync_menu() -> dict[int, int]:
+    # меню читается уже под блокировкой шарда: копия, начатая позже, не перезапишет более новую старой
+    copied = {}
+    for shard in shards.shards[1:]:
+        async with shard.engine.begin() as conn:
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SYNC_LOCK_KEY})
+            async with get_engine().connect() as source:
+                tables = {model: [dict(row) for row in (await source.execute(select(model.__table__))).mappings()] for model in MENU}
+            for model in MENU:
+                if tables[model]:
+                    await conn.execute(upsert(model, tables[model]))
+        copied[shard.number] = sum(len(rows) for rows in tables.values())
+    return copied
+
+
+class ShardMapChanged(RuntimeError):
+    pass
+
+
+def _moved(rows) -> dict[int, tuple[int, int]]:
+    # точка -> (записанный шард, шард по настройкам) для точек, которые настройки отправили бы в другой шард
+    return {id_shop: (shard, shards.mapped(id_shop)) for id_shop, shard in rows if shard is not None and shard != shards.mapped(id_shop)}
+
+
+async def check_directory():
+    # точки без записанного шарда (реестр до версии 17) закрепляются за текущим
+    async with get_engine().begin() as conn:
+        rows = (await conn.execute(select(Shop.id_shop, Shop.shard))).all()
+        moved = _moved(rows)
+        if moved:
+            raise ShardMapChanged(
+                "Настройки шардов переносят точки с данными (точка: записанный шард -> по настройкам): "
+                + ", ".join(f"{id_shop}: {old} -> {new}" for id_shop, (old, new) in sorted(moved.items()))
+                + "; закрепите их в DB_SHARD_MAP"
+            )
+        unassigned = {id_shop: shards.mapped(id_shop) for id_shop, shard in rows if shard is None}
+        if unassigned:
+            await conn.execute(
+                update(Shop).where(Shop.id_shop.in_(unassigned), Shop.shard.is_(None))
+                .values(shard=case(unassigned, value=Shop.id_shop))
+            )
+
+
+class MenuSync:
+    # уведомления, пришедшие во время копии, схлопываются в одну следующую копию
+    def __init__(self):
+        self._task = None
+        self._again = False
+
+    def schedule(self, *_):
+        if len(shards.shards) < 2:
+            return
+        if self._task is not None and not self._task.done():
+            self._again = True
+            return
+        self._task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while True:
+            self._again = False
+            try:
+                await sync_menu()
+            except Exception:
+                logger.exception("Не удалось скопировать меню на шарды")
+            if not self._again:
+                return
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+
+menu_sync = MenuSync()
+
+
+async def add(id_shop: int, name_shop: str) -> int:
+    async with get_engine().begin() as conn:
+        shard = (await conn.execute(select(Shop.shard).where(Shop.id_shop == id_shop))).scalar_one_or_none()
+        if _moved([(id_shop, shard)]):
+            raise ShardMapChanged(f"Точка {id_shop} записана в шард {shard}, по настройкам - {shards.mapped(id_shop)}")
+        await conn.execute(upsert(Shop, [{"id_shop": id_shop, "name_shop": name_shop, "shard": shards.mapped(id_shop)}]))
+    await sync_menu()
+    # склад новой точки: строки по всем ингредиентам с нулевым остатком, поставки вносятся отдельно
+    shard = shards.shard(id_shop)
+    async with shard.engine.begin() as conn:
+        ids = (await conn.execute(select(Ingredient.id_ingredient))).scalars().all()
+        if ids:
+            await conn.execute(
+                insert(Inventory).values([{"id_shop": id_shop, "id_ingredient": i, "quantity": 0} for i in ids])
+                .on_conflict_do_nothing()
+            )
+    return shard.number
+
+
+async def main(args: list[str]):
+    command = args[0] if args else ""
+    try:
+        if command == "list":
+            async with get_engine().connect() as conn:
+                for id_shop, name_shop in await conn.execute(select(Shop.id_shop, Shop.name_shop).order_by(Shop.id_shop)):
+                    print(f"{id_shop}\t{name_shop}\tшард {shards.shard(id_shop).number}")
+        elif command == "add" and len(args) > 2 and args[1].isdigit():
+            number = await add(int(args[1]), args[2])
+            print(f"Точка {args[1]} добавлена, шард {number}")
+        elif command == "sync-menu":
+            for number, count in (await sync_menu()).items():
+                print(f"Шард {number}: скопировано строк меню: {count}")
+        else:
+            raise SystemExit('Использование: python -m core.shops list|add <id_shop> "<название>"|sync-menu')
+    finally:
+        await shards.dispose()
+        await get_engine().dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
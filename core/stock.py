@@ -0,0 +1,118 @@
+from decimal import Decimal
+from time import perf_counter
+from sqlalchemy import select, update, case
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.metrics import Gauge
+from models.ModelBase import Inventory
+
+SUGAR_ID = 6  # id сахара на складе
+SUGAR_PER_SPOON = 5  # по 5 г за ложку
+
+# счетчики резервирования для бенчмарков и метрик
+stats = {"reservations": 0, "rejected": 0, "lock_wait_seconds": 0.0}
+
+Gauge("stock_reservations_total", "Блокировки строк склада под заказы", lambda: stats["reservations"])
+Gauge("stock_rejected_total", "Заказы, отклоненные из-за нехватки на складе", lambda: stats["rejected"])
+Gauge("stock_lock_wait_seconds_total", "Суммарное время блокировки строк склада", lambda: stats["lock_wait_seconds"])
+
+
+class InsufficientStock(Exception):
+    def __init__(self, ingredient_ids: list[int]):
+        super().__init__(f"Недостаточно ингредиентов на складе: {ingredient_ids}")
+        self.ingredient_ids = ingredient_ids
+
+
+def consumption(recipe, ingredient, sugar_amount: int) -> dict[int, Decimal]:
+    # расход на один заказ: рецепт напитка + порция добавки + сахар, сгруппированные по ингредиенту
+    need: dict[int, Decimal] = {}
+    for id_ingredient, amount in recipe:
+        need[id_ingredient] = need.get(id_ingredient, 0) + Decimal(amount)
+    need[ingredient.id_ingredient] = need.get(ingredient.id_ingredient, 0) + Decimal(ingredient.portion)
+    if sugar_amount > 0:
+        need[SUGAR_ID] = need.get(SUGAR_ID, 0) + Decimal(sugar_amount * SUGAR_PER_SPOON)
+    return need
+
+
+def cart_consumption(recipes, ingredients, lines) -> dict[int, Decimal]:
+    # расход корзины: сначала сворачиваем строки в количества по напиткам, добавкам и сахару,
+    # затем рецепт каждого различного напитка умножается один раз - стоимость зависит от числа различных позиций, а не строк
+    drinks: dict[int, int] = {}
+    addons: dict[int, int] = {}
+    spoons = 0
+    for line in lines:
+        drinks[line.id_drink] = drinks.get(line.id_drink, 0) + line.quantity
+        for id_ingredient in line.addons:
+            addons[id_ingredient] = addons.get(id_ingredient, 0) + line.quantity
+        spoons += line.sugar_amount * line.quantity
+
+    need: dict[int, Decimal] = {}
+    for id_drink, quantity in drinks.items():
+        for id_ingredient, amount in recipes.get(id_drink, ()):
+            need[id_ingredient] = need.get(id_ingredient, 0) + Decimal(amount) * quantity
+    for id_ingredient, quantity in addons.items():
+        need[id_ingredient] = need.get(id_ingredient, 0) + Decimal(ingredients[id_ingredient].portion) * quantity
+    if spoons > 0:
+        need[SUGAR_ID] = need.get(SUGAR_ID, 0) + Decimal(spoons * SUGAR_PER_SPOON)
+    return need
+
+
+async def lock(session: AsyncSession, id_shop: int, ids) -> dict[int, Decimal]:
+    # блокируем строки склада в порядке id_ingredient: все транзакции берут блокировки в одном порядке, взаимных блокировок нет;
+    # у каждой точки свои строки, заказы разных точек друг друга не ждут
+    stmt = (
+        select(Inventory.id_ingredient, Inventory.quantity)
+        .where(Inventory.id_shop == id_shop, Inventory.id_ingredient.in_(ids))
+        .order_by(Inventory.id_ingredient)
+        .with_for_update()
+    )
+    start = perf_counter()
+    result = await session.execute(stmt)
+    available = dict(result.all())
+    stats["lock_wait_seconds"] += perf_counter() - start
+    stats["reservations"] += 1
+    return available
+
+
+async def reserve(session: AsyncSession, id_shop: int, need: dict[int, Decimal]) -> dict[int, Decimal]:
+    available = await lock(session, id_shop, need)
+
+    # проверка до любой записи: заказ, уводящий остаток в минус, отклоняется целиком
+    # ингредиенты без строки на складе не учитываются, как и раньше
+    low = [i for i, quantity in available.items() if quantity < need[i]]
+    if low:
+        stats["rejected"] += 1
+        raise InsufficientStock(low)
+    return {i: need[i] for i in available}
+
+
+def allocate(available: dict[int, Decimal], needs: list[dict[int, Decimal]]) -> tuple[list[bool], dict[int, Decimal]]:
+    # пакетное резервирование по порядку заказов: заказ принимается, если весь его расход помещается в остаток
+    remaining = dict(available)
+    accepted = []
+    total: dict[int, Decimal] = {}
+    for need in needs:
+        tracked = [i for i in need if i in remaining]
+        ok = all(remaining[i] >= need[i] for i in tracked)
+        if ok:
+            for i in tracked:
+                remaining[i] -= need[i]
+                total[i] = total.get(i, 0) + need[i]
+        else:
+            stats["rejected"] += 1
+        accepted.append(ok)
+    return accepted, total
+
+
+async def apply(session: AsyncSession, id_shop: int, reserved: dict[int, Decimal]) -> dict[int, Decimal]:
+    # списание зарезервированного одним UPDATE по уже заблокированным строкам, возвращает новые остатки
+    if not reserved:
+        return {}
+    stmt = (
+        update(Inventory)
+        .where(Inventory.id_shop == id_shop, Inventory.id_ingredient.in_(reserved))
+        .values(quantity=Inventory.quantity - case(reserved, value=Inventory.id_ingredient))
+        .returning(Inventory.id_ingredient, Inventory.quantity)
+        .execution_options(synchronize_session=False)
+    )
+    result = await session.execute(stmt)
+    return dict(result.all())
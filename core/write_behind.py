@@ -0,0 +1,330 @@
+# Отложенная запись заказов: заказ проверяется по резерву склада в памяти и подтверждается сразу,
+# а INSERT заказов делает фоновая задача пачками раз в flush_ms или по batch заказов.
+# Резерв воркер заранее списывает со склада в бд (stock_leases) сразу на lease_orders заказов вперед: остаток, который
+# видят другие воркеры и синхронный путь, уже не включает чужие неподтвержденные в бд заказы, и продать его дважды нельзя.
+# До записи в бд каждый заказ лежит в журнале (jsonl-сегменты в journal_dir, названные уникальным id процесса);
+# живой процесс держит flock на всех своих сегментах, сегменты завершившегося процесса доигрываются при старте другого,
+# и его неиспользованный резерв возвращается на склад.
+# Резерв ведется для точки по умолчанию: заказы остальных точек идут синхронным путем.
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from time import monotonic
+from sqlalchemy import case, delete, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from core import stock
+from core.config import settings
+from core.db import shards, DEFAULT_SHOP
+from models.ModelBase import Inventory, Order, StockLease
+
+logger = logging.getLogger(__name__)
+
+ORDER_FIELDS = ("id_order", "id_drink", "id_ingredient", "sugar_amount", "payment_status", "created_at")
+
+
+def _claim(paths: list[Path]) -> list | None:
+    # сегменты процесса забираются, только если ни один не под flock: живой процесс держит блокировку на каждом своем сегменте
+    journals = []
+    try:
+        for path in paths:
+            try:
+                journal = open(path, encoding="utf-8")
+            except FileNotFoundError:
+                continue  # сегмент записан в бд и удален
+            journals.append(journal)
+            fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        for journal in journals:
+            journal.close()
+        return None
+    claimed = []
+    for journal in journals:
+        if os.fstat(journal.fileno()).st_nlink:
+            claimed.append(journal)
+        else:
+            journal.close()  # удален владельцем между open и flock
+    return claimed
+
+
+class WriteBehind:
+    def __init__(self, journal_dir: str, flush_ms: int, batch: int, id_block: int, lease_orders: int):
+        self.journal_dir = Path(journal_dir)
+        self.flush_interval = flush_ms / 1000
+        self.batch = batch
+        self.id_block = id_block
+        self.lease_orders = lease_orders
+        self.owner = uuid.uuid4().hex  # не pid: pid после перезапуска может достаться другому процессу
+        self.lease: dict[int, Decimal] = {}  # резерв, уже списанный со склада в бд и еще не занятый заказами
+        self.tracked: set[int] = set()  # ингредиенты со строкой на складе точки, остальные не учитываются
+        self._tracked_stale = False
+        self.pending: list[dict] = []
+        self._ids: list[int] = []
+        self._clock: tuple[datetime, float] | None = None  # время бд и monotonic в момент его получения
+        self._segment = 0
+        self._unflushed: list[tuple[int, object]] = []  # сегменты с заказами, которые еще не удалось записать, под flock
+        self._journal = None
+        self._wake = asyncio.Event()
+        self._task = None
+        self._lock = asyncio.Lock()
+        self._ids_lock = asyncio.Lock()
+        self._lease_lock = asyncio.Lock()
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.journal_dir / f"{self.owner}.{segment}.jsonl"
+
+    def _open_segment(self):
+        # сегмент создается под временным именем и появляется в журнале уже под flock, существующий файл не дописывается
+        self._segment += 1
+        path = self._segment_path(self._segment)
+        tmp = path.with_suffix(".tmp")
+        journal = open(tmp, "x", encoding="utf-8")
+        fcntl.flock(journal, fcntl.LOCK_EX)
+        tmp.rename(path)
+        self._journal = journal
+
+    async def start(self):
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        await self.replay()
+        await self.load_stock()
+        self._open_segment()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # при остановке дописываем в бд все подтвержденные заказы и возвращаем остаток резерва на склад
+        if self._task:
+            self._task.cancel()
+        await self.flush()
+        await self.release()
+        if self._journal:
+            self._segment_path(self._segment).unlink(missing_ok=True)
+            self._journal.close()
+
+    async def load_stock(self):
+        self._tracked_stale = False
+        async with shards.sessionmaker(DEFAULT_SHOP)() as session:
+            result = await session.execute(select(Inventory.id_ingredient).where(Inventory.id_shop == DEFAULT_SHOP))
+            self.tracked = set(result.scalars().all())
+
+    def on_stock_changed(self, payload: str):
+        # появление и удаление строк склада; сами остатки резерв не меняют
+        data = json.loads(payload)
+        if data["id_shop"] != DEFAULT_SHOP:
+            return
+        if data["stock"] is None:
+            self._tracked_stale = True  # уведомление без строк: склад перечитывается перед следующим резервом
+            return
+        for key, quantity in data["stock"].items():
+            if quantity is None:
+                self.tracked.discard(int(key))
+            else:
+                self.tracked.add(int(key))
+
+    async def _next_id(self) -> int:
+        # id заказов берутся блоками из той же последовательности, что и у синхронного пути, вместе с временем бд
+        async with self._ids_lock:
+            if not self._ids:
+                async with shards.sessionmaker(DEFAULT_SHOP)() as session:
+                    result = await session.execute(
+                        text(
+                            "SELECT nextval(pg_get_serial_sequence('orders', 'id_order')), localtimestamp "
+                            "FROM generate_series(1, :n)"
+                        ),
+                        {"n": self.id_block},
+                    )
+                    rows = result.all()
+                self._ids = [row[0] for row in rows][::-1]
+                self._clock = (rows[0][1], monotonic())
+            return self._ids.pop()
+
+    def _now(self) -> datetime:
+        # created_at по часам бд, как server_default now() у синхронного пути, а не по часам и поясу сервера приложения
+        db_time, at = self._clock
+        return db_time + timedelta(seconds=monotonic() - at)
+
+    async def _reserve(self, need: dict[int, Decimal]):
+        # резерва не хватает: под блокировкой строк склада списываем сразу на lease_orders таких заказов вперед
+        # (или сколько осталось, но не меньше нужного этому заказу) и записываем резерв на себя
+        if self._tracked_stale:
+            await self.load_stock()
+        short = {i: need[i] - self.lease.get(i, 0) for i in need if i in self.tracked and self.lease.get(i, 0) < need[i]}
+        if not short:
+            return
+        async with shards.sessionmaker(DEFAULT_SHOP)() as session:
+            available = await stock.lock(session, DEFAULT_SHOP, short)
+            low = [i for i, quantity in available.items() if quantity < short[i]]
+            if low:
+                await session.rollback()
+                stock.stats["rejected"] += 1
+                raise stock.InsufficientStock(low)
+            take = {i: min(quantity, max(short[i], need[i] * self.lease_orders - self.lease.get(i, 0)))
+                    for i, quantity in available.items()}
+            await stock.apply(session, DEFAULT_SHOP, take)
+            stmt = insert(StockLease).values([
+                {"owner": self.owner, "id_shop": DEFAULT_SHOP, "id_ingredient": i, "quantity": quantity}
+                for i, quantity in take.items()
+            ])
+            await session.execute(stmt.on_conflict_do_update(
+                index_elements=["owner", "id_shop", "id_ingredient"],
+                set_={"quantity": StockLease.quantity + stmt.excluded.quantity},
+            ))
+            await session.commit()
+        for i in short.keys() - available.keys():
+            self.tracked.discard(i)  # строку склада удалили
+        for i, quantity in take.items():
+            self.lease[i] = self.lease.get(i, 0) + quantity
+
+    async def submit(self, id_drink: int, id_ingredient: int, sugar_amount: int, need: dict[int, Decimal]) -> dict:
+        async with self._lease_lock:
+            await self._reserve(need)
+            taken = {i: need[i] for i in need if i in self.lease}
+            for i, amount in taken.items():
+                self.lease[i] -= amount
+        try:
+            id_order = await self._next_id()
+        except Exception:
+            for i, amount in taken.items():
+                self.lease[i] += amount
+            raise
+
+        record = {
+            "id_order": id_order,
+            "id_drink": id_drink,
+            "id_ingredient": id_ingredient,
+            "sugar_amount": sugar_amount,
+            "payment_status": "paid",
+            "created_at": self._now(),
+            "need": need,
+        }
+        # запись в журнал до подтверждения: после падения процесса заказ будет доигран при старте другого
+        self._journal.write(json.dumps(record, default=str) + "\n")
+        self._journal.flush()
+        self.pending.append(record)
+        if len(self.pending) >= self.batch:
+            self._wake.set()
+        return record
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Не удалось записать пачку заказов, повтор через %.0f мс", self.flush_interval * 1000)
+
+    async def flush(self):
+        async with self._lock:
+            if not self.pending:
+                return
+            batch, self.pending = self.pending, []
+            # новый сегмент журнала: старые остаются открытыми под flock и удаляются только после коммита своей пачки
+            os.fsync(self._journal.fileno())
+            self._unflushed.append((self._segment, self._journal))
+            self._open_segment()
+            try:
+                await self.write(batch, self.owner)
+            except Exception:
+                self.pending[:0] = batch
+                raise
+            for segment, journal in self._unflushed:
+                self._segment_path(segment).unlink(missing_ok=True)
+                journal.close()
+            self._unflushed = []
+
+    @staticmethod
+    async def write(batch: list[dict], owner: str, release: bool = False):
+        # ON CONFLICT DO NOTHING: при доигрывании журнала уже записанные заказы пропускаются и повторно не списываются.
+        # Склад списан заранее в резерв владельца журнала, записанные заказы уменьшают резерв;
+        # release - владелец завершился: остаток его резерва возвращается на склад
+        async with shards.sessionmaker(DEFAULT_SHOP)() as session:
+            leased = {}
+            if release:
+                leased = dict((await session.execute(
+                    select(StockLease.id_ingredient, StockLease.quantity)
+                    .where(StockLease.owner == owner, StockLease.id_shop == DEFAULT_SHOP)
+                )).all())
+                # склад блокируется до INSERT, как у синхронного пути: сначала строки склада, потом агрегаты заказов
+                await stock.lock(session, DEFAULT_SHOP, leased.keys() | {i for record in batch for i in record["need"]})
+
+            consumed: dict[int, Decimal] = {}
+            if batch:
+                stmt = insert(Order).on_conflict_do_nothing(index_elements=["id_order", "created_at"]).returning(Order.id_order)
+                result = await session.execute(stmt, [{f: record[f] for f in ORDER_FIELDS} for record in batch])
+                inserted = set(result.scalars().all())
+                for record in batch:
+                    if record["id_order"] in inserted:
+                        for i, amount in record["need"].items():
+                            consumed[i] = consumed.get(i, 0) + amount
+
+            remaining = {}
+            if release:
+                await session.execute(delete(StockLease).where(StockLease.owner == owner))
+                # журналы без резерва (до stock_leases) списывают записанные заказы прямо со склада
+                delta = {i: consumed.get(i, 0) - leased.get(i, 0) for i in consumed.keys() | leased.keys()}
+                remaining = await stock.apply(session, DEFAULT_SHOP, {i: amount for i, amount in delta.items() if amount})
+            elif consumed:
+                await session.execute(
+                    update(StockLease)
+                    .where(StockLease.owner == owner, StockLease.id_shop == DEFAULT_SHOP, StockLease.id_ingredient.in_(consumed))
+                    .values(quantity=StockLease.quantity - case(consumed, value=StockLease.id_ingredient))
+                    .execution_options(synchronize_session=False)
+                )
+            await session.commit()
+
+        low = sorted(i for i, quantity in remaining.items() if quantity < 0)
+        if low:
+            logger.warning("Остаток ушел в минус после доигрывания журнала %s: %s", owner, low)
+
+    async def release(self):
+        # неиспользованный резерв - обратно на склад; все заказы к этому моменту уже записаны
+        async with self._lease_lock:
+            await self.write([], self.owner, release=True)
+            self.lease = {}
+
+    async def replay(self):
+        # журналы процессов, которые больше не работают: все сегменты владельца забираются под flock и дописываются в бд
+        owners: dict[str, list[Path]] = {}
+        for path in self.journal_dir.glob("*.jsonl"):
+            owner, segment, _ = path.name.split(".")
+            owners.setdefault(owner, []).append(path)
+        for owner, paths in owners.items():
+            journals = _claim(sorted(paths, key=lambda path: int(path.name.split(".")[1])))
+            if journals is None:
+                continue  # процесс жив или его журнал уже забрал другой воркер
+            try:
+                batch = []
+                for journal in journals:
+                    for line in journal.read().splitlines():
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            break  # недописанная последняя строка
+                        record["created_at"] = datetime.fromisoformat(record["created_at"])
+                        record["need"] = {int(i): Decimal(amount) for i, amount in record["need"].items()}
+                        batch.append(record)
+                await self.write(batch, owner, release=True)
+                if batch:
+                    logger.warning("Доиграно из журнала %s заказов: %d", owner, len(batch))
+                for journal in journals:
+                    Path(journal.name).unlink(missing_ok=True)
+            finally:
+                for journal in journals:
+                    journal.close()
+
+
+write_behind = WriteBehind(
+    journal_dir=settings.app_settings.write_behind_dir,
+    flush_ms=settings.app_settings.write_behind_flush_ms,
+    batch=settings.app_settings.write_behind_batch,
+    id_block=settings.app_settings.write_behind_id_block,
+    lease_orders=settings.app_settings.write_behind_lease_orders,
+)
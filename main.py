@@ -1,14 +1,37 @@
-import uvicorn
 from fastapi import FastAPI
-from core.app_lifecycle import lifespan
-from routers.rout import rout1
 
 
-app = FastAPI(lifespan=lifespan)
-app.include_router(rout1, prefix="/v1")
+def create_app() -> FastAPI:
+    # маршруты (а с ними модели, схемы и бд) регистрируются при сборке приложения, а не при импорте main;
+    # uvicorn main:create_app --factory собирает его уже в процессе воркера
+    from core.app_lifecycle import lifespan
+    from core.instrumentation import MetricsMiddleware
+    from core.compression import CompressionMiddleware
+    from core.admission import AdmissionMiddleware
+    from routers.rout import rout1
+    from api.MetricsApp import metricsrouter
+
+    app = FastAPI(lifespan=lifespan)
+    # последний добавленный - внешний: время сжатия входит в метрики запроса
+    app.add_middleware(CompressionMiddleware)
+    # допуск до сжатия и обработки: отказ 429/503 ничего не стоит, но попадает в метрики запросов
+    app.add_middleware(AdmissionMiddleware)
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(rout1, prefix="/v1")
+    app.include_router(metricsrouter)
+    return app
+
+
+def __getattr__(name: str):
+    # uvicorn main:app и from main import app по-прежнему работают: приложение собирается при первом обращении
+    if name == "app":
+        app = globals()["app"] = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run("main:app", host="127.0.0.1", port=8001, reload=True)
     #добавить routes
-
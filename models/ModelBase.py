@@ -1,13 +1,24 @@
 from typing import Optional
-from sqlalchemy import String, Numeric, ForeignKey, Integer, DateTime, TIMESTAMP, func
+from sqlalchemy import String, Numeric, ForeignKey, Integer, BigInteger, DateTime, TIMESTAMP, Index, func, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from models.Base import Base
 
 
+class Shop(Base):
+    # точка продаж: ее склад, заказы, корзины и агрегаты целиком лежат в одном шарде (ShardSet в core/db.py)
+    __tablename__ = 'shops'
+
+    id_shop: Mapped[int] = mapped_column(primary_key=True)
+    name_shop: Mapped[str] = mapped_column(String(100), nullable=False)
+    shard: Mapped[Optional[int]] = mapped_column(Integer)  # шард с данными точки; None - еще не записан (до версии 17)
+
+
 class Drink(Base):
     __tablename__ = 'drink'
 
     id_drink: Mapped[int] = mapped_column(primary_key=True)
+    id_shop: Mapped[Optional[int]] = mapped_column(ForeignKey('shops.id_shop', ondelete='CASCADE'))  # None - во всех точках
     name_drink: Mapped[str] = mapped_column(String(100), nullable=False)
     price: Mapped[float] = mapped_column(Numeric(7, 2), nullable=False)
 
@@ -17,19 +28,30 @@ class Drink(Base):
 
 class Ingredient(Base):
     __tablename__ = 'ingredient'
+    __table_args__ = (
+        # частичный покрывающий индекс видимых ингредиентов: выборка для витрины без чтения таблицы
+        Index('ix_ingredient_visible_name', 'name_ingredient', postgresql_where=text('is_visible'),
+              postgresql_include=['id_ingredient', 'unit', 'portion']),
+    )
 
     id_ingredient: Mapped[int] = mapped_column(primary_key=True)
     name_ingredient: Mapped[str] = mapped_column(String(100), nullable=False)
     unit: Mapped[str] = mapped_column(String(10), nullable=False)
     is_visible: Mapped[bool] = mapped_column(default=True)
     portion: Mapped[int] = mapped_column(nullable=False)
+    # закупочная цена единицы (г, мл, шт): из нее считается себестоимость напитков (core/quotes.py)
+    unit_cost: Mapped[float] = mapped_column(Numeric(10, 4), nullable=False, server_default=text('0'))
     drinks: Mapped[list['DrinkIngredient']] = relationship(back_populates='ingredient')
-    inventory: Mapped[Optional['Inventory']] = relationship(back_populates='ingredient')
+    inventory: Mapped[list['Inventory']] = relationship(back_populates='ingredient')
     orders: Mapped[list['Order']] = relationship(back_populates='ingredient')
 
 
 class DrinkIngredient(Base):
     __tablename__ = 'drink_ingredient'
+    __table_args__ = (
+        # первичный ключ начинается с id_drink: для поиска напитков по ингредиенту нужен свой индекс
+        Index('ix_drink_ingredient_id_ingredient', 'id_ingredient', postgresql_include=['id_drink', 'amount']),
+    )
 
     id_drink: Mapped[int] = mapped_column(ForeignKey('drink.id_drink', ondelete='CASCADE'), primary_key=True)
     id_ingredient: Mapped[int] = mapped_column(ForeignKey('ingredient.id_ingredient'), primary_key=True)
@@ -42,6 +64,9 @@ class DrinkIngredient(Base):
 class Inventory(Base):
     __tablename__ = 'inventory'
 
+    # строки склада своей точки: блокировки под заказы не пересекаются между точками
+    id_shop: Mapped[int] = mapped_column(ForeignKey('shops.id_shop'), primary_key=True,
+                                         server_default=text('1'))
     id_ingredient: Mapped[int] = mapped_column(ForeignKey('ingredient.id_ingredient', ondelete='CASCADE'),
                                                primary_key=True)
     quantity: Mapped[float] = mapped_column(Numeric(10, 2), nullable=False)
@@ -49,16 +74,147 @@ class Inventory(Base):
     ingredient: Mapped['Ingredient'] = relationship(back_populates='inventory')
 
 
+class StockLease(Base):
+    # резерв воркера write-behind: остаток, уже списанный со склада под заказы, которые воркер подтверждает из памяти
+    __tablename__ = 'stock_leases'
+
+    owner: Mapped[str] = mapped_column(String(32), primary_key=True)  # id процесса, им же названы сегменты его журнала
+    id_shop: Mapped[int] = mapped_column(ForeignKey('shops.id_shop'), primary_key=True)
+    id_ingredient: Mapped[int] = mapped_column(ForeignKey('ingredient.id_ingredient', ondelete='CASCADE'),
+                                               primary_key=True)
+    quantity: Mapped[float] = mapped_column(Numeric(10, 2), nullable=False)
+
+
+class ShopEvents(Base):
+    # последний номер события точки для id событий push-канала и версия ее заказов; увеличивают триггеры уведомлений
+    __tablename__ = 'shop_events'
+
+    id_shop: Mapped[int] = mapped_column(ForeignKey('shops.id_shop', ondelete='CASCADE'), primary_key=True)
+    seq: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    orders: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default=text('0'))  # версия заказов точки
+
+
 class Order(Base):
     __tablename__ = 'orders'
-
-    id_order: Mapped[int] = mapped_column(primary_key=True)
+    __table_args__ = (
+        # keyset-пагинация (created_at, id_order) и фильтры списка заказов внутри точки;
+        # последние заказы читаются index-only scan: индекс покрывает все колонки списка
+        Index('ix_orders_id_shop_created_at_id_order', 'id_shop', 'created_at', 'id_order',
+              postgresql_include=['id_drink', 'id_ingredient', 'payment_status']),
+        Index('ix_orders_id_shop_id_drink_created_at', 'id_shop', 'id_drink', 'created_at'),
+        Index('ix_orders_id_shop_id_ingredient_created_at', 'id_shop', 'id_ingredient', 'created_at'),
+        Index('ix_orders_id_shop_payment_status_created_at', 'id_shop', 'payment_status', 'created_at'),
+        # помесячные секции по created_at (core/partitions.py): чтения с границами дат затрагивают только свои месяцы
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+
+    # ключ секционированной таблицы обязан включать created_at
+    id_order: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    id_shop: Mapped[int] = mapped_column(ForeignKey('shops.id_shop'), nullable=False, server_default=text('1'))
     id_drink: Mapped[int] = mapped_column(ForeignKey('drink.id_drink'), nullable=False)
     id_ingredient: Mapped[int] = mapped_column(ForeignKey('ingredient.id_ingredient'), nullable=False)
     sugar_amount: Mapped[int] = mapped_column(Integer, nullable=False)
     payment_status: Mapped[str] = mapped_column(String(10), nullable=False)
     #created_at: Mapped[DateTime] = mapped_column(DateTime , server_default='now()')
-    created_at: Mapped[DateTime] = mapped_column(TIMESTAMP , server_default=func.now())
+    created_at: Mapped[DateTime] = mapped_column(TIMESTAMP , primary_key=True, server_default=func.now())
 
     drink: Mapped['Drink'] = relationship(back_populates='orders')
-    ingredient: Mapped['Ingredient'] = relationship(back_populates='orders')
\ No newline at end of file
+    ingredient: Mapped['Ingredient'] = relationship(back_populates='orders')
+
+
+class CartOrder(Base):
+    # заказ-корзина: несколько напитков, у каждого свои добавки
+    __tablename__ = 'cart_orders'
+    __table_args__ = (
+        Index('ix_cart_orders_id_shop_created_at', 'id_shop', 'created_at'),
+    )
+
+    id_cart: Mapped[int] = mapped_column(primary_key=True)
+    id_shop: Mapped[int] = mapped_column(ForeignKey('shops.id_shop'), nullable=False, server_default=text('1'))
+    payment_status: Mapped[str] = mapped_column(String(10), nullable=False)
+    total: Mapped[float] = mapped_column(Numeric(10, 2), nullable=False)
+    cost: Mapped[Optional[float]] = mapped_column(Numeric(10, 2))  # себестоимость на момент заказа, None у старых корзин
+    created_at: Mapped[DateTime] = mapped_column(TIMESTAMP, server_default=func.now())
+
+    lines: Mapped[list['CartLine']] = relationship(back_populates='cart')
+
+
+class CartLine(Base):
+    __tablename__ = 'cart_lines'
+    __table_args__ = (
+        Index('ix_cart_lines_id_cart', 'id_cart'),
+        Index('ix_cart_lines_id_drink', 'id_drink'),  # проверка внешнего ключа при удалении напитка
+    )
+
+    id_line: Mapped[int] = mapped_column(primary_key=True)
+    id_cart: Mapped[int] = mapped_column(ForeignKey('cart_orders.id_cart', ondelete='CASCADE'), nullable=False)
+    id_drink: Mapped[int] = mapped_column(ForeignKey('drink.id_drink'), nullable=False)
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    sugar_amount: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    cart: Mapped['CartOrder'] = relationship(back_populates='lines')
+    addons: Mapped[list['CartLineAddon']] = relationship(back_populates='line')
+
+
+class CartLineAddon(Base):
+    __tablename__ = 'cart_line_addons'
+    __table_args__ = (
+        Index('ix_cart_line_addons_id_ingredient', 'id_ingredient'),
+    )
+
+    id_line: Mapped[int] = mapped_column(ForeignKey('cart_lines.id_line', ondelete='CASCADE'), primary_key=True)
+    id_ingredient: Mapped[int] = mapped_column(ForeignKey('ingredient.id_ingredient'), primary_key=True)
+
+    line: Mapped['CartLine'] = relationship(back_populates='addons')
+
+class SalesHourly(Base):
+    # почасовые агрегаты продаж одиночных заказов, заполняются триггером на orders (core/migration_ddl.py)
+    __tablename__ = 'sales_hourly'
+    __table_args__ = (
+        Index('ix_sales_hourly_id_shop_id_drink_bucket', 'id_shop', 'id_drink', 'bucket'),  # динамика продаж одного напитка
+    )
+
+    bucket: Mapped[DateTime] = mapped_column(TIMESTAMP, primary_key=True)
+    id_shop: Mapped[int] = mapped_column(ForeignKey('shops.id_shop'), primary_key=True, server_default=text('1'))
+    id_drink: Mapped[int] = mapped_column(ForeignKey('drink.id_drink'), primary_key=True)
+    id_ingredient: Mapped[int] = mapped_column(ForeignKey('ingredient.id_ingredient'), primary_key=True)
+    orders: Mapped[int] = mapped_column(Integer, nullable=False)
+    sugar_amount: Mapped[int] = mapped_column(Integer, nullable=False)
+    revenue: Mapped[float] = mapped_column(Numeric(14, 2), nullable=False)
+
+
+class CartSalesHourly(Base):
+    # почасовые продажи напитков из корзин, триггер на cart_lines; quantity - число напитков, а не строк
+    __tablename__ = 'cart_sales_hourly'
+
+    bucket: Mapped[DateTime] = mapped_column(TIMESTAMP, primary_key=True)
+    id_shop: Mapped[int] = mapped_column(ForeignKey('shops.id_shop'), primary_key=True, server_default=text('1'))
+    id_drink: Mapped[int] = mapped_column(ForeignKey('drink.id_drink'), primary_key=True)
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    sugar_amount: Mapped[int] = mapped_column(Integer, nullable=False)
+    revenue: Mapped[float] = mapped_column(Numeric(14, 2), nullable=False)
+
+
+class CartAddonsHourly(Base):
+    # почасовые продажи добавок из корзин, триггер на cart_line_addons
+    __tablename__ = 'cart_addons_hourly'
+
+    bucket: Mapped[DateTime] = mapped_column(TIMESTAMP, primary_key=True)
+    id_shop: Mapped[int] = mapped_column(ForeignKey('shops.id_shop'), primary_key=True, server_default=text('1'))
+    id_ingredient: Mapped[int] = mapped_column(ForeignKey('ingredient.id_ingredient'), primary_key=True)
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    revenue: Mapped[float] = mapped_column(Numeric(14, 2), nullable=False)
+
+
+class IdempotencyKey(Base):
+    # ответы на POST /Orders по ключу Idempotency-Key внутри точки: повтор запроса возвращает сохраненный ответ
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        Index('ix_idempotency_keys_created_at', 'created_at'),
+    )
+
+    id_shop: Mapped[int] = mapped_column(ForeignKey('shops.id_shop'), primary_key=True, server_default=text('1'))
+    key: Mapped[str] = mapped_column(String(100), primary_key=True)
+    request_hash: Mapped[Optional[str]] = mapped_column(String(64))  # тело первого запроса; у ключей до версии 15 нет
+    response: Mapped[Optional[dict]] = mapped_column(JSONB)
+    created_at: Mapped[DateTime] = mapped_column(TIMESTAMP, server_default=func.now(), nullable=False)
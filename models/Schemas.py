@@ -23,12 +23,88 @@ class OrderGetSchema(BaseModel):
     ingredient: IngredientGetSchema
 
 
+class OrderCreatedSchema(OrderGetSchema):
+    # ответ на создание заказа; в списке заказов себестоимости нет
+    cost: float | None = None  # себестоимость: рецепт, добавка и сахар
+
+
+class OrderRowSchema(BaseModel):
+    id_order: int
+    id_drink: int
+    id_ingredient: int
+    payment_status: str
+    created_at: datetime
+
+
+class OrdersNormalizedSchema(BaseModel):
+    # ?normalized=true: напитки и добавки один раз по id, а не в каждой строке
+    items: list[OrderRowSchema]
+    drinks: dict[int, DrinkGetSchema]
+    ingredients: dict[int, IngredientGetSchema]
+
+
 class OrderPostSchema(BaseModel):
     id_drink: int
     sugar_amount: int = Field(..., ge=0, le=5)
     id_ingredient: int
 
 
+class OrderBatchItemSchema(BaseModel):
+    index: int  # позиция заказа в присланном пакете
+    id_order: int | None = None
+    created_at: datetime | None = None
+    detail: str | None = None  # причина отказа, если заказ не создан
+
+
+class OrderBatchResultSchema(BaseModel):
+    created: int
+    failed: int
+    items: list[OrderBatchItemSchema]
+
+
+class CartLinePostSchema(BaseModel):
+    id_drink: int
+    quantity: int = Field(1, ge=1, le=20)
+    sugar_amount: int = Field(0, ge=0, le=5)  # ложек на каждый напиток строки
+    addons: list[int] = Field(default_factory=list, max_length=5)
+
+
+class CartPostSchema(BaseModel):
+    lines: list[CartLinePostSchema] = Field(..., min_length=1)
+
+
+class CartLineGetSchema(BaseModel):
+    id_line: int
+    id_drink: int
+    quantity: int
+    sugar_amount: int
+    drink: DrinkGetSchema
+    addons: list[IngredientGetSchema]
+
+
+class CartGetSchema(BaseModel):
+    id_cart: int
+    payment_status: str
+    total: float
+    cost: float | None = None  # себестоимость на момент заказа
+    created_at: datetime
+    lines: list[CartLineGetSchema]
+
+
+class QuoteLineSchema(BaseModel):
+    id_drink: int
+    quantity: int
+    price: float  # цена напитка * количество
+    cost: float  # себестоимость строки: рецепт, добавки и сахар
+
+
+class QuoteSchema(BaseModel):
+    lines: list[QuoteLineSchema]
+    total: float
+    cost: float
+    margin: float
+
+
 class IngredientDrinkGetSchema(
     BaseModel):
     id_ingredient: int
@@ -36,6 +112,36 @@ class IngredientDrinkGetSchema(
     drink: DrinkGetSchema
     ingredient: IngredientGetSchema
 
+
+class RecipeRowSchema(BaseModel):
+    id_drink: int
+    id_ingredient: int
+
+
+class RecipesNormalizedSchema(BaseModel):
+    items: list[RecipeRowSchema]
+    drinks: dict[int, DrinkGetSchema]
+    ingredients: dict[int, IngredientGetSchema]
+
+class MakeableDrinkSchema(BaseModel):
+    id_drink: int
+    name_drink: str
+    makeable: int | None  # None: в рецепте нет ингредиентов, учитываемых на складе
+    limiting_ingredient: int | None
+
+
+class LowStockSchema(BaseModel):
+    id_ingredient: int
+    name_ingredient: str
+    quantity: float
+    threshold: float
+
+
+class MakeableSchema(BaseModel):
+    drinks: list[MakeableDrinkSchema]
+    low_stock: list[LowStockSchema]
+
+
 class InventoryGetSchema(
     BaseModel):
     id_ingredient: int
@@ -45,3 +151,41 @@ class InventoryGetSchema(
     class Config:
         from_attributes = True  # считать поля из их атрибутов при передаче орм объектов
 
+
+class InventoryRowSchema(BaseModel):
+    id_ingredient: int
+    quantity: float
+
+
+class InventoryNormalizedSchema(BaseModel):
+    items: list[InventoryRowSchema]
+    ingredients: dict[int, IngredientGetSchema]
+
+
+class DrinkSalesSchema(BaseModel):
+    id_drink: int
+    name_drink: str
+    orders: int
+    revenue: float
+
+    class Config:
+        from_attributes = True
+
+
+class AddonSalesSchema(BaseModel):
+    id_ingredient: int
+    name_ingredient: str
+    orders: int
+    revenue: float  # выручка заказов с этой добавкой
+
+    class Config:
+        from_attributes = True
+
+
+class SalesPeriodSchema(BaseModel):
+    bucket: datetime
+    orders: int
+    revenue: float
+
+    class Config:
+        from_attributes = True
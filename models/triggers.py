@@ -0,0 +1,6 @@
+# Каналы уведомлений триггеров: изменения меню и склада рассылаются через pg_notify, чтобы воркеры обновляли свои кэши,
+# новые заказы вместе с корзинами - в push-канал /Coffe/Events и в почасовые агрегаты продаж (core/analytics.py).
+# Сами триггеры ставятся миграциями, их DDL по версиям - в core/migration_ddl.py.
+MENU_CHANNEL = "menu_changed"
+STOCK_CHANNEL = "stock_changed"
+ORDERS_CHANNEL = "order_created"
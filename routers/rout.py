@@ -1,5 +1,13 @@
 from fastapi import  APIRouter
 from api.GetPostApp import myrouter
+from api.AnalyticsApp import analyticsrouter
+from api.EventsApp import eventsrouter
 
 rout1 = APIRouter()
 rout1.include_router(myrouter, prefix="/Coffe")
+rout1.include_router(analyticsrouter, prefix="/Coffe/Analytics")
+rout1.include_router(eventsrouter, prefix="/Coffe/Events")
+# те же маршруты для конкретной точки; без префикса /Shops работает точка по умолчанию
+rout1.include_router(myrouter, prefix="/Shops/{id_shop}/Coffe")
+rout1.include_router(analyticsrouter, prefix="/Shops/{id_shop}/Coffe/Analytics")
+rout1.include_router(eventsrouter, prefix="/Shops/{id_shop}/Coffe/Events")
@@ -0,0 +1,166 @@
+import asyncio
+import pytest
+from core import admission
+from core.admission import Limiter, Overloaded, RateLimiter, classify, in_memory
+
+SHARES = {"orders": 0.8, "write": 0.5, "read": 0.75, "reporting": 0.25}
+BUDGETS = {"orders": 0.2, "write": 0.2, "read": 0.2, "reporting": 0.2}
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_classify():
+    assert classify("POST", "/v1/Coffe/Orders") == ("orders", 1)
+    assert classify("POST", "/v1/Shops/2/Coffe/Carts") == ("orders", 2)
+    assert classify("GET", "/v1/Coffe/Orders") == ("reporting", 1)
+    assert classify("GET", "/v1/Shops/3/Coffe/Analytics/sales") == ("reporting", 3)
+    assert classify("GET", "/v1/Coffe/Inventory") == ("read", 1)
+    assert classify("POST", "/v1/Coffe/Quote") == ("read", 1)
+    assert classify("POST", "/v1/Coffe/setup") == ("write", 1)
+    assert classify("GET", "/v1/Coffe/Events/stream")[0] is None
+    assert classify("GET", "/metrics")[0] is None
+
+
+def test_in_memory():
+    assert in_memory("GET", "/v1/Coffe/Drinks")
+    assert in_memory("GET", "/v1/Shops/2/Coffe/Inventory/makeable")
+    assert in_memory("POST", "/v1/Coffe/Quote")
+    assert not in_memory("GET", "/v1/Coffe/Inventory")
+    assert not in_memory("POST", "/v1/Coffe/Drinks")
+    assert not in_memory("GET", "/v1/Coffe/Analytics/Drinks")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission, "monotonic", clock)
+    return clock
+
+
+def test_rate_limiter_burst_and_refill(clock):
+    rates = RateLimiter({"orders": 2.0}, burst=2.0, max_clients=10)
+    for _ in range(4):
+        rates.check("pos-1", "orders")
+    with pytest.raises(Overloaded) as error:
+        rates.check("pos-1", "orders")
+    assert error.value.status == 429
+    assert error.value.retry_after == pytest.approx(0.5)
+    rates.check("pos-2", "orders")  # у другого клиента свой бакет
+    clock.now += 0.5
+    rates.check("pos-1", "orders")
+
+
+def test_rate_limiter_unlimited_class_and_eviction(clock):
+    rates = RateLimiter({"orders": 1.0}, burst=1.0, max_clients=2)
+    for _ in range(100):
+        rates.check("pos-1", "read")  # у класса нет лимита
+    rates.check("a", "orders")
+    rates.check("b", "orders")
+    rates.check("c", "orders")  # вытесняет бакет "a"
+    rates.check("a", "orders")  # заново полный бакет
+    with pytest.raises(Overloaded):
+        rates.check("c", "orders")
+
+
+def test_limiter_share_caps():
+    limiter = Limiter(10, SHARES, BUDGETS)
+    assert limiter.limits == {"orders": 8, "write": 5, "read": 7, "reporting": 2}
+
+    async def scenario():
+        for _ in range(2):
+            await limiter.acquire("reporting")
+        with pytest.raises(Overloaded) as error:
+            await limiter.acquire("reporting")  # доля исчерпана, ждет до таймаута
+        assert error.value.reason == "timeout"
+        assert limiter.in_use == 2 and limiter.queued == 0
+
+    run(scenario())
+
+
+def test_limiter_capped_waiter_does_not_block_other_classes():
+    # 8 заказов в работе (вся доля orders) и один ожидающий заказ: чтение берет один из двух свободных слотов сразу
+    limiter = Limiter(10, SHARES, BUDGETS)
+
+    async def scenario():
+        for _ in range(8):
+            await limiter.acquire("orders")
+        waiting = asyncio.create_task(limiter.acquire("orders"))
+        await asyncio.sleep(0)
+        assert limiter.queued == 1
+        await asyncio.wait_for(limiter.acquire("read"), 0.01)
+        await asyncio.wait_for(limiter.acquire("read"), 0.01)
+        assert limiter.in_use == 10
+        limiter.release("orders", 0.01)
+        await waiting
+        assert limiter.by_class == {"orders": 8, "write": 0, "read": 2, "reporting": 0}
+
+    run(scenario())
+
+
+def test_limiter_wakes_by_priority():
+    limiter = Limiter(1, {c: 1.0 for c in SHARES}, {c: 1.0 for c in SHARES})
+    woken = []
+
+    async def wait(request_class):
+        await limiter.acquire(request_class)
+        woken.append(request_class)
+
+    async def scenario():
+        await limiter.acquire("write")
+        tasks = [asyncio.create_task(wait(c)) for c in ("reporting", "read", "orders")]
+        await asyncio.sleep(0)
+        assert limiter.queued == 3
+        limiter.release("write", 0.01)
+        for _ in range(3):
+            await asyncio.sleep(0)
+            limiter.release(woken[-1], 0.01)
+        await asyncio.gather(*tasks)
+        assert woken == ["orders", "read", "reporting"]
+        assert limiter.in_use == 0
+
+    run(scenario())
+
+
+def test_limiter_rejects_when_estimate_exceeds_budget():
+    limiter = Limiter(1, SHARES, {"orders": 0.05})
+    limiter.service["orders"] = 0.03
+
+    async def scenario():
+        await limiter.acquire("orders")
+        first = asyncio.create_task(limiter.acquire("orders"))  # оценка 0.03 с - в бюджете
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as error:
+            await limiter.acquire("orders")  # второй в очереди: 0.06 с больше бюджета
+        assert error.value.status == 503 and error.value.reason == "queue_full"
+        limiter.release("orders", 0.03)
+        await first
+        assert limiter.in_use == 1 and limiter.queued == 0
+
+    run(scenario())
+
+
+def test_limiter_cancelled_waiter_leaves_queue():
+    limiter = Limiter(1, SHARES, {"read": 1.0})
+
+    async def scenario():
+        await limiter.acquire("read")
+        waiting = asyncio.create_task(limiter.acquire("read"))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert limiter.queued == 0
+        limiter.release("read", 0.01)
+        assert limiter.in_use == 0
+
+    run(scenario())
@@ -0,0 +1,64 @@
+import asyncio
+from datetime import datetime
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects import postgresql
+from api.AnalyticsApp import analyticsrouter
+from core import analytics
+from core.get_db import current_shop, get_shop_read_db
+
+
+class Session:
+    async def execute(self, statement):
+        self.sql = str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+        return self
+
+    def all(self):
+        return []
+
+
+def compiled(query, *args) -> str:
+    session = Session()
+    asyncio.run(query(session, *args))
+    return " ".join(session.sql.split())
+
+
+def test_drinks_summary_reads_hourly_rollups_of_orders_and_carts():
+    sql = compiled(analytics.drinks_summary, 2, datetime(2025, 3, 1, 10, 30), datetime(2025, 3, 2))
+    assert "FROM sales_hourly" in sql and "FROM cart_sales_hourly" in sql and "UNION ALL" in sql
+    assert "FROM orders" not in sql and "FROM cart_lines" not in sql
+    # границы до часа, фильтр точки в обеих частях
+    assert sql.count("sales_hourly.bucket >= date_trunc('hour', '2025-03-01 10:30:00')") == 2
+    assert sql.count("sales_hourly.id_shop = 2") == 2
+
+
+def test_addons_summary_without_range():
+    sql = compiled(analytics.addons_summary, 1)
+    assert "FROM sales_hourly" in sql and "FROM cart_addons_hourly" in sql
+    assert "bucket >=" not in sql and "bucket <" not in sql
+    assert "JOIN ingredient" in sql
+
+
+def test_timeline_filters_drink_in_both_sources():
+    sql = compiled(analytics.timeline, 1, "day", None, None, 7)
+    assert "date_trunc('day'" in sql
+    assert "sales_hourly.id_drink = 7" in sql and "cart_sales_hourly.id_drink = 7" in sql
+
+
+def test_timeline_bucket_validated(monkeypatch):
+    calls = []
+
+    async def timeline(session, id_shop, bucket, date_from, date_to, id_drink):
+        calls.append((id_shop, bucket, id_drink))
+        return [{"bucket": datetime(2025, 3, 1), "orders": 3, "revenue": 450}]
+
+    app = FastAPI()
+    app.include_router(analyticsrouter, prefix="/Analytics")
+    app.dependency_overrides[current_shop] = lambda: 1
+    app.dependency_overrides[get_shop_read_db] = lambda: None
+    monkeypatch.setattr(analytics, "timeline", timeline)
+    client = TestClient(app)
+    assert client.get("/Analytics/timeline", params={"bucket": "week"}).status_code == 422
+    response = client.get("/Analytics/timeline", params={"bucket": "day", "id_drink": 2})
+    assert response.json() == [{"bucket": "2025-03-01T00:00:00", "orders": 3, "revenue": 450.0}]
+    assert calls == [(1, "day", 2)]
@@ -0,0 +1,65 @@
+import asyncio
+import random
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from bench import common, run, seed
+from bench.common import compare, percentile, save_baseline, summarize
+from core.stock import SUGAR_ID
+
+
+def test_percentiles_and_summary():
+    assert percentile([], 0.5) == 0.0
+    assert percentile([1.0, 2.0, 3.0, 4.0], 0.5) == 3.0
+    assert percentile([1.0, 2.0], 0.99) == 2.0
+    result = summarize([0.003, 0.001, 0.002, 0.004], errors=1, elapsed=2.0)
+    assert result["requests"] == 4 and result["errors"] == 1 and result["rps"] == 2.0
+    assert result["p50_ms"] == pytest.approx(3.0) and result["p99_ms"] == pytest.approx(4.0)
+    assert summarize([], 0, 0)["rps"] == 0.0
+
+
+def test_compare_with_baseline(monkeypatch, tmp_path):
+    monkeypatch.setattr(common, "BASELINES", tmp_path / "baselines")
+    save_baseline("local", {"GET /Orders": {"p95_ms": 10.0, "rps": 1000.0}})
+    same = {"GET /Orders": {"p95_ms": 10.5, "rps": 950.0}, "GET /Drinks": {"p95_ms": 99.0, "rps": 1.0}}
+    assert compare("local", same, tolerance=0.10) == []  # в пределах допуска; эндпоинта нет в базовой линии
+    slower = {"GET /Orders": {"p95_ms": 12.0, "rps": 800.0}}
+    assert compare("local", slower, tolerance=0.10) == [
+        "GET /Orders: p95 10.00 -> 12.00 мс", "GET /Orders: rps 1000.0 -> 800.0"
+    ]
+
+
+def test_drive_counts_requests_and_errors():
+    class Client:
+        def __init__(self):
+            self.calls = []
+
+        async def request(self, method, path, json=None):
+            self.calls.append((method, path, json))
+            status = 409 if len(self.calls) % 5 == 0 else 201
+            await asyncio.sleep(0)
+            return SimpleNamespace(status_code=status)
+
+    client = Client()
+    latencies, errors, elapsed = asyncio.run(run.drive(client, "POST /Orders", requests=20, concurrency=4, seed=1))
+    assert len(latencies) == 20 and errors == 4 and elapsed >= 0
+    assert all(path == "/v1/Coffe/Orders" for _, path, _ in client.calls)
+    assert all(1 <= body["id_drink"] <= seed.DRINKS and 0 <= body["sugar_amount"] <= 3 for _, _, body in client.calls)
+
+
+def test_seed_is_reproducible():
+    drinks, ingredients, recipes, inventory = seed.menu(random.Random(42))
+    assert seed.menu(random.Random(42))[2] == recipes
+    assert len(drinks) == seed.DRINKS and len(ingredients) == seed.INGREDIENTS == len(inventory)
+    assert ingredients[SUGAR_ID - 1][1:3] == ("Сахар", "г")
+    assert all(id_ingredient != SUGAR_ID for _, id_ingredient, _ in recipes)  # сахар добавляется отдельно, не по рецепту
+    for id_drink in range(1, seed.DRINKS + 1):
+        assert 2 <= sum(1 for d, _, _ in recipes if d == id_drink) <= 5
+
+
+def test_orders_chunk_within_period():
+    since = datetime(2025, 1, 1)
+    rows = list(seed.orders_chunk(random.Random(1), 101, 50, since, span=86400))
+    assert [row[0] for row in rows] == list(range(101, 151))
+    assert all(1 <= row[1] <= seed.DRINKS and row[4] == "paid" for row in rows)
+    assert all(since <= row[5] < datetime(2025, 1, 2) for row in rows)
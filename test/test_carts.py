@@ -0,0 +1,180 @@
+import asyncio
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException
+from api import GetPostApp
+from api.GetPostApp import check_cart, create_cart, get_cart
+from core import stock
+from core.config import settings
+from core.menu_cache import MenuDrink, MenuIngredient, menu_cache
+from core.quotes import CostTable
+from models.Schemas import CartPostSchema
+
+CREATED = datetime(2025, 3, 1, 10, 0)
+MENU = SimpleNamespace(
+    version=1,
+    drinks={
+        1: MenuDrink(1, "Эспрессо", Decimal("150"), None),
+        2: MenuDrink(2, "Капучино", Decimal("250"), None),
+        3: MenuDrink(3, "Раф", Decimal("300"), 2),  # только во второй точке
+    },
+    ingredients={
+        1: MenuIngredient(1, "Кофе", "г", False, 0, Decimal("1.5")),
+        2: MenuIngredient(2, "Молоко", "мл", True, 50, Decimal("0.06")),
+        4: MenuIngredient(4, "Сироп", "мл", True, 20, Decimal("0.2")),
+    },
+    recipes={1: ((1, Decimal("18")),), 2: ((1, Decimal("18")), (2, Decimal("150"))), 3: ((1, Decimal("18")),)},
+)
+
+
+class Result:
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+
+    def one(self):
+        return self.rows[0]
+
+    def one_or_none(self):
+        return self.rows[0] if self.rows else None
+
+    def all(self):
+        return self.rows
+
+    def scalars(self):
+        return Result(row[0] for row in self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class FakeSession:
+    # ответы бд по порядку запросов
+    def __init__(self, *results):
+        self.results = list(results)
+        self.executed = []
+        self.committed = self.rolled_back = False
+
+    async def execute(self, statement, params=None):
+        self.executed.append((statement, params))
+        return self.results.pop(0)
+
+    async def commit(self):
+        self.committed = True
+
+    async def rollback(self):
+        self.rolled_back = True
+
+
+def cart(*lines) -> CartPostSchema:
+    return CartPostSchema(lines=[dict(line) for line in lines])
+
+
+@pytest.fixture
+def menu(monkeypatch):
+    async def get():
+        return MENU
+
+    monkeypatch.setattr(menu_cache, "get", get)
+    monkeypatch.setattr(GetPostApp, "cost_table", CostTable())
+    return MENU
+
+
+def test_check_cart_dedupes_addons():
+    cart_input = cart({"id_drink": 1, "addons": [4, 2, 4]}, {"id_drink": 2})
+    check_cart(MENU, cart_input, 1)
+    assert [line.addons for line in cart_input.lines] == [[4, 2], []]
+
+
+@pytest.mark.parametrize("line, id_shop, status, detail", [
+    ({"id_drink": 9}, 1, 404, "Напиток не найден"),
+    ({"id_drink": 3}, 1, 404, "Напиток не найден"),
+    ({"id_drink": 1, "addons": [9]}, 1, 404, "Ингредиент не найден"),
+])
+def test_check_cart_rejects_unknown_items(line, id_shop, status, detail):
+    with pytest.raises(HTTPException) as error:
+        check_cart(MENU, cart(line), id_shop)
+    assert (error.value.status_code, error.value.detail) == (status, detail)
+    check_cart(MENU, cart({"id_drink": 3}), 2)
+
+
+def test_check_cart_limits_lines(monkeypatch):
+    monkeypatch.setattr(settings.app_settings, "cart_lines_max", 2)
+    with pytest.raises(HTTPException) as error:
+        check_cart(MENU, cart(*({"id_drink": 1} for _ in range(3))), 1)
+    assert error.value.status_code == 413
+
+
+def test_reserve_is_all_or_nothing(monkeypatch):
+    async def lock(session, id_shop, ids):
+        return {i: quantity for i, quantity in {1: Decimal("100"), 2: Decimal("100")}.items() if i in ids}
+
+    monkeypatch.setattr(stock, "lock", lock)
+    need = {1: Decimal("36"), 2: Decimal("150"), 4: Decimal("20")}
+    with pytest.raises(stock.InsufficientStock) as error:
+        asyncio.run(stock.reserve(None, 1, need))
+    assert error.value.ingredient_ids == [2]
+    # ингредиента 4 нет на складе - он не учитывается
+    assert asyncio.run(stock.reserve(None, 1, {1: Decimal("36"), 4: Decimal("20")})) == {1: Decimal("36")}
+
+
+def test_create_cart_without_stock_writes_nothing(menu, monkeypatch):
+    async def reserve(session, id_shop, need):
+        raise stock.InsufficientStock([2])
+
+    monkeypatch.setattr(stock, "reserve", reserve)
+    session = FakeSession()
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(create_cart(cart({"id_drink": 2, "quantity": 2}), 1, session))
+    assert error.value.status_code == 400
+    assert session.rolled_back and not session.committed and session.executed == []
+
+
+def test_create_cart(menu, monkeypatch):
+    applied = []
+
+    async def reserve(session, id_shop, need):
+        return need
+
+    async def apply(session, id_shop, reserved):
+        applied.append(reserved)
+
+    monkeypatch.setattr(stock, "reserve", reserve)
+    monkeypatch.setattr(stock, "apply", apply)
+    session = FakeSession(Result([SimpleNamespace(id_cart=7, created_at=CREATED)]), Result([(10,), (11,)]), Result())
+    result = asyncio.run(create_cart(cart({"id_drink": 2, "quantity": 2, "addons": [4, 4]}, {"id_drink": 1, "sugar_amount": 1}), 1, session))
+
+    assert (result.id_cart, result.total, result.created_at) == (7, 650, CREATED)
+    # себестоимость: 2 * (кофе 27 + молоко 9 + сироп 4) + эспрессо 27; сахара в меню нет - ложка без цены
+    assert result.cost == pytest.approx(2 * (27 + 9 + 4) + 27)
+    assert [(line.id_line, [addon.id_ingredient for addon in line.addons]) for line in result.lines] == [(10, [4]), (11, [])]
+    assert session.executed[2][1] == [{"id_line": 10, "id_ingredient": 4}]
+    # одно списание на всю корзину
+    assert applied == [{1: Decimal("54"), 2: Decimal("300"), 4: Decimal("40"), stock.SUGAR_ID: stock.SUGAR_PER_SPOON}]
+    assert session.committed
+
+
+def test_get_cart(monkeypatch):
+    async def covering(drink_ids, ingredient_ids):
+        assert (drink_ids, ingredient_ids) == ({1, 2}, {4})
+        return MENU
+
+    monkeypatch.setattr(menu_cache, "covering", covering)
+    session = FakeSession(
+        Result([SimpleNamespace(id_cart=7, payment_status="paid", total=Decimal("650"), cost=Decimal("107"), created_at=CREATED)]),
+        Result([SimpleNamespace(id_line=10, id_drink=2, quantity=2, sugar_amount=0),
+                SimpleNamespace(id_line=11, id_drink=1, quantity=1, sugar_amount=1)]),
+        Result([(10, 4)]),
+    )
+    result = asyncio.run(get_cart(7, 1, session))
+    assert (result.total, result.cost) == (650, 107)
+    assert [(line.drink.name_drink, [addon.name_ingredient for addon in line.addons]) for line in result.lines] == [
+        ("Капучино", ["Сироп"]), ("Эспрессо", []),
+    ]
+
+
+def test_get_cart_of_other_shop_not_found():
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(get_cart(7, 2, FakeSession(Result())))
+    assert (error.value.status_code, error.value.detail) == (404, "Заказ не найден")
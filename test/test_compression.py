@@ -0,0 +1,52 @@
+import gzip
+from core import compression
+from core.compression import CompressedCache, StreamCompressor, choose_encoding
+
+
+def test_choose_encoding_by_quality():
+    best = compression.ENCODINGS[0]
+    assert choose_encoding("gzip") == "gzip"
+    assert choose_encoding("gzip, br") == best
+    assert choose_encoding("br;q=0.1, gzip;q=0.5") == "gzip"
+    assert choose_encoding("GZIP ; q=1") == "gzip"
+    assert choose_encoding("*") == best
+    assert choose_encoding("*;q=0.5, gzip;q=1") == "gzip"
+
+
+def test_choose_encoding_refused():
+    assert choose_encoding("") is None
+    assert choose_encoding("identity") is None
+    assert choose_encoding("gzip;q=0") is None
+    assert choose_encoding("gzip;q=bad") is None
+    assert choose_encoding("*;q=0") is None
+    assert choose_encoding("deflate, compress") is None
+
+
+def test_compressed_cache_keyed_by_body():
+    cache = CompressedCache(max_bytes=10)
+    key = cache.key(b"orders v1", "gzip")
+    cache.put(key, b"12345")
+    assert cache.get(cache.key(b"orders v1", "gzip")) == b"12345"
+    # тот же ETag с другим телом - другой ключ: устаревшее сжатое тело не отдается
+    assert cache.get(cache.key(b"orders v2", "gzip")) is None
+    assert cache.get(cache.key(b"orders v1", "br")) is None
+
+
+def test_compressed_cache_evicts_by_size():
+    cache = CompressedCache(max_bytes=10)
+    first, second, third = (cache.key(body, "gzip") for body in (b"a", b"b", b"c"))
+    cache.put(first, b"1234")
+    cache.put(second, b"1234")
+    cache.get(first)  # первый теперь свежее второго
+    cache.put(third, b"1234")
+    assert cache.get(second) is None
+    assert cache.get(first) == b"1234" and cache.get(third) == b"1234"
+    assert cache.size == 8
+    cache.put(cache.key(b"big", "gzip"), b"x" * 11)  # больше всего кэша - не кладется
+    assert cache.size == 8
+
+
+def test_stream_compressor_gzip():
+    compressor = StreamCompressor("gzip")
+    data = b"".join(compressor.chunk(line) for line in (b'{"a": 1}\n', b'{"b": 2}\n')) + compressor.finish()
+    assert gzip.decompress(data) == b'{"a": 1}\n{"b": 2}\n'
@@ -0,0 +1,63 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from time import monotonic
+from types import SimpleNamespace
+from starlette.requests import Request
+from core import conditional
+from core.conditional import ChangeMarkers, OrdersMarker, Validators, headers, last_modified, not_modified
+
+
+def request(query: str = "", **request_headers) -> Request:
+    return Request({
+        "type": "http", "method": "GET", "path": "/v1/Coffe/Orders", "query_string": query.encode(),
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in request_headers.items()],
+    })
+
+
+def test_last_modified_not_sent_within_its_second():
+    now = datetime.now(timezone.utc)
+    assert last_modified(now) == {}
+    assert "Last-Modified" in last_modified(now - timedelta(seconds=2))
+
+
+def test_etag_depends_on_tag_and_query():
+    modified = datetime.now(timezone.utc) - timedelta(minutes=1)
+    first = headers(request("limit=10"), Validators("orders:1:5:0:a", modified, True))
+    assert first == headers(request("limit=10"), Validators("orders:1:5:0:a", modified, True))
+    assert first["ETag"] != headers(request("limit=20"), Validators("orders:1:5:0:a", modified, True))["ETag"]
+    assert first["ETag"] != headers(request("limit=10"), Validators("orders:1:5:0:b", modified, True))["ETag"]
+    assert headers(request(), Validators("orders:1:5:0:a", modified, False)) == {"Cache-Control": "no-cache"}
+
+
+def test_not_modified():
+    response_headers = {"ETag": 'W/"abc"', "Last-Modified": "Wed, 01 Jan 2025 10:00:00 GMT"}
+    assert not_modified(request(if_none_match='"abc"'), response_headers)
+    assert not not_modified(request(if_none_match='"old", W/"other"'), response_headers)
+    # If-None-Match важнее If-Modified-Since
+    assert not not_modified(request(if_none_match='"old"', if_modified_since="Wed, 01 Jan 2025 11:00:00 GMT"), response_headers)
+    assert not_modified(request(if_modified_since="Wed, 01 Jan 2025 10:00:00 GMT"), response_headers)
+    assert not not_modified(request(if_modified_since="garbage"), response_headers)
+    assert not not_modified(request(if_modified_since="Wed, 01 Jan 2025 10:00:00 GMT"), {"ETag": 'W/"abc"'})
+
+
+def test_orders_tag_follows_menu_and_notified_version(monkeypatch):
+    menu = SimpleNamespace(content_tag="menu-1", modified=datetime(2025, 1, 1, tzinfo=timezone.utc))
+
+    async def get():
+        return menu
+
+    monkeypatch.setattr(conditional.menu_cache, "get", get)
+    markers = ChangeMarkers(ttl=60)
+    monkeypatch.setattr(markers, "_settled", lambda *_: True)  # без реплик
+    now = monotonic()
+    markers.orders[1] = OrdersMarker(datetime(2025, 1, 2, tzinfo=timezone.utc), now, now, 5, 2)
+
+    first = asyncio.run(markers.orders_validators(1))
+    assert first.tag == "orders:1:5:2:menu-1"
+    menu.content_tag = "menu-2"  # сменилась цена напитка: строки заказов тоже изменились
+    assert asyncio.run(markers.orders_validators(1)).tag == "orders:1:5:2:menu-2"
+
+    markers.on_order_created('{"kind": "order", "id_shop": 1, "version": 7}')
+    markers.on_order_created('{"kind": "order", "id_shop": 1, "version": 6}')  # запоздавшее уведомление версию не откатывает
+    markers.on_order_created('{"kind": "cart", "id_shop": 1, "version": 9}')
+    assert asyncio.run(markers.orders_validators(1)).tag == "orders:1:7:2:menu-2"
@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+from core.db import TimedQueuePool, connect_args, engine_options
+from core import metrics
+from core.metrics import Counter, Gauge, Histogram, render
+
+
+def settings(**overrides):
+    values = dict(db_echo=False, db_pool_size=20, db_max_overflow=5, db_pool_timeout=3.0, db_pool_recycle=600,
+                  db_pool_pre_ping=False, db_statement_cache_size=50, db_pgbouncer=False)
+    return SimpleNamespace(**{**values, **overrides})
+
+
+def test_engine_options_from_settings():
+    options = engine_options(settings())
+    assert options["poolclass"] is TimedQueuePool
+    assert (options["pool_size"], options["max_overflow"], options["pool_timeout"]) == (20, 5, 3.0)
+    assert (options["pool_recycle"], options["pool_pre_ping"]) == (600, False)
+    assert options["connect_args"] == {"statement_cache_size": 50, "prepared_statement_cache_size": 50}
+
+
+def test_pgbouncer_disables_statement_cache():
+    args = connect_args(settings(db_pgbouncer=True))
+    assert args["statement_cache_size"] == 0 and args["prepared_statement_cache_size"] == 0
+    # имена подготовленных выражений уникальны: на чужом серверном соединении не будет конфликта
+    assert args["prepared_statement_name_func"]() != args["prepared_statement_name_func"]()
+
+
+def test_histogram_buckets_are_cumulative(monkeypatch):
+    monkeypatch.setattr(metrics, "REGISTRY", [])
+    histogram = Histogram("test_wait_seconds", "ожидание", buckets=(0.01, 0.1))
+    for value in (0.005, 0.05, 0.05, 3.0):
+        histogram.observe(value)
+    samples = {(name, labels.get("le")): value for name, labels, value in histogram.samples()}
+    assert samples[("test_wait_seconds_bucket", 0.01)] == 1
+    assert samples[("test_wait_seconds_bucket", 0.1)] == 3
+    assert samples[("test_wait_seconds_bucket", "+Inf")] == 4
+    assert samples[("test_wait_seconds_sum", None)] == 3.105
+    assert samples[("test_wait_seconds_count", None)] == 4
+
+
+def test_render_prometheus_text(monkeypatch):
+    monkeypatch.setattr(metrics, "REGISTRY", [])  # без метрик пула: им нужен движок бд
+    counter = Counter("test_requests_total", "запросы")
+    counter.inc(kind="read")
+    counter.inc(2, kind="read")
+    Gauge("test_pool_checked_out", "выдано", lambda: 7)
+    text = render()
+    assert "# TYPE test_requests_total counter\n" in text
+    assert 'test_requests_total{kind="read"} 3\n' in text
+    assert "# TYPE test_pool_checked_out gauge\ntest_pool_checked_out 7\n" in text
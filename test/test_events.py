@@ -0,0 +1,81 @@
+import asyncio
+import json
+from core.events import RESET, EventBroker
+
+
+def order(id_shop, seq, count=1):
+    return json.dumps({"kind": "order", "id_shop": id_shop, "seq": seq, "count": count, "rows": None})
+
+
+def stock(id_shop, seq):
+    return json.dumps({"id_shop": id_shop, "seq": seq, "stock": {"1": 10.0}})
+
+
+def feed(broker, *payloads):
+    for payload in payloads:
+        (broker.on_stock_changed if '"stock"' in payload else broker.on_order_created)(payload)
+
+
+def drain(subscriber):
+    events = []
+    while not subscriber.queue.empty():
+        events.append(subscriber.queue.get_nowait())
+    return [(event[0], event[1]) for event in events]
+
+
+def test_since_returns_missed_events_of_shop():
+    broker = EventBroker(buffer=10, queue_size=10)
+    feed(broker, order(1, 1), order(2, 1), stock(1, 2), order(1, 3))
+    assert [event[0] for event in broker._since("1", 1)] == ["2", "3"]
+    assert broker._since("3", 1) == []
+    assert [event[0] for event in broker._since("0", 2)] == ["1"]
+    assert broker._since("x", 1) is None
+    assert broker._since("1", 3) is None  # о точке этот воркер еще ничего не знает
+
+
+def test_resume_on_another_worker():
+    # номера из бд: воркер, к которому переподключился клиент, отдает пропущенное по id другого воркера
+    first, second = EventBroker(buffer=10, queue_size=10), EventBroker(buffer=10, queue_size=10)
+    feed(first, order(1, 5), order(1, 6))
+    feed(second, order(1, 5), order(1, 6), order(1, 7))
+    last_id = drain(first.subscribe("5", None, 1))[-1][0]
+    subscriber = second.subscribe(last_id, None, 1)
+    assert drain(subscriber) == [("7", "order_created")]
+
+
+def test_since_after_eviction_or_gap_is_reset():
+    broker = EventBroker(buffer=2, queue_size=10)
+    feed(broker, order(1, 1), order(1, 2), order(1, 3))
+    assert broker._since("0", 1) is None  # событие 1 вытеснено
+    assert [event[0] for event in broker._since("1", 1)] == ["2", "3"]
+
+    broker.reset()
+    feed(broker, order(1, 6))
+    assert broker._since("3", 1) is None  # 4 и 5 потеряны во время переподключения LISTEN
+    assert [event[0] for event in broker._since("5", 1)] == ["6"]
+
+
+def test_subscriber_ahead_of_worker_skips_duplicates():
+    broker = EventBroker(buffer=10, queue_size=10)
+    feed(broker, order(1, 1))
+    subscriber = broker.subscribe("3", None, 1)  # уже получил 2 и 3 от другого воркера
+    feed(broker, order(1, 2), stock(1, 3), order(1, 4))
+    assert drain(subscriber) == [("4", "order_created")]
+
+
+def test_subscribe_with_too_long_backlog_is_reset():
+    broker = EventBroker(buffer=10, queue_size=2)
+    feed(broker, *(order(1, seq) for seq in range(1, 5)))
+    assert drain(broker.subscribe("1", None, 1)) == [(None, RESET)]
+
+
+def test_slow_subscriber_is_dropped():
+    broker = EventBroker(buffer=10, queue_size=2)
+
+    async def scenario():
+        subscriber = broker.subscribe(None, {"order_created"}, 1)
+        feed(broker, *(order(1, seq) for seq in range(1, 4)))
+        assert subscriber.dropped and subscriber not in broker.subscribers
+        assert await subscriber.get(1) is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+import orjson
+import pytest
+from pydantic import TypeAdapter
+from core import fast_read
+from core.menu_cache import MenuCache, MenuDrink, MenuIngredient, menu_cache
+from core.pagination import decode_cursor
+from models.Schemas import InventoryGetSchema, OrderGetSchema
+
+DRINKS = {1: MenuDrink(1, "Эспрессо", Decimal("150.00"), None), 2: MenuDrink(2, "Капучино", Decimal("250.50"), None)}
+INGREDIENTS = {
+    2: MenuIngredient(2, "Молоко", "мл", True, 50, Decimal("0.06")),
+    4: MenuIngredient(4, "Сироп", "мл", True, 20, Decimal("0.2")),
+}
+ROWS = [
+    SimpleNamespace(id_order=12, id_drink=2, id_ingredient=4, payment_status="paid", created_at=datetime(2025, 3, 1, 10, 0, 5)),
+    SimpleNamespace(id_order=11, id_drink=1, id_ingredient=2, payment_status="paid", created_at=datetime(2025, 3, 1, 10, 0, 0, 123456)),
+    SimpleNamespace(id_order=10, id_drink=2, id_ingredient=2, payment_status="paid", created_at=datetime(2025, 2, 28, 23, 59)),
+]
+
+
+class Session:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def execute(self, statement):
+        self.limit = statement._limit
+        return SimpleNamespace(all=lambda: self.rows[:self.limit])
+
+
+@pytest.fixture(autouse=True)
+def menu(monkeypatch):
+    menu = SimpleNamespace(
+        drink_dicts={i: MenuCache.drink_schema(d).model_dump() for i, d in DRINKS.items()},
+        ingredient_dicts={i: MenuCache.ingredient_schema(d).model_dump() for i, d in INGREDIENTS.items()},
+    )
+
+    async def covering(drink_ids, ingredient_ids):
+        return menu
+
+    monkeypatch.setattr(menu_cache, "covering", covering)
+
+
+def test_orders_match_response_model():
+    # тот же json, что и через orm + OrderGetSchema
+    fast = orjson.loads(fast_read.json_response(asyncio.run(fast_read.order_dicts(ROWS))).body)
+    orm = [
+        SimpleNamespace(**vars(row), drink=DRINKS[row.id_drink], ingredient=INGREDIENTS[row.id_ingredient])
+        for row in ROWS
+    ]
+    adapter = TypeAdapter(list[OrderGetSchema])
+    slow = orjson.loads(adapter.dump_json(adapter.validate_python(orm, from_attributes=True)))
+    assert fast == slow
+
+
+def test_fetch_orders_page_and_cursor():
+    session = Session(ROWS)
+    orders, cursor = asyncio.run(fast_read.fetch_orders(session, [], limit=2))
+    assert session.limit == 3  # на строку больше: есть ли следующая страница
+    assert [order["id_order"] for order in orders] == [12, 11]
+    assert decode_cursor(cursor) == (ROWS[1].created_at, 11)
+    orders, cursor = asyncio.run(fast_read.fetch_orders(Session(ROWS), [], limit=3))
+    assert len(orders) == 3 and cursor is None
+
+
+def test_normalized_orders():
+    normalized, _ = asyncio.run(fast_read.fetch_orders(Session(ROWS), [], limit=10, normalized=True))
+    assert normalized["items"][0] == {"id_order": 12, "id_drink": 2, "id_ingredient": 4, "payment_status": "paid",
+                                      "created_at": ROWS[0].created_at}
+    assert list(normalized["drinks"]) == [1, 2] and list(normalized["ingredients"]) == [2, 4]
+    body = orjson.loads(fast_read.json_response(normalized).body)
+    assert body["drinks"]["2"] == {"name_drink": "Капучино", "price": 250.5}
+
+
+def test_inventory_matches_response_model():
+    rows = [SimpleNamespace(id_ingredient=2, quantity=Decimal("1500.50")), SimpleNamespace(id_ingredient=4, quantity=Decimal("0"))]
+    fast = orjson.loads(fast_read.json_response(asyncio.run(fast_read.fetch_inventory(Session(rows), 1))).body)
+    orm = [
+        SimpleNamespace(id_ingredient=row.id_ingredient, quantity=row.quantity, ingredient=SimpleNamespace(
+            id_ingredient=row.id_ingredient, name_ingredient=INGREDIENTS[row.id_ingredient].name_ingredient,
+            unit=INGREDIENTS[row.id_ingredient].unit, portion=INGREDIENTS[row.id_ingredient].portion,
+        ))
+        for row in rows
+    ]
+    adapter = TypeAdapter(list[InventoryGetSchema])
+    slow = orjson.loads(adapter.dump_json(adapter.validate_python(orm, from_attributes=True)))
+    assert fast == slow
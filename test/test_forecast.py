@@ -0,0 +1,62 @@
+from datetime import date
+import numpy as np
+import pytest
+from core.forecast import consumption, forecast, ranges
+from core.stock import SUGAR_ID, SUGAR_PER_SPOON
+
+# ингредиенты 0..6: кофе 1, молоко 2, без продаж 3, сироп 4, сахар 6; напиток 1 - эспрессо, 2 - капучино
+RECIPES = np.zeros((3, SUGAR_ID + 1))
+RECIPES[1, 1] = 18
+RECIPES[2, 1], RECIPES[2, 2] = 18, 150
+PORTIONS = np.array([0, 0, 50, 0, 20, 0, 0])
+SUNDAY = date(2025, 3, 2)
+
+
+def test_consumption():
+    drinks = np.array([[0, 3, 1], [0, 0, 2]])
+    addons = np.array([[0, 0, 1, 0, 2, 0, 0], [0, 0, 0, 0, 0, 0, 0]])
+    spoons = np.array([4, 0])
+    used = consumption(drinks, addons, spoons, RECIPES, PORTIONS)
+    assert used.tolist() == [
+        [0, 18 * 4, 150 + 50, 0, 2 * 20, 0, 4 * SUGAR_PER_SPOON],
+        [0, 18 * 2, 150 * 2, 0, 0, 0, 0],
+    ]
+
+
+def test_consumption_without_sales():
+    used = consumption(np.zeros((7, 3)), np.zeros((7, 7)), np.zeros(7), RECIPES, PORTIONS)
+    assert used.shape == (7, 7) and not used.any()
+
+
+def test_forecast_weekday_profile():
+    # две недели с понедельника 17.02 по воскресенье 02.03; колонки: ровно 10 в день, 20 по выходным, ни одной продажи
+    weekend = np.array([10, 10, 10, 10, 10, 20, 20] * 2)
+    used = np.column_stack([np.full(14, 10.0), weekend, np.zeros(14)])
+    result = forecast(used, SUNDAY, horizon=7, lead_time=2, z=1.65)
+    # следующие 9 дней: пн-вс, пн, вт
+    assert result["daily"] == pytest.approx([10, 180 / 14, 0])
+    assert result["lead_time"] == pytest.approx([20, 20, 0])
+    assert result["horizon"] == pytest.approx([90, 10 * 7 + 20 * 2, 0])
+    assert result["safety"] == pytest.approx([0, 0, 0])
+
+
+def test_forecast_safety_from_residuals():
+    # один всплеск в первый понедельник: профиль понедельника 17/11, остатки +7 и -7 в понедельники, std = sqrt(98 / 14)
+    used = np.full((14, 1), 10.0)
+    used[0, 0] = 24
+    result = forecast(used, SUNDAY, horizon=7, lead_time=2, z=1.65)
+    assert result["daily"] == pytest.approx([10])
+    assert result["lead_time"] == pytest.approx([10 * 17 / 11 + 10 * 10 / 11])
+    assert result["safety"] == pytest.approx([1.65 * np.sqrt(7) * np.sqrt(2)])
+
+
+def test_forecast_empty_history():
+    result = forecast(np.zeros((7, 3)), SUNDAY, horizon=7, lead_time=2, z=1.65)
+    for values in result.values():
+        assert values.tolist() == [0, 0, 0]  # без nan от деления на нулевое среднее
+
+
+def test_ranges():
+    assert ranges(date(2025, 1, 1), 10, 3) == [(date(2025, 1, 1), 4), (date(2025, 1, 5), 4), (date(2025, 1, 9), 2)]
+    assert ranges(date(2025, 1, 1), 2, 4) == [(date(2025, 1, 1), 1), (date(2025, 1, 2), 1)]
+    assert sum(length for _, length in ranges(date(2025, 1, 1), 56, 5)) == 56
@@ -0,0 +1,42 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from sqlalchemy.dialects import postgresql
+from core.idempotency import IdempotencyStore, KeyMismatch, request_hash
+
+
+def test_request_hash_ignores_key_order():
+    assert request_hash({"id_drink": 1, "sugar_amount": 2}) == request_hash({"sugar_amount": 2, "id_drink": 1})
+    assert request_hash({"id_drink": 1, "sugar_amount": 2}) != request_hash({"id_drink": 1, "sugar_amount": 3})
+
+
+def test_local_keys_are_scoped_by_shop_and_body():
+    store = IdempotencyStore(capacity=2, ttl=60)
+    digest = request_hash({"id_drink": 1})
+    store.put_local(1, "k", digest, {"id_order": 10})
+    assert store.get_local(1, "k", digest) == {"id_order": 10}
+    assert store.get_local(2, "k", digest) is None  # тот же ключ в другой точке - другой запрос
+    with pytest.raises(KeyMismatch):
+        store.get_local(1, "k", request_hash({"id_drink": 2}))
+
+
+def test_local_keys_evicted_by_lru():
+    store = IdempotencyStore(capacity=2, ttl=60)
+    for id_shop in (1, 2, 3):
+        store.put_local(id_shop, "k", None, {"id_shop": id_shop})
+    assert store.get_local(1, "k", "any") is None
+    assert store.get_local(3, "k", "any") == {"id_shop": 3}  # ключ без хэша (до версии 15) не сверяется
+
+
+def test_claim_takes_over_expired_key():
+    # просроченный ключ, который очистка еще не удалила, занимается заново той же вставкой
+    class Session:
+        async def execute(self, statement):
+            self.statement = statement
+            return SimpleNamespace(scalar_one_or_none=lambda: "k")
+
+    session = Session()
+    assert asyncio.run(IdempotencyStore(capacity=2, ttl=60).claim(session, 1, "k", "digest")) is None
+    sql = str(session.statement.compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (id_shop, key) DO UPDATE" in sql
+    assert "WHERE idempotency_keys.created_at < LOCALTIMESTAMP - " in sql
@@ -0,0 +1,53 @@
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+from bench.explain import print_report, seq_scans
+from core import migration_ddl
+from models.ModelBase import Base
+
+
+def ddl(table: str, name: str) -> str:
+    index = next(index for index in Base.metadata.tables[table].indexes if index.name == name)
+    return " ".join(str(CreateIndex(index).compile(dialect=postgresql.dialect())).split())
+
+
+def test_covering_indexes():
+    assert ddl("ingredient", "ix_ingredient_visible_name") == (
+        "CREATE INDEX ix_ingredient_visible_name ON ingredient (name_ingredient) "
+        "INCLUDE (id_ingredient, unit, portion) WHERE is_visible"
+    )
+    assert "INCLUDE (id_drink, id_ingredient, payment_status)" in ddl("orders", "ix_orders_id_shop_created_at_id_order")
+    assert "INCLUDE (id_drink, amount)" in ddl("drink_ingredient", "ix_drink_ingredient_id_ingredient")
+
+
+def test_model_indexes_created_by_migrations():
+    # модели описывают итоговую схему, а создают ее миграции: индекс модели без миграции на бд не появится
+    statements = " ".join(
+        statement for name in dir(migration_ddl) if name.isupper()
+        for statement in getattr(migration_ddl, name) if isinstance(statement, str)
+    )
+    missing = [index.name for table in Base.metadata.tables.values() for index in table.indexes if index.name not in statements]
+    assert missing == []
+
+
+def test_seq_scans_only_on_large_tables():
+    plan = {"Node Type": "Nested Loop", "Plans": [
+        {"Node Type": "Seq Scan", "Relation Name": "drink", "Actual Rows": 40},
+        {"Node Type": "Hash", "Plans": [{"Node Type": "Seq Scan", "Relation Name": "orders", "Actual Rows": 300000}]},
+        {"Node Type": "Index Only Scan", "Relation Name": "inventory"},
+    ]}
+    sizes = {"drink": 40, "orders": 300000, "inventory": 30}
+    assert [node["Relation Name"] for node in seq_scans(plan, sizes, min_rows=1000)] == ["orders"]
+    assert [node["Relation Name"] for node in seq_scans(plan, sizes, min_rows=10)] == ["drink", "orders"]
+
+
+def test_report_counts_flagged_statements(capsys):
+    report = [
+        {"statement": "SELECT 1", "time_ms": 0.1, "shared_hit": 1, "shared_read": 0, "seq_scans": []},
+        {"statement": "SELECT * FROM orders", "time_ms": 90.0, "shared_hit": 10, "shared_read": 900,
+         "seq_scans": [("orders", 300000)]},
+        {"statement": "SELECT bad", "error": "syntax error"},
+    ]
+    assert print_report(report) == 1
+    out = capsys.readouterr().out
+    assert out.index("SEQSCAN") < out.index("ok ")  # самые долгие запросы сверху
+    assert "Seq Scan по orders: 300000 строк" in out and "ОШИБКА" in out
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+import pytest
+from core import instrumentation, metrics
+from core.instrumentation import (
+    MetricsMiddleware, _after_execute, _before_execute, add, captured_queries, request_stats, route_template,
+)
+from core.metrics import Counter, Histogram
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics(monkeypatch):
+    # свои метрики и настройки: глобальные копятся между тестами, а настройкам бд нужно окружение
+    monkeypatch.setattr(metrics, "REGISTRY", [])
+    for name in ("http_latency", "http_db_time", "http_queries", "http_pool_wait", "db_query_time"):
+        monkeypatch.setattr(instrumentation, name, Histogram(name, name))
+    monkeypatch.setattr(instrumentation, "slow_queries", Counter("slow", "slow"))
+    monkeypatch.setattr(instrumentation, "settings", SimpleNamespace(
+        db_settings=SimpleNamespace(db_slow_query_ms=50.0), app_settings=SimpleNamespace(query_count_warn=2)
+    ))
+
+
+def count(histogram, **labels):
+    return histogram.values[tuple(labels.items())][-1]
+
+
+def test_route_template_keeps_router_prefix():
+    route = SimpleNamespace(path="/Orders/{id_order}", path_format="/Orders/{id_order}")
+    scope = {"route": route, "path": "/v1/Coffe/Orders/15", "path_params": {"id_order": 15}}
+    assert route_template(scope) == "/v1/Coffe/Orders/{id_order}"
+    assert route_template({"path": "/nowhere"}) == "unmatched"
+    # путь не заканчивается подставленным шаблоном - отдаем шаблон как есть
+    assert route_template({**scope, "path": "/v1/Coffe/Orders/15/"}) == "/Orders/{id_order}"
+
+
+def test_cursor_events_sum_into_request(monkeypatch):
+    times = iter([1.0, 1.01, 2.0, 2.1])
+    monkeypatch.setattr(instrumentation, "perf_counter", lambda: next(times))
+    conn = SimpleNamespace(info={})
+    stats = {"db_time": 0.0, "queries": 0, "pool_wait": 0.0}
+    token, captured = request_stats.set(stats), captured_queries.set([])
+    try:
+        for statement in ("SELECT 1", "SELECT pg_sleep(0.1)"):
+            _before_execute(conn, None, statement, (), None, False)
+            _after_execute(conn, None, statement, (), None, False)
+        assert stats["queries"] == 2 and stats["db_time"] == pytest.approx(0.11)
+        assert [query for query, _ in captured_queries.get()] == ["SELECT 1", "SELECT pg_sleep(0.1)"]
+    finally:
+        request_stats.reset(token)
+        captured_queries.reset(captured)
+    assert instrumentation.slow_queries.values == {(): 1}  # 10 мс - не медленный, 100 мс - медленный
+    assert count(instrumentation.db_query_time) == 2
+    add("queries", 1)  # вне http-запроса счетчиков нет - ничего не падает
+
+
+def test_middleware_observes_route_and_status(caplog):
+    route = SimpleNamespace(path="/Orders", path_format="/Orders")
+
+    async def app(scope, receive, send):
+        scope["route"] = route
+        for _ in range(3):
+            add("queries", 1)
+        add("pool_wait", 0.5)
+        await send({"type": "http.response.start", "status": 201})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/v1/Coffe/Orders", "path_params": {}}
+    with caplog.at_level(logging.WARNING, logger="core.instrumentation"):
+        asyncio.run(MetricsMiddleware(app)(scope, None, send))
+    assert len(sent) == 2
+    assert count(instrumentation.http_latency, method="POST", route="/v1/Coffe/Orders", status=201) == 1
+    row = instrumentation.http_queries.values[(("method", "POST"), ("route", "/v1/Coffe/Orders"))]
+    assert row[-2] == 3
+    assert instrumentation.http_pool_wait.values[(("method", "POST"), ("route", "/v1/Coffe/Orders"))][-2] == 0.5
+    assert "3 sql-запросов" in caplog.text  # больше query_count_warn
+    assert request_stats.get() is None
+
+
+def test_middleware_counts_failed_request_as_500():
+    async def app(scope, receive, send):
+        raise RuntimeError("boom")
+
+    scope = {"type": "http", "method": "GET", "path": "/v1/Coffe/Orders", "path_params": {}}
+    with pytest.raises(RuntimeError):
+        asyncio.run(MetricsMiddleware(app)(scope, None, None))
+    assert count(instrumentation.http_latency, method="GET", route="unmatched", status=500) == 1
@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+from pydantic import ValidationError
+from core import db
+from core.config import Settings
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def python(code: str) -> subprocess.CompletedProcess:
+    # отдельный процесс без настроек бд: в этом процессе модули уже импортированы другими тестами
+    env = {key: value for key, value in os.environ.items() if not key.startswith("DB_")}
+    return subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True)
+
+
+def test_db_settings_read_on_first_access(monkeypatch):
+    for key in [key for key in os.environ if key.startswith("DB_")]:
+        monkeypatch.delenv(key)
+    settings = Settings()
+    assert settings.app_settings.query_count_warn > 0  # у настроек приложения есть значения по умолчанию
+    assert "db_settings" not in settings.__dict__
+    with pytest.raises(ValidationError):
+        settings.db_settings
+
+
+def test_engine_created_on_first_use(monkeypatch):
+    created = []
+    monkeypatch.setattr(db, "_engine", None)
+    monkeypatch.setattr(db, "get_engine", lambda: created.append(1) or "engine")
+    assert db.engine == "engine" and created == [1]
+    with pytest.raises(AttributeError):
+        db.missing_name
+
+
+def test_import_without_db_settings():
+    result = python(
+        "import sys, main\n"
+        "assert 'routers.rout' not in sys.modules and 'core.db' not in sys.modules\n"
+        "app = main.create_app()\n"
+        "from core import db\n"
+        "assert db._engine is None and 'shards' not in db.shards.__dict__\n"
+        "assert '/v1/Coffe/Orders' in app.openapi()['paths']\n"
+        "import bench.run, bench.explain"
+    )
+    assert result.returncode == 0, result.stderr
+
+
+def test_engine_needs_db_settings():
+    result = python("from core.db import engine")
+    assert result.returncode != 0 and "ValidationError" in result.stderr
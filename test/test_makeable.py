@@ -0,0 +1,86 @@
+import asyncio
+import json
+from decimal import Decimal
+from types import SimpleNamespace
+import pytest
+from core import makeable as module
+from core.makeable import MakeableIndex, ShopIndexes
+from core.menu_cache import MenuDrink, menu_cache
+
+# кофе 1, молоко 2, вода 3 (не на складе); напиток 3 только во второй точке, у напитка 4 только вода
+MENU = SimpleNamespace(
+    version=1,
+    drinks={
+        1: MenuDrink(1, "Эспрессо", Decimal("150"), None),
+        2: MenuDrink(2, "Капучино", Decimal("250"), None),
+        3: MenuDrink(3, "Раф", Decimal("300"), 2),
+        4: MenuDrink(4, "Вода", Decimal("50"), None),
+    },
+    ingredients={2: SimpleNamespace(id_ingredient=2, portion=50)},
+    recipes={
+        1: ((1, Decimal("18")), (3, Decimal("30"))),
+        2: ((1, Decimal("18")), (2, Decimal("150"))),
+        3: ((1, Decimal("18")),),
+        4: ((3, Decimal("200")),),
+    },
+)
+
+
+@pytest.fixture
+def index(monkeypatch):
+    async def get():
+        return MENU
+
+    class Session:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def execute(self, statement):
+            return SimpleNamespace(all=lambda: [(1, Decimal("100")), (2, Decimal("400"))])
+
+    monkeypatch.setattr(menu_cache, "get", get)
+    monkeypatch.setattr(module, "shards", SimpleNamespace(sessionmaker=lambda id_shop: Session))
+    index = MakeableIndex(1, low_stock_servings=3, ttl=60)
+    asyncio.run(index.get())
+    return index
+
+
+def test_rebuild(index):
+    # 100 г кофе / 18 = 5 порций, молока 400 / 150 = 2; воды на складе нет - не ограничивает
+    assert index.makeable == {1: 5, 2: 2, 4: None}
+    assert index.limiting == {1: 1, 2: 2, 4: None}
+    # порог: 3 самые большие порции - рецепт (150) больше добавки (50)
+    assert index.thresholds[1] == 54 and index.thresholds[2] == 450
+    assert index.low == {2}
+
+
+def test_stock_change_recomputes_affected_drinks(index):
+    index.makeable[1] = -1  # кофе не меняется - эспрессо не пересчитывается
+    index.on_stock_changed({"2": 1000.0})
+    assert index.makeable[2] == 5 and index.limiting[2] == 1
+    assert index.makeable[1] == -1
+    assert index.low == set()
+
+    index.on_stock_changed({"1": 10.0})
+    assert index.makeable[1] == 0 and index.makeable[2] == 0
+    assert index.low == {1}
+
+    index.on_stock_changed({"1": None})  # строку склада удалили: кофе больше не учитывается
+    assert index.makeable[1] is None and index.makeable[2] == 6
+    assert 1 not in index.low
+
+
+def test_shop_indexes_dispatch():
+    indexes = ShopIndexes(low_stock_servings=3, ttl=60)
+    first = indexes.index(1)
+    first.menu, first.users, first._dirty = MENU, {1: (1,)}, False
+    first.makeable = {1: 0}
+    indexes.on_stock_changed(json.dumps({"id_shop": 2, "stock": {"1": 100}}))  # индекса точки 2 нет
+    assert first.stock == {}
+    indexes.on_stock_changed(json.dumps({"id_shop": 1, "stock": {"1": 36}}))
+    assert first.makeable[1] == 2  # 36 г кофе / 18
+    indexes.on_stock_changed(json.dumps({"id_shop": 1, "stock": None}))
+    assert first._dirty
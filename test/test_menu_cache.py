@@ -0,0 +1,137 @@
+import asyncio
+import json
+from decimal import Decimal
+from types import SimpleNamespace
+import pytest
+from core import menu_cache as module
+from core.listener import Listener
+from core.menu_cache import MenuCache
+
+DRINKS = [
+    SimpleNamespace(id_drink=1, name_drink="Эспрессо", price=Decimal("150"), id_shop=None),
+    SimpleNamespace(id_drink=2, name_drink="Раф", price=Decimal("300"), id_shop=2),  # только во второй точке
+]
+INGREDIENTS = [
+    SimpleNamespace(id_ingredient=1, name_ingredient="Кофе", unit="г", is_visible=False, portion=0, unit_cost=Decimal("1.5")),
+    SimpleNamespace(id_ingredient=2, name_ingredient="Молоко", unit="мл", is_visible=True, portion=50, unit_cost=Decimal("0.06")),
+]
+RECIPES = [
+    SimpleNamespace(id_drink=1, id_ingredient=1, amount=Decimal("18")),
+    SimpleNamespace(id_drink=2, id_ingredient=1, amount=Decimal("18")),
+    SimpleNamespace(id_drink=2, id_ingredient=2, amount=Decimal("100")),
+]
+
+
+class Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+class Database:
+    # меню в "бд": каждая загрузка читает напитки, ингредиенты, рецепты и точки
+    def __init__(self):
+        self.drinks = list(DRINKS)
+        self.loads = 0
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        self.loads += 1
+        self.results = [Result(self.drinks), Result(INGREDIENTS), Result(RECIPES), Result([(1, "Основная"), (2, "Ленина")])]
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement):
+        await asyncio.sleep(0)
+        return self.results.pop(0)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = Database()
+    monkeypatch.setattr(module, "AsyncSessionLocal", database)
+    return database
+
+
+def test_load_builds_graph(db):
+    menu = asyncio.run(MenuCache(ttl=60).get())
+    assert menu.recipes == {1: ((1, Decimal("18")),), 2: ((1, Decimal("18")), (2, Decimal("100")))}
+    assert menu.shops == {1: "Основная", 2: "Ленина"}
+    assert menu.drink_dicts[1] == {"name_drink": "Эспрессо", "price": 150.0}
+    assert (menu.version, db.loads) == (1, 1)
+
+
+def test_payloads_per_shop_and_cached(db):
+    menu = MenuCache(ttl=60)
+    asyncio.run(menu.get())
+    body, etag = menu.payload("drinks", 1)
+    assert [drink["name_drink"] for drink in json.loads(body)] == ["Эспрессо"]
+    assert [drink["name_drink"] for drink in json.loads(menu.payload("drinks", 2)[0])] == ["Эспрессо", "Раф"]
+    assert menu.payload("drinks", 1) is menu.payloads[("drinks", 1)]
+    recipes = json.loads(menu.payload("recipes_normalized", 2)[0])
+    assert recipes["items"] == [{"id_drink": 1, "id_ingredient": 1}, {"id_drink": 2, "id_ingredient": 1}, {"id_drink": 2, "id_ingredient": 2}]
+    assert set(recipes["ingredients"]) == {"1", "2"}
+    # etag по содержимому: другой воркер с тем же меню отдает тот же
+    other = MenuCache(ttl=60)
+    asyncio.run(other.get())
+    assert other.payload("drinks", 1)[1] == etag
+
+
+def test_invalidate_and_ttl_reload(db, monkeypatch):
+    menu = MenuCache(ttl=60)
+    asyncio.run(menu.get())
+    asyncio.run(menu.get())
+    assert db.loads == 1
+
+    menu.invalidate()  # уведомление menu_changed
+    db.drinks = DRINKS[:1]
+    asyncio.run(menu.get())
+    assert (db.loads, menu.version, list(menu.drinks)) == (2, 2, [1])
+    assert menu.payloads == {}
+
+    now = module.monotonic()
+    monkeypatch.setattr(module, "monotonic", lambda: now + 61)
+    assert menu.stale
+
+
+def test_concurrent_get_loads_once(db):
+    menu = MenuCache(ttl=60)
+
+    async def scenario():
+        await asyncio.gather(*(menu.get() for _ in range(10)))
+
+    asyncio.run(scenario())
+    assert db.loads == 1
+
+
+def test_covering_reloads_for_unknown_ids(db):
+    menu = MenuCache(ttl=60)
+    db.drinks = DRINKS[:1]
+    asyncio.run(menu.get())
+    db.drinks = list(DRINKS)  # напиток 2 добавлен, уведомление еще не пришло
+    assert asyncio.run(menu.covering({1}, {1})) is menu and db.loads == 1
+    asyncio.run(menu.covering({1, 2}, set()))
+    assert db.loads == 2 and 2 in menu.drinks
+
+
+def test_listener_dispatch_isolates_failing_callbacks():
+    listener = Listener("postgresql://unused")
+    received = []
+
+    def broken(payload):
+        raise ValueError(payload)
+
+    listener.subscribe("menu_changed", broken)
+    listener.subscribe("menu_changed", received.append)
+    listener._dispatch(None, 1, "menu_changed", "{}")
+    listener._dispatch(None, 1, "stock_changed", "{}")
+    assert received == ["{}"]
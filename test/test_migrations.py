@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from core import migrations
+from core.migrations import LATEST, MIGRATIONS, SchemaOutdated, _run, _upgrade, ensure
+
+
+class Conn:
+    def __init__(self):
+        self.executed = []
+
+    def exec_driver_sql(self, statement):
+        self.executed.append(statement)
+
+    def execute(self, statement, parameters=None):
+        self.executed.append(statement)
+
+
+def test_versions_are_sequential():
+    assert [version for version, _, _ in MIGRATIONS] == list(range(1, len(MIGRATIONS) + 1))
+    assert LATEST == MIGRATIONS[-1][0]
+    assert len({name for _, name, _ in MIGRATIONS}) == len(MIGRATIONS)
+
+
+def test_run_executes_statements_in_order():
+    conn = Conn()
+    _run("CREATE TABLE a ()", "CREATE INDEX b ON a ()")(conn)
+    assert conn.executed == ["CREATE TABLE a ()", "CREATE INDEX b ON a ()"]
+
+
+def test_upgrade_applies_only_newer_versions(monkeypatch):
+    conn = Conn()
+    monkeypatch.setattr(migrations, "_current", lambda conn: 1)
+    monkeypatch.setattr(migrations, "MIGRATIONS", [(1, "one", _run("ONE")), (2, "two", _run("TWO")), (3, "three", _run("THREE"))])
+    assert _upgrade(conn) == ["2_two", "3_three"]
+    # сначала блокировка, затем DDL и запись версии - каждая миграция в той же транзакции
+    assert "pg_advisory_xact_lock" in str(conn.executed[0])
+    assert conn.executed[1] == "TWO" and "INSERT INTO schema_version" in str(conn.executed[2])
+    assert conn.executed[3] == "THREE" and len(conn.executed) == 5
+
+
+def test_ensure_checks_version(monkeypatch):
+    upgraded = []
+
+    async def upgrade(engine):
+        upgraded.append(engine)
+
+    def run(current, auto_migrate):
+        async def version(engine):
+            return current
+
+        monkeypatch.setattr(migrations, "version", version)
+        asyncio.run(ensure("engine", auto_migrate))
+
+    monkeypatch.setattr(migrations, "upgrade", upgrade)
+    run(LATEST, auto_migrate=False)
+    assert upgraded == []  # схема актуальна - блокировка не берется
+    with pytest.raises(SchemaOutdated, match="устарела"):
+        run(LATEST - 1, auto_migrate=False)
+    with pytest.raises(SchemaOutdated, match="новее кода"):
+        run(LATEST + 1, auto_migrate=True)
+    run(0, auto_migrate=True)
+    assert upgraded == ["engine"]
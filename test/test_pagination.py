@@ -0,0 +1,18 @@
+from datetime import datetime
+import pytest
+from fastapi import HTTPException
+from core.pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    for created_at, id_ in ((datetime(2025, 3, 1, 12, 30, 5, 123456), 42), (datetime(2024, 12, 31), 1), (datetime(2025, 1, 1, 0, 0, 1), 10**9)):
+        cursor = encode_cursor(created_at, id_)
+        assert "=" not in cursor and "/" not in cursor and "+" not in cursor  # безопасен в query без экранирования
+        assert decode_cursor(cursor) == (created_at, id_)
+
+
+@pytest.mark.parametrize("cursor", ["", "???", "bm90LWEtY3Vyc29y", encode_cursor(datetime(2025, 1, 1), 1)[:-3], "MjAyNS0wMS0wMXx4"])
+def test_bad_cursor_is_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
@@ -0,0 +1,23 @@
+from datetime import date, datetime
+from core.partitions import add_months, month_start, partition_month, partition_name
+
+
+def test_add_months():
+    assert add_months(date(2025, 1, 1), 1) == date(2025, 2, 1)
+    assert add_months(date(2025, 12, 1), 1) == date(2026, 1, 1)
+    assert add_months(date(2025, 1, 1), -1) == date(2024, 12, 1)
+    assert add_months(date(2025, 3, 1), -15) == date(2023, 12, 1)
+    assert add_months(date(2025, 3, 1), 24) == date(2027, 3, 1)
+    assert add_months(date(2025, 3, 1), 0) == date(2025, 3, 1)
+
+
+def test_month_start():
+    assert month_start(datetime(2025, 2, 28, 23, 59)) == date(2025, 2, 1)
+    assert month_start(date(2024, 12, 31)) == date(2024, 12, 1)
+
+
+def test_partition_names():
+    assert partition_name(date(2025, 3, 1)) == "orders_p202503"
+    assert partition_month("orders_p202503") == date(2025, 3, 1)
+    assert partition_month("orders_default") is None
+    assert partition_month("orders_p2025031") is None
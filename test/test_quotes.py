@@ -0,0 +1,72 @@
+from decimal import Decimal
+from types import SimpleNamespace
+import pytest
+from core import quotes
+from core.quotes import CostTable
+from core.stock import SUGAR_ID, SUGAR_PER_SPOON
+
+
+def menu(version, unit_costs, recipes, portions=None):
+    portions = portions or {}
+    return SimpleNamespace(
+        version=version,
+        ingredients={i: SimpleNamespace(unit_cost=Decimal(str(cost)), portion=portions.get(i, 0)) for i, cost in unit_costs.items()},
+        drinks=dict.fromkeys(recipes),
+        recipes={d: tuple((i, Decimal(str(amount))) for i, amount in recipe) for d, recipe in recipes.items()},
+    )
+
+
+UNIT_COSTS = {1: 1.5, 2: 0.06, 3: 0.0, 4: 0.2, SUGAR_ID: 0.01}
+RECIPES = {1: ((1, 18), (3, 30)), 2: ((1, 18), (2, 150))}
+
+
+def test_line_cost():
+    table = CostTable()
+    table.refresh(menu(1, UNIT_COSTS, RECIPES, portions={4: 20}))
+    assert table.drink_cost[1] == pytest.approx(27.0)
+    assert table.drink_cost[2] == pytest.approx(36.0)
+    assert table.spoon_cost == pytest.approx(SUGAR_PER_SPOON * 0.01)
+    # 2 капучино с двумя ложками сахара и добавкой 4 (20 * 0.2)
+    assert table.line_cost(2, 2, 2, (4,)) == pytest.approx((36.0 + 2 * 0.05 + 4.0) * 2)
+    assert table.line_cost(1, 1, 0, ()) == pytest.approx(27.0)
+
+
+def test_refresh_recomputes_only_affected_drinks():
+    table = CostTable()
+    table.refresh(menu(1, UNIT_COSTS, RECIPES))
+    before = quotes.recomputed_total.values.get((), 0)
+
+    # молоко подорожало: пересчитывается только напиток 2
+    table.refresh(menu(2, {**UNIT_COSTS, 2: 0.1}, RECIPES))
+    assert quotes.recomputed_total.values[()] - before == 1
+    assert table.drink_cost[1] == pytest.approx(27.0)
+    assert table.drink_cost[2] == pytest.approx(27.0 + 15.0)
+
+    # меню с той же ценой и рецептами ничего не пересчитывает
+    table.refresh(menu(3, {**UNIT_COSTS, 2: 0.1}, RECIPES))
+    assert quotes.recomputed_total.values[()] - before == 1
+
+    # новый напиток и новый ингредиент: массивы растут по id
+    table.refresh(menu(4, {**UNIT_COSTS, 2: 0.1, 9: 2.0}, {**RECIPES, 7: ((9, 3),)}))
+    assert table.drink_cost[7] == pytest.approx(6.0)
+    assert table.menu_version == 4
+
+
+def test_refresh_on_changed_recipe():
+    table = CostTable()
+    table.refresh(menu(1, UNIT_COSTS, RECIPES))
+    table.refresh(menu(2, UNIT_COSTS, {1: ((1, 20), (3, 30)), 2: RECIPES[2]}))
+    assert table.drink_cost[1] == pytest.approx(30.0)
+    assert table.drink_cost[2] == pytest.approx(36.0)
+
+
+def test_of_catches_up_with_newer_menu():
+    # меню перезагрузилось после прошлого запроса: новый напиток 7 и добавка 9 есть только в новой версии
+    table = CostTable()
+    table.refresh(menu(1, UNIT_COSTS, RECIPES))
+    newer = menu(2, {**UNIT_COSTS, 9: 2.0}, {**RECIPES, 7: ((9, 3),)}, portions={9: 1})
+    with pytest.raises(IndexError):
+        table.line_cost(7, 1, 0, (9,))
+    assert table.of(newer) is table
+    assert table.menu_version == 2
+    assert table.line_cost(7, 1, 0, (9,)) == pytest.approx(6.0 + 2.0)
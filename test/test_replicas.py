@@ -0,0 +1,64 @@
+import asyncio
+from types import SimpleNamespace
+from core import db as module
+from core.db import AsyncSessionLocal, ReplicaSet, ShardSet, read_sessionmaker
+
+
+def replica(name, healthy=True, lag=0.0):
+    class Connection:
+        async def __aenter__(self):
+            if lag is None:
+                raise OSError("реплика недоступна")
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def execute(self, statement):
+            return SimpleNamespace(scalar_one=lambda: lag)
+
+    return SimpleNamespace(name=name, healthy=healthy, sessionmaker=name, engine=SimpleNamespace(connect=Connection))
+
+
+def replica_set(*replicas) -> ReplicaSet:
+    replica_set = ReplicaSet()
+    replica_set.replicas = list(replicas)
+    replica_set.db = SimpleNamespace(db_replica_check_interval=1.0, db_replica_max_lag=10.0)
+    return replica_set
+
+
+def test_pick_round_robin_over_healthy():
+    replicas = replica_set(replica("a"), replica("b", healthy=False), replica("c"))
+    assert [replicas.pick().name for _ in range(4)] == ["a", "c", "a", "c"]
+    for item in replicas.replicas:
+        item.healthy = False
+    assert replicas.pick() is None
+    assert replica_set().pick() is None
+
+
+def test_check_marks_lagging_and_unreachable_replicas():
+    fresh, lagging, down = replica("fresh", healthy=False), replica("lagging", lag=30.0), replica("down", lag=None)
+    replicas = replica_set(fresh, lagging, down)
+
+    async def check_all():
+        await asyncio.gather(*(replicas.check(item) for item in replicas.replicas))
+
+    asyncio.run(check_all())
+    assert (fresh.healthy, lagging.healthy, down.healthy) == (True, False, False)
+
+
+def test_reads_fall_back_to_primary(monkeypatch):
+    monkeypatch.setattr(module, "replicas", replica_set(replica("a", healthy=False)))
+    assert read_sessionmaker() is AsyncSessionLocal
+    monkeypatch.setattr(module, "replicas", replica_set(replica("a")))
+    assert read_sessionmaker() == "a"
+
+
+def test_replicas_only_for_main_shard(monkeypatch):
+    monkeypatch.setattr(module, "replicas", replica_set(replica("replica")))
+    shards = ShardSet()
+    shards.db = SimpleNamespace(db_shard_map={})
+    shards.shards = [SimpleNamespace(number=0, sessionmaker="primary"), SimpleNamespace(number=1, sessionmaker="shard1")]
+    assert shards.read_sessionmaker(1) == "replica"
+    assert shards.read_sessionmaker(2) == "shard1"
+    assert shards.sessionmaker(1) == "primary"
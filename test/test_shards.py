@@ -0,0 +1,119 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+from core import get_db, shops
+from core.db import DEFAULT_SHOP, ShardSet
+from core.get_db import current_shop
+from core.shops import MenuSync, ShardMapChanged, check_directory
+
+
+def shard_set(count: int, shard_map: dict | None = None) -> ShardSet:
+    shards = ShardSet()
+    shards.db = SimpleNamespace(db_shard_map=shard_map or {})
+    shards.shards = [SimpleNamespace(number=number, sessionmaker=f"shard{number}") for number in range(count)]
+    return shards
+
+
+def test_mapped_by_formula_and_map():
+    shards = shard_set(2)
+    assert [shards.mapped(id_shop) for id_shop in (1, 2, 3, 4)] == [0, 1, 0, 1]
+    assert shard_set(1).mapped(2) == 0
+    # DB_SHARD_MAP закрепляет точку за шардом, остальные идут по формуле
+    pinned = shard_set(3, {2: 1, 4: 0})
+    assert [pinned.mapped(id_shop) for id_shop in (1, 2, 3, 4, 5)] == [0, 1, 2, 0, 1]
+    assert pinned.shard(4).number == 0 and pinned.sessionmaker(3) == "shard2"
+
+
+class Engine:
+    def __init__(self, rows):
+        self.rows, self.statements = rows, []
+
+    def begin(self):
+        engine = self
+
+        class Conn:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            async def execute(self, statement):
+                engine.statements.append(statement)
+                return SimpleNamespace(all=lambda: engine.rows)
+
+        return Conn()
+
+
+def directory(monkeypatch, rows, shards):
+    engine = Engine(rows)
+    monkeypatch.setattr(shops, "shards", shards)
+    monkeypatch.setattr(shops, "get_engine", lambda: engine)
+    asyncio.run(check_directory())
+    return [str(statement.compile(dialect=postgresql.dialect())) for statement in engine.statements[1:]]
+
+
+def test_moved_shops(monkeypatch):
+    monkeypatch.setattr(shops, "shards", shard_set(3))
+    # точка 2 записана в шард 1, а с третьим шардом формула дает тот же 1; точка 3 ушла бы из шарда 0 в шард 2
+    assert shops._moved([(1, 0), (2, 1), (3, 0), (4, None)]) == {3: (0, 2)}
+
+
+def test_check_directory_refuses_moved_shops(monkeypatch):
+    # был один шард, добавили второй: точка 2 с данными в шарде 0 по формуле уехала бы в пустой шард 1
+    with pytest.raises(ShardMapChanged, match="2: 0 -> 1"):
+        directory(monkeypatch, [(1, 0), (2, 0)], shard_set(2))
+    assert directory(monkeypatch, [(1, 0), (2, 0)], shard_set(2, {2: 0})) == []
+
+
+def test_check_directory_records_unassigned_shops(monkeypatch):
+    statements = directory(monkeypatch, [(1, None), (2, None), (3, 0)], shard_set(2))
+    assert len(statements) == 1
+    assert statements[0].startswith("UPDATE shops SET shard=CASE shops.id_shop WHEN")
+    assert "shops.shard IS NULL" in statements[0]
+
+
+def test_current_shop(monkeypatch):
+    async def menu():
+        return SimpleNamespace(shops={1, 2})
+
+    monkeypatch.setattr(get_db.menu_cache, "get", menu)
+
+    def shop(**path_params):
+        return asyncio.run(current_shop(SimpleNamespace(path_params=path_params)))
+
+    assert shop() == DEFAULT_SHOP
+    assert shop(id_shop="2") == 2
+    for raw in ("3", "x"):
+        with pytest.raises(HTTPException) as error:
+            shop(id_shop=raw)
+        assert error.value.status_code == 404
+
+
+def test_menu_sync_coalesces_notifications(monkeypatch):
+    monkeypatch.setattr(shops, "shards", shard_set(2))
+    runs = []
+
+    async def sync_menu():
+        runs.append(1)
+        await asyncio.sleep(0)
+
+    monkeypatch.setattr(shops, "sync_menu", sync_menu)
+
+    async def scenario():
+        menu_sync = MenuSync()
+        menu_sync.schedule()
+        await asyncio.sleep(0)  # копия началась
+        for _ in range(3):
+            menu_sync.schedule()
+        await menu_sync._task
+        return menu_sync
+
+    asyncio.run(scenario())
+    assert len(runs) == 2  # первая копия и одна повторная за все уведомления, пришедшие во время нее
+    monkeypatch.setattr(shops, "shards", shard_set(1))
+    menu_sync = MenuSync()
+    menu_sync.schedule()
+    assert menu_sync._task is None  # без дополнительных шардов копировать некуда
@@ -0,0 +1,50 @@
+from decimal import Decimal
+from types import SimpleNamespace
+from core import stock
+from core.stock import SUGAR_ID, SUGAR_PER_SPOON, allocate, cart_consumption, consumption
+
+RECIPES = {1: ((1, Decimal("18")), (3, Decimal("30"))), 2: ((1, Decimal("18")), (2, Decimal("150")))}
+INGREDIENTS = {2: SimpleNamespace(id_ingredient=2, portion=50), 4: SimpleNamespace(id_ingredient=4, portion=20)}
+
+
+def line(id_drink, quantity, sugar_amount=0, addons=()):
+    return SimpleNamespace(id_drink=id_drink, quantity=quantity, sugar_amount=sugar_amount, addons=addons)
+
+
+def test_consumption_groups_by_ingredient():
+    need = consumption(RECIPES[2], INGREDIENTS[2], sugar_amount=2)
+    assert need == {1: 18, 2: 200, SUGAR_ID: 2 * SUGAR_PER_SPOON}
+    assert consumption(RECIPES[1], INGREDIENTS[4], sugar_amount=0) == {1: 18, 3: 30, 4: 20}
+
+
+def test_cart_consumption_folds_lines():
+    lines = [line(1, 2, sugar_amount=1), line(2, 1, addons=(4,)), line(1, 1, addons=(2, 4))]
+    need = cart_consumption(RECIPES, INGREDIENTS, lines)
+    assert need == {
+        1: 18 * 4,
+        3: 30 * 3,
+        2: 150 + 50,
+        4: 20 * 2,
+        SUGAR_ID: 2 * SUGAR_PER_SPOON,
+    }
+    # строка с одной позицией расходует столько же, сколько одиночный заказ
+    assert cart_consumption(RECIPES, INGREDIENTS, [line(1, 1, 1, (4,))]) == consumption(RECIPES[1], INGREDIENTS[4], 1)
+    assert cart_consumption(RECIPES, INGREDIENTS, []) == {}
+
+
+def test_allocate_in_order():
+    rejected = stock.stats["rejected"]
+    available = {1: Decimal("40"), 2: Decimal("200")}
+    needs = [{1: Decimal("18"), 2: Decimal("150")}, {1: Decimal("18"), 2: Decimal("150")}, {1: Decimal("18"), 3: Decimal("30")}]
+    accepted, total = allocate(available, needs)
+    # второй заказ не помещается по молоку, третий берет остаток кофе; воды нет на складе - она не учитывается
+    assert accepted == [True, False, True]
+    assert total == {1: 36, 2: 150}
+    assert available == {1: 40, 2: 200}  # исходный остаток не меняется
+    assert stock.stats["rejected"] == rejected + 1
+
+
+def test_allocate_all_or_nothing_per_order():
+    accepted, total = allocate({1: Decimal("10"), 2: Decimal("10")}, [{1: Decimal("5"), 2: Decimal("20")}, {1: Decimal("10")}])
+    assert accepted == [False, True]
+    assert total == {1: 10}
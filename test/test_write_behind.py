@@ -0,0 +1,153 @@
+import asyncio
+import fcntl
+import json
+from decimal import Decimal
+from types import SimpleNamespace
+import pytest
+from core import stock, write_behind as module
+from core.write_behind import WriteBehind, _claim
+
+RECORD = {"id_order": 1, "id_drink": 1, "id_ingredient": 2, "sugar_amount": 0, "payment_status": "paid",
+          "created_at": "2025-03-01 10:00:00", "need": {"1": "18", "2": "50"}}
+
+
+def writer(tmp_path, lease_orders=10) -> WriteBehind:
+    return WriteBehind(journal_dir=str(tmp_path), flush_ms=50, batch=100, id_block=10, lease_orders=lease_orders)
+
+
+class FakeSession:
+    def __init__(self, calls):
+        self.calls = calls
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, params=None):
+        self.calls.append("lease")
+
+    async def commit(self):
+        self.calls.append("commit")
+
+    async def rollback(self):
+        self.calls.append("rollback")
+
+
+def test_replay_stops_at_truncated_line(tmp_path, monkeypatch):
+    written = []
+
+    async def write(batch, owner, release=False):
+        written.append((owner, release, batch))
+
+    monkeypatch.setattr(WriteBehind, "write", staticmethod(write))
+    lines = [json.dumps(RECORD), json.dumps({**RECORD, "id_order": 2}), json.dumps({**RECORD, "id_order": 3})[:40]]
+    (tmp_path / "dead.1.jsonl").write_text(json.dumps({**RECORD, "id_order": 0}) + "\n")
+    (tmp_path / "dead.2.jsonl").write_text("\n".join(lines))
+
+    asyncio.run(writer(tmp_path).replay())
+    [(owner, release, batch)] = written
+    assert (owner, release) == ("dead", True)
+    assert [record["id_order"] for record in batch] == [0, 1, 2]  # сегменты по порядку, недописанный заказ 3 пропущен
+    assert batch[0]["need"] == {1: Decimal("18"), 2: Decimal("50")}
+    assert list(tmp_path.glob("*.jsonl")) == []
+
+
+def test_claim_only_segments_of_dead_owner(tmp_path):
+    paths = [tmp_path / "owner.1.jsonl", tmp_path / "owner.2.jsonl"]
+    for path in paths:
+        path.write_text("")
+    # живой владелец держит flock на последнем сегменте - ни один сегмент не забирается
+    live = open(paths[1])
+    fcntl.flock(live, fcntl.LOCK_EX)
+    assert _claim(paths) is None
+
+    live.close()  # процесс завершился, блокировка снята
+    claimed = _claim(paths + [tmp_path / "owner.3.jsonl"])  # удаленный сегмент пропускается
+    assert [journal.name for journal in claimed] == [str(path) for path in paths]
+    # забранные сегменты под flock нового владельца: второй воркер их уже не получит
+    assert _claim(paths) is None
+    for journal in claimed:
+        journal.close()
+
+
+def test_replay_skips_live_owner(tmp_path, monkeypatch):
+    async def write(batch, owner, release=False):
+        raise AssertionError("журнал живого процесса не доигрывается")
+
+    monkeypatch.setattr(WriteBehind, "write", staticmethod(write))
+    live = writer(tmp_path)
+    live._open_segment()
+    asyncio.run(writer(tmp_path).replay())
+    assert live._segment_path(1).exists()
+    live._journal.close()
+
+
+@pytest.fixture
+def leases(monkeypatch):
+    # склад точки и вызовы бд; stock.lock отдает только строки запрошенных ингредиентов, как SELECT ... FOR UPDATE
+    state = {"stock": {}, "calls": [], "applied": []}
+
+    async def lock(session, id_shop, ids):
+        return {i: quantity for i, quantity in state["stock"].items() if i in ids}
+
+    async def apply(session, id_shop, reserved):
+        state["applied"].append(reserved)
+        for i, quantity in reserved.items():
+            state["stock"][i] -= quantity
+
+    monkeypatch.setattr(stock, "lock", lock)
+    monkeypatch.setattr(stock, "apply", apply)
+    monkeypatch.setattr(module, "shards", SimpleNamespace(sessionmaker=lambda id_shop: lambda: FakeSession(state["calls"])))
+    return state
+
+
+def test_reserve_takes_lease_ahead(tmp_path, leases):
+    leases["stock"] = {1: Decimal("1000"), 2: Decimal("100")}
+    wb = writer(tmp_path, lease_orders=10)
+    wb.tracked = {1, 2}
+    need = {1: Decimal("18"), 2: Decimal("50"), 3: Decimal("5")}  # ингредиента 3 на складе нет
+
+    asyncio.run(wb._reserve(need))
+    # на 10 заказов вперед или сколько осталось на складе
+    assert leases["applied"] == [{1: Decimal("180"), 2: Decimal("100")}]
+    assert wb.lease == {1: Decimal("180"), 2: Decimal("100")}
+
+    # резерва хватает - в бд не ходим
+    calls = len(leases["calls"])
+    wb.lease = {1: Decimal("180"), 2: Decimal("50")}
+    asyncio.run(wb._reserve(need))
+    assert len(leases["calls"]) == calls
+
+    # резерв кончился: докупается только недостающий ингредиент
+    wb.lease = {1: Decimal("180"), 2: Decimal("10")}
+    leases["stock"][2] = Decimal("60")
+    asyncio.run(wb._reserve(need))
+    assert leases["applied"][-1] == {2: Decimal("60")}
+    assert wb.lease == {1: Decimal("180"), 2: Decimal("70")}
+
+
+def test_reserve_exhausted(tmp_path, leases):
+    leases["stock"] = {1: Decimal("1000"), 2: Decimal("30")}
+    wb = writer(tmp_path)
+    wb.tracked = {1, 2}
+    wb.lease = {2: Decimal("10")}
+    rejected = stock.stats["rejected"]
+
+    with pytest.raises(stock.InsufficientStock) as error:
+        asyncio.run(wb._reserve({1: Decimal("18"), 2: Decimal("50")}))
+    # отказ целиком: со склада ничего не списано, резерв прежний
+    assert error.value.ingredient_ids == [2]
+    assert leases["applied"] == [] and leases["calls"] == ["rollback"]
+    assert wb.lease == {2: Decimal("10")}
+    assert stock.stats["rejected"] == rejected + 1
+
+
+def test_reserve_forgets_deleted_stock_row(tmp_path, leases):
+    leases["stock"] = {1: Decimal("1000")}
+    wb = writer(tmp_path, lease_orders=1)
+    wb.tracked = {1, 2}  # строку склада 2 удалили, уведомление еще не дошло
+    asyncio.run(wb._reserve({1: Decimal("18"), 2: Decimal("50")}))
+    assert wb.tracked == {1}
+    assert wb.lease == {1: Decimal("18")}